@@ -0,0 +1,45 @@
+# app/api/async_routes.py
+"""Async handlers for the read endpoints, served from the asyncpg engine.
+
+Mounted ahead of `routes.router` when DB_ASYNC=1 so these paths take
+precedence; everything else keeps the sync handlers.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from .. import crud, schemas
+from ..db import get_async_db
+from .routes import (_cache_lookup, _cache_respond, listing_fields, listing_query, listings_cache_key,
+                     listings_body, listing_body, export_listings, listing_stats)
+
+router = APIRouter()
+
+
+@router.get("/listings", response_model=List[schemas.ListingOut])
+async def listings(request: Request, query: dict = Depends(listing_query), db: AsyncSession = Depends(get_async_db)):
+    key = listings_cache_key(query)
+    entry, generation = _cache_lookup(key)
+    produced = None
+    if entry is None:
+        try:
+            res = await crud.async_list_listings(db, **query)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        produced = listings_body(res, query["count"], query["columns"])
+    return _cache_respond(request, key, entry, generation, produced)
+
+
+# the sync export and stats handlers are re-registered here so /listings/{listing_id} below does not shadow them
+router.add_api_route("/listings/export", export_listings, methods=["GET"])
+router.add_api_route("/listings/stats", listing_stats, methods=["GET"])
+
+
+@router.get("/listings/{listing_id}", response_model=schemas.ListingOut)
+async def get_listing(listing_id: str, request: Request, columns: List[str] = Depends(listing_fields),
+                      db: AsyncSession = Depends(get_async_db)):
+    key = ("listing", listing_id, ",".join(columns))
+    entry, generation = _cache_lookup(key)
+    produced = None
+    if entry is None:
+        produced = listing_body(await crud.async_get_listing(db, listing_id, columns), columns)
+    return _cache_respond(request, key, entry, generation, produced)
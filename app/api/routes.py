@@ -1,46 +1,204 @@
 # app/api/routes.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
-from .. import crud, schemas
+from .. import crud, schemas, export, serialize, services, stats
+from ..cache import response_cache, etag_matches
 from ..db import get_db
-from ..scrape import scrape_marketplace
-from ..utils import logger
+from ..jobs import scrape_jobs
 
 router = APIRouter()
 
-@router.get("/health")
-def health():
-    return {"status": "ok"}
 
-@router.get("/listings", response_model=List[schemas.ListingOut])
-def listings(
-    skip: int = 0,
-    limit: int = 20,
+def _cache_lookup(key):
+    """Return `(cached_entry, generation)`; a miss gives `(None, generation)`."""
+    generation = response_cache.generation
+    return response_cache.get(key), generation
+
+
+def _cache_respond(request: Request, key, entry, generation, produced=None):
+    """Build the response for `key` from a cache hit or a freshly `produced`
+    `(body_bytes, extra_headers)` pair, honouring If-None-Match."""
+    if entry is not None:
+        etag, body, headers = entry
+        state = "HIT"
+    else:
+        body, headers = produced
+        etag = response_cache.put(key, body, headers, generation)
+        state = "MISS"
+    headers = dict(headers, ETag=etag, **{"Cache-Control": "no-cache", "X-Cache": state})
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        response_cache.note_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _cached_json(request: Request, key, produce):
+    """Serve `key` from the response cache; `produce()` runs only on a miss."""
+    entry, generation = _cache_lookup(key)
+    return _cache_respond(request, key, entry, generation, None if entry else produce())
+
+
+def listing_filters(
     min_price: float | None = Query(None),
     max_price: float | None = Query(None),
     min_year: int | None = Query(None),
     max_year: int | None = Query(None),
     location: str | None = Query(None),
-    db: Session = Depends(get_db)
+    q: str | None = Query(None, max_length=200),
 ):
-    filters = {
+    return {
         "min_price": min_price,
         "max_price": max_price,
         "min_year": min_year,
         "max_year": max_year,
-        "location": location
+        "location": location,
+        "q": q
     }
-    res = crud.list_listings(db, skip=skip, limit=limit, filters=filters)
-    return res["items"]
+
+
+def listing_fields(fields: str | None = Query(None, description="comma-separated subset of the listing fields")):
+    """Columns the listing endpoints read and return, in response order."""
+    try:
+        return serialize.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def listing_query(
+    skip: int = 0,
+    limit: int = 20,
+    filters: dict = Depends(listing_filters),
+    sort: str | None = Query(None, pattern="^(-?(id|price|year|last_seen_at)|rank)$"),
+    cursor: str | None = Query(None),
+    count: str | None = Query(None, pattern="^(exact|estimate)$"),
+    columns: List[str] = Depends(listing_fields),
+):
+    """Query parameters of `GET /listings` as `crud.list_listings` keyword arguments."""
+    return {"skip": skip, "limit": limit, "filters": filters, "sort": sort, "cursor": cursor, "count": count,
+            "columns": columns}
+
+
+def listings_cache_key(query: dict):
+    # skip is meaningless once a cursor is given, so it does not split the cache
+    params = dict(query["filters"], limit=query["limit"], sort=query["sort"], cursor=query["cursor"],
+                  count=query["count"], skip=None if query["cursor"] else query["skip"],
+                  fields=",".join(query["columns"]))
+    return ("listings",) + tuple(sorted((k, v) for k, v in params.items() if v is not None))
+
+
+def listings_body(res: dict, count: str = None, fields: List[str] = None):
+    # pagination metadata travels in headers so the body stays a plain list
+    headers = {}
+    if res["next_cursor"]:
+        headers["X-Next-Cursor"] = res["next_cursor"]
+    if res["total"] is not None:
+        headers["X-Total-Count" if count == "exact" else "X-Total-Estimate"] = str(res["total"])
+    return serialize.dumps(serialize.listing_dicts(res["items"], fields or serialize.LISTING_FIELDS)), headers
+
+
+def listing_body(row, fields: List[str] = None):
+    if not row:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    return serialize.dumps(serialize.listing_dicts([row], fields or serialize.LISTING_FIELDS)[0]), {}
+
+
+@router.get("/health")
+def health():
+    return {"status": "ok"}
+
+@router.get("/cache/stats")
+def cache_stats():
+    return response_cache.stats()
+
+@router.get("/listings", response_model=List[schemas.ListingOut])
+def listings(request: Request, query: dict = Depends(listing_query), db: Session = Depends(get_db)):
+    def produce():
+        try:
+            res = crud.list_listings(db, **query)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return listings_body(res, query["count"], query["columns"])
+
+    return _cached_json(request, listings_cache_key(query), produce)
+
+
+# longest NDJSON line accepted by POST /listings/bulk
+BULK_MAX_LINE_BYTES = 1 << 20
+
+
+@router.post("/listings/bulk")
+async def bulk_ingest(request: Request, db: Session = Depends(get_db)):
+    """Upsert listings from a streamed NDJSON body, one listing per line.
+
+    Lines are validated and written in batches while the body is still
+    arriving; bad lines are reported in the response instead of failing the load.
+    """
+    loader = services.BulkLoader(db)
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        if len(pending) > BULK_MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail=f"line {loader.lineno + 1} is longer than {BULK_MAX_LINE_BYTES} bytes")
+        for line in lines:
+            if loader.add(line):
+                await run_in_threadpool(loader.flush)
+    if pending:
+        loader.add(pending)
+    await run_in_threadpool(loader.flush)
+    return loader.report
+
+
+# declared before /listings/{listing_id} so "export" is not taken for an id
+@router.get("/listings/export")
+def export_listings(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    columns: str | None = Query(None, description="comma-separated; raw_json is left out unless listed"),
+    filters: dict = Depends(listing_filters),
+):
+    try:
+        cols = export.parse_columns(columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # the stream opens its own session: it outlives this handler
+    return StreamingResponse(
+        export.export_listings(filters, cols, fmt),
+        media_type=export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="listings.{fmt}"'},
+    )
+
+
+# also declared before /listings/{listing_id}
+@router.get("/listings/stats")
+def listing_stats(
+    request: Request,
+    group_by: str | None = Query(None, pattern="^(year|location|currency)$"),
+    bins: int = Query(20, ge=1, le=100),
+    filters: dict = Depends(listing_filters),
+    db: Session = Depends(get_db),
+):
+    key = ("stats", group_by, bins) + tuple(sorted((k, v) for k, v in filters.items() if v is not None))
+    return _cached_json(request, key, lambda: (
+        json.dumps(stats.market_stats(db, filters, group_by, bins)).encode(), {}))
 
 
 @router.get("/listings/{listing_id}", response_model=schemas.ListingOut)
-def get_listing(listing_id: str, db: Session = Depends(get_db)):
-    obj = crud.get_listing(db, listing_id)
-    if not obj:
+def get_listing(listing_id: str, request: Request, columns: List[str] = Depends(listing_fields),
+                db: Session = Depends(get_db)):
+    return _cached_json(request, ("listing", listing_id, ",".join(columns)),
+                        lambda: listing_body(crud.get_listing(db, listing_id, columns), columns))
+
+
+@router.get("/listings/{listing_id}/history", response_model=List[schemas.PriceHistoryOut])
+def price_history(listing_id: str, limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)):
+    items = crud.get_price_history(db, listing_id, limit)
+    if items is None:
         raise HTTPException(status_code=404, detail="Listing not found")
-    return obj
+    return items
 
 
 @router.patch("/listings/{listing_id}", response_model=schemas.ListingOut)
@@ -58,11 +216,19 @@ def delete_listing(listing_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Listing not found")
     return {"status": "deleted"}
 
-@router.post("/scrape")
+@router.post("/scrape", status_code=202)
 def trigger_scrape():
-    try:
-        scrape_marketplace()
-        return {"status": "ok"}
-    except Exception as e:
-        logger.exception("Scrape failed: %s", e)
-        raise HTTPException(status_code=500, detail="Scrape failed")
+    # runs in the background; a scrape already in progress is joined instead
+    job, started = scrape_jobs.submit("api")
+    return {"job_id": job.id, "status": job.status, "coalesced": not started}
+
+@router.get("/scrape")
+def recent_scrapes():
+    return [job.to_dict() for job in scrape_jobs.recent()]
+
+@router.get("/scrape/{job_id}")
+def scrape_status(job_id: str):
+    job = scrape_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scrape job not found")
+    return job.to_dict()
@@ -0,0 +1,70 @@
+# app/archive.py
+"""Content-addressed archive of fetched listing pages.
+
+Each page is stored once, gzip-compressed, under the SHA-256 of its HTML
+(`<dir>/ab/cd/<sha256>.html.gz`). Listings keep only the reference
+`raw_json = {"html_sha256": ...}`, so improved extractors can be replayed
+over the archive with `reextract.reextract_listings` without launching a browser.
+
+This module is what the parse worker processes import, so it stays free of
+database imports: workers need neither the engine nor POSTGRES_URL.
+"""
+import os
+import gzip
+import hashlib
+import tempfile
+from .extract import extract_listing
+
+# empty disables archiving; listings then get no raw_json at all
+HTML_ARCHIVE_DIR = os.getenv("HTML_ARCHIVE_DIR", "html_archive")
+# fields rewritten by reextract_listings
+REEXTRACT_FIELDS = ["title", "price", "currency", "year", "mileage", "location"]
+
+
+def _path(digest: str, root: str = None):
+    root = root or HTML_ARCHIVE_DIR
+    return os.path.join(root, digest[:2], digest[2:4], digest + ".html.gz")
+
+
+def store(html: str, root: str = None) -> str:
+    """Archive `html` and return its SHA-256; pages already stored are not rewritten."""
+    data = html.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = _path(digest, root)
+    if os.path.exists(path):
+        return digest
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write-then-rename so a concurrent reader never sees a partial file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(gzip.compress(data, compresslevel=6))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return digest
+
+
+def load(digest: str, root: str = None) -> str:
+    with gzip.open(_path(digest, root), "rb") as fh:
+        return fh.read().decode("utf-8")
+
+
+def extract_and_archive(html: str, u: str) -> dict:
+    """`extract_listing` plus archiving; used by the scraper's parse workers."""
+    payload = extract_listing(html, u)
+    if HTML_ARCHIVE_DIR:
+        payload["raw_json"] = {"html_sha256": store(html)}
+    return payload
+
+
+def _reextract(item):
+    # runs in the reextract worker processes
+    listing_id, url, digest, root = item
+    try:
+        html = load(digest, root)
+    except FileNotFoundError:
+        return listing_id, None
+    fields = extract_listing(html, url)
+    return listing_id, {k: fields[k] for k in REEXTRACT_FIELDS}
@@ -0,0 +1,184 @@
+# app/browser.py
+"""Long-lived Chromium for scrape runs.
+
+Playwright objects belong to the event loop that created them, so the
+manager owns one background thread running a private loop; every run is
+executed there and finds the browser and its context already warm. The
+browser is recycled after `max_runs` runs, when it stops answering, or
+when the browser processes use more than `max_rss_mb`. Cookies and local
+storage are saved after each run and restored whenever a context is created.
+"""
+import os
+import time
+import atexit
+import asyncio
+import threading
+from playwright.async_api import async_playwright
+from .utils import logger
+
+try:
+    import psutil  # type: ignore
+except Exception:
+    psutil = None
+
+HEADLESS = os.getenv("HEADLESS", "1") == "1"
+COOKIES_FILE = os.getenv("PLAYWRIGHT_COOKIES_FILE")
+# keep one browser alive between runs (0 launches a fresh one per run)
+SCRAPE_WARM_BROWSER = os.getenv("SCRAPE_WARM_BROWSER", "1") == "1"
+SCRAPE_BROWSER_MAX_RUNS = int(os.getenv("SCRAPE_BROWSER_MAX_RUNS", "20"))
+SCRAPE_BROWSER_MAX_RSS_MB = float(os.getenv("SCRAPE_BROWSER_MAX_RSS_MB", "1500"))
+SCRAPE_STORAGE_STATE = os.getenv("SCRAPE_STORAGE_STATE", ".browser_state.json")
+
+
+async def load_cookies(context):
+    if COOKIES_FILE and os.path.exists(COOKIES_FILE):
+        try:
+            import json
+            with open(COOKIES_FILE, "r", encoding="utf-8") as fh:
+                cookies = json.load(fh)
+            await context.add_cookies(cookies)
+        except Exception as e:
+            logger.error("Failed loading cookies: %s", e)
+
+
+def browser_rss_mb():
+    """Resident memory of all processes started by this one (the Playwright
+    driver and Chromium), in MB; None when psutil is not installed."""
+    if psutil is None:
+        return None
+    total = 0
+    for child in psutil.Process().children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / (1024 * 1024)
+
+
+class BrowserManager:
+    def __init__(self, max_runs: int = None, max_rss_mb: float = None, storage_state: str = None,
+                 headless: bool = None):
+        self.max_runs = max_runs or SCRAPE_BROWSER_MAX_RUNS
+        self.max_rss_mb = SCRAPE_BROWSER_MAX_RSS_MB if max_rss_mb is None else max_rss_mb
+        self.storage_state = SCRAPE_STORAGE_STATE if storage_state is None else storage_state
+        self.headless = HEADLESS if headless is None else headless
+        self.runs = 0
+        self.launches = 0
+        self.launch_seconds = None
+        self._pw = self._browser = self._context = None
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                if self.max_rss_mb and psutil is None:
+                    logger.warning("SCRAPE_BROWSER_MAX_RSS_MB=%s has no effect: psutil is not installed, "
+                                   "so the browser is never recycled for memory", self.max_rss_mb)
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="browser-loop", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def run(self, coro_fn, *args, **kwargs):
+        """Run `coro_fn(*args, **kwargs)` on the browser loop and wait for its result."""
+        future = asyncio.run_coroutine_threadsafe(coro_fn(*args, **kwargs), self._ensure_loop())
+        return future.result()
+
+    async def _recycle_reason(self):
+        if self._browser is None:
+            return None
+        if not self._browser.is_connected():
+            return "disconnected"
+        if self.runs >= self.max_runs:
+            return "max_runs"
+        rss = browser_rss_mb()
+        if rss is not None and self.max_rss_mb and rss > self.max_rss_mb:
+            return "memory"
+        try:
+            page = await asyncio.wait_for(self._context.new_page(), 10)
+            await page.close()
+        except Exception:
+            return "unhealthy"
+        return None
+
+    async def _launch(self):
+        started = time.monotonic()
+        self._pw = await async_playwright().start()
+        self._browser = await self._pw.chromium.launch(headless=self.headless)
+        if self.storage_state and os.path.exists(self.storage_state):
+            self._context = await self._browser.new_context(storage_state=self.storage_state)
+        else:
+            self._context = await self._browser.new_context()
+            await load_cookies(self._context)
+        self.launch_seconds = time.monotonic() - started
+        self.launches += 1
+        self.runs = 0
+        logger.info("Launched browser in %.2fs", self.launch_seconds)
+
+    async def _close(self):
+        for name in ("_context", "_browser"):
+            obj = getattr(self, name)
+            if obj is not None:
+                try:
+                    await obj.close()
+                except Exception:
+                    pass
+        if self._pw is not None:
+            try:
+                await self._pw.stop()
+            except Exception:
+                pass
+        self._pw = self._browser = self._context = None
+
+    async def acquire(self):
+        """Return `(context, info)` for a run; `info` describes the warm-up."""
+        started = time.monotonic()
+        reason = await self._recycle_reason()
+        if reason:
+            logger.info("Recycling browser after %d runs: %s", self.runs, reason)
+            await self._close()
+        warm = self._browser is not None
+        if not warm:
+            await self._launch()
+        self.runs += 1
+        startup = time.monotonic() - started
+        return self._context, {
+            "warm": warm,
+            "startup_seconds": round(startup, 3),
+            # what a cold launch took last time, minus what this run spent getting ready
+            "startup_saved_seconds": round(max(0.0, self.launch_seconds - startup), 3) if warm else 0.0,
+            "run_on_browser": self.runs,
+            "launches": self.launches,
+            "recycled": reason,
+        }
+
+    async def release(self, context):
+        """Close pages a run left open and save the session for the next context."""
+        for page in list(context.pages):
+            try:
+                await page.close()
+            except Exception:
+                pass
+        if self.storage_state:
+            try:
+                await context.storage_state(path=self.storage_state)
+                # holds session cookies
+                os.chmod(self.storage_state, 0o600)
+            except Exception as e:
+                logger.warning("Could not save browser storage state: %s", e)
+
+    def shutdown(self):
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(30)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+            self._loop = self._thread = None
+
+
+browser_manager = BrowserManager()
+atexit.register(browser_manager.shutdown)
@@ -0,0 +1,98 @@
+# app/cache.py
+"""In-process response cache for the listing read endpoints.
+
+Entries are keyed on the normalized request, expire after a TTL and are
+evicted least-recently-used first. Every write in `crud` bumps a generation
+counter, which makes all entries cached before it unusable at once.
+The cache is per process: writes made by another process (another uvicorn
+worker, a standalone scraper) become visible once the TTL runs out.
+"""
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = None, ttl: float = None):
+        self.max_entries = CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl = CACHE_TTL_SECONDS if ttl is None else ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key):
+        """Return `(etag, body, headers)` for a live entry, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                generation, expires, etag, body, headers = entry
+                if generation == self.generation and expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return etag, body, headers
+                del self._entries[key]
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key, body: bytes, headers: dict, generation: int):
+        """Store a response computed while `generation` was current; returns its ETag."""
+        etag = make_etag(body)
+        if not self.enabled:
+            return etag
+        with self._lock:
+            # a write landed while this response was being built
+            if generation != self.generation:
+                return etag
+            self._entries[key] = (generation, time.monotonic() + self.ttl, etag, body, headers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+        return etag
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.counters["invalidations"] += 1
+
+    def note_not_modified(self):
+        with self._lock:
+            self.counters["not_modified"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), generation=self.generation,
+                        ttl_seconds=self.ttl, max_entries=self.max_entries)
+
+
+def make_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        # weak comparison: W/"x" matches "x"
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+response_cache = ResponseCache()
+
+
+def invalidate():
+    response_cache.invalidate()
@@ -0,0 +1,112 @@
+# app/cli.py
+"""Command line maintenance tasks.
+
+    python -m app.cli load listings.ndjson [more.ndjson.gz ...]
+    cat dump.ndjson | python -m app.cli load -
+    python -m app.cli reextract --workers 4
+    python -m app.cli enqueue [URL ...]
+    python -m app.cli frontier-worker --fetch http --exit-when-idle
+"""
+import sys
+import asyncio
+import gzip
+import json
+import argparse
+from .db import SessionLocal
+from .services import BulkLoader
+
+
+def _open(path):
+    if path == "-":
+        return sys.stdin.buffer
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def cmd_load(args):
+    failed = 0
+    for path in args.files:
+        db = SessionLocal()
+        fh = _open(path)
+        try:
+            report = BulkLoader(db, batch_size=args.batch_size, max_errors=args.max_errors).load(fh)
+        finally:
+            if fh is not sys.stdin.buffer:
+                fh.close()
+            db.close()
+        for err in report["errors"]:
+            print(f"{path}:{err['line']}: {err['error']}", file=sys.stderr)
+        if report["failed"] > len(report["errors"]):
+            print(f"{path}: {report['failed'] - len(report['errors'])} more errors not shown", file=sys.stderr)
+        print(json.dumps(dict(report, file=path, errors=len(report["errors"]))))
+        failed += report["failed"]
+    return 1 if failed else 0
+
+
+def cmd_reextract(args):
+    from .reextract import reextract_listings
+    db = SessionLocal()
+    try:
+        stats = reextract_listings(db, workers=args.workers, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(json.dumps(stats))
+    return 0
+
+
+def cmd_enqueue(args):
+    from . import frontier
+    from .db import engine
+    from .models import ensure_schema
+    ensure_schema(engine)
+    db = SessionLocal()
+    try:
+        targets = args.urls or frontier.default_targets()
+        queued = frontier.enqueue_targets(db, targets)
+        if args.interval is not None:
+            for url in targets:
+                frontier.set_domain_interval(db, frontier.domain_of(url), args.interval)
+        print(json.dumps(dict(frontier.counts(db), queued=queued)))
+    finally:
+        db.close()
+    return 0
+
+
+def cmd_frontier_worker(args):
+    from .frontier import FrontierWorker
+    worker = FrontierWorker(fetch=args.fetch, batch_size=args.batch_size, concurrency=args.concurrency,
+                            domains=args.domain)
+    print(json.dumps(asyncio.run(worker.run(exit_when_idle=args.exit_when_idle))))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+    load = sub.add_parser("load", help="upsert listings from NDJSON files (.gz ok, - for stdin)")
+    load.add_argument("files", nargs="+")
+    load.add_argument("--batch-size", type=int, default=None)
+    load.add_argument("--max-errors", type=int, default=None, help="per-line errors to print per file")
+    load.set_defaults(func=cmd_load)
+    reextract = sub.add_parser("reextract", help="re-run extraction over the HTML archive and update listings")
+    reextract.add_argument("--workers", type=int, default=None, help="parser processes (0 = in process)")
+    reextract.add_argument("--batch-size", type=int, default=500)
+    reextract.set_defaults(func=cmd_reextract)
+    enqueue = sub.add_parser("enqueue", help="queue scrape targets in the shared frontier (default SCRAPE_TARGETS)")
+    enqueue.add_argument("urls", nargs="*")
+    enqueue.add_argument("--interval", type=float, default=None, help="seconds between requests to their domains")
+    enqueue.set_defaults(func=cmd_enqueue)
+    worker = sub.add_parser("frontier-worker", help="claim and scrape urls from the frontier")
+    worker.add_argument("--fetch", choices=["browser", "http"], default=None)
+    worker.add_argument("--batch-size", type=int, default=None)
+    worker.add_argument("--concurrency", type=int, default=None, help="pages fetched at once")
+    worker.add_argument("--domain", action="append", help="only claim urls of this host[:port] (repeatable)")
+    worker.add_argument("--exit-when-idle", action="store_true", help="stop once nothing is pending or leased")
+    worker.set_defaults(func=cmd_frontier_worker)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
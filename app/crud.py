@@ -5,61 +5,378 @@ This module provides create, read, update, and delete helpers as well as
 an idempotent upsert utility. Edits here are documentation-only and do not
 affect runtime behavior.
 """
+import os
+import re
+import json
+import base64
+import unicodedata
+from datetime import datetime
+from decimal import Decimal
 from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy import select, and_, func
-from .models import Listing
+from sqlalchemy import select, update, and_, func, tuple_, literal_column
+from .models import Listing, ListingPriceHistory
+from . import cache, stats
+from .metrics import timed_query
 from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any, List
 
-def upsert_listing(db: Session, data: Dict[str, Any]):
+# rows per multi-row INSERT ... ON CONFLICT statement in `upsert_listings`
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "500"))
+
+_WORD_RE = re.compile(r"\w+")
+
+def normalize_location(value):
+    """Lower-case `value`, strip accents and punctuation and collapse spaces."""
+    if not value:
+        return None
+    text = unicodedata.normalize("NFKD", value)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return " ".join(_WORD_RE.findall(text)) or None
+
+def _prefix_tsquery(text):
+    # every word must match the start of a word in the document ("mani" finds
+    # "Metro Manila"); only \w tokens reach to_tsquery, so input cannot break its syntax
+    words = _WORD_RE.findall(normalize_location(text) or "")
+    if not words:
+        return None
+    return func.to_tsquery(literal_column("'simple'"), " & ".join(w + ":*" for w in words))
+
+# an upsert rewrites an existing row only when one of these differs; otherwise
+# just last_seen_at is bumped. raw_json (the archive reference) follows along
+# with a rewrite but does not cause one by itself.
+TRACKED_COLUMNS = ["title", "price", "currency", "year", "mileage", "location", "url"]
+
+def _upsert_stmt(rows: List[Dict[str, Any]]):
+    """INSERT ... ON CONFLICT for `rows`, returning the listing ids actually written."""
     table = Listing.__table__
-    stmt = pg_insert(table).values(**data)
-    # copy all updatable columns from EXCLUDED, but override timestamps
-    excluded = {c.name: stmt.excluded[c.name] for c in table.columns if c.name not in ("id", "created_at")}
+    rows = [dict(r, location_norm=normalize_location(r.get("location"))) for r in rows]
+    stmt = pg_insert(table).values(rows)
+    # copy all updatable columns from EXCLUDED, but override timestamps;
+    # generated columns are recomputed by Postgres
+    excluded = {c.name: stmt.excluded[c.name] for c in table.columns
+                if c.name not in ("id", "created_at") and c.computed is None}
     # ensure refresh semantics on re-run
     excluded["updated_at"] = func.now()
     excluded["last_seen_at"] = func.now()
-    stmt = stmt.on_conflict_do_update(index_elements=['listing_id'], set_=excluded)
-    db.execute(stmt)
+    changed = tuple_(*(table.c[c] for c in TRACKED_COLUMNS)).is_distinct_from(
+        tuple_(*(stmt.excluded[c] for c in TRACKED_COLUMNS)))
+    return stmt.on_conflict_do_update(index_elements=['listing_id'], set_=excluded, where=changed) \
+        .returning(table.c.listing_id)
+
+def _touch_stmt(listing_ids: List[str]):
+    # updated_at is set explicitly, or its onupdate default would bump it too
+    return (update(Listing).where(Listing.listing_id.in_(listing_ids))
+            .values(last_seen_at=func.now(), updated_at=Listing.updated_at))
+
+@timed_query
+def upsert_listing(db: Session, data: Dict[str, Any]):
+    if db.execute(_upsert_stmt([data])).first() is None:
+        db.execute(_touch_stmt([data["listing_id"]]))
+    db.commit()
+    stats.refresh_quietly(db)
+    cache.invalidate()
+
+@timed_query
+def upsert_listings(db: Session, rows: List[Dict[str, Any]], batch_size: int = None):
+    """Upsert many listings with one multi-row statement per batch.
+
+    Rows are de-duplicated on `listing_id` (last one wins) because Postgres
+    refuses to update the same row twice within one ON CONFLICT statement.
+    Missing keys are written as NULL, which matches what `upsert_listing`
+    does for a payload without them. Listings whose `TRACKED_COLUMNS` are
+    unchanged only get `last_seen_at` bumped, in one UPDATE per batch.
+    Everything is committed once at the end.
+    """
+    batch_size = batch_size or UPSERT_BATCH_SIZE
+    by_id = {}
+    for r in rows:
+        by_id[r["listing_id"]] = r
+    if not by_id:
+        return 0
+    columns = [c.name for c in Listing.__table__.columns
+               if c.name not in ("id", "created_at", "updated_at", "last_seen_at") and c.computed is None]
+    unique = [{k: r.get(k) for k in columns} for r in by_id.values()]
+    for i in range(0, len(unique), batch_size):
+        batch = unique[i:i + batch_size]
+        written = set(db.execute(_upsert_stmt(batch)).scalars())
+        unchanged = [r["listing_id"] for r in batch if r["listing_id"] not in written]
+        if unchanged:
+            db.execute(_touch_stmt(unchanged))
+    db.commit()
+    stats.refresh_quietly(db)
+    cache.invalidate()
+    return len(unique)
+
+@timed_query
+def get_freshness(db: Session, listing_ids: List[str], max_age_seconds: float) -> Dict[str, bool]:
+    """Map each known listing id to whether it was seen within `max_age_seconds`.
+
+    Ids missing from the result are not in the table yet. Runs as one query
+    and compares against the database clock, the same one that sets `last_seen_at`.
+    """
+    if not listing_ids:
+        return {}
+    cutoff = func.now() - func.make_interval(0, 0, 0, 0, 0, 0, max_age_seconds)
+    stmt = select(Listing.listing_id, Listing.last_seen_at >= cutoff).where(Listing.listing_id.in_(listing_ids))
+    return {lid: bool(fresh) for lid, fresh in db.execute(stmt)}
+
+@timed_query
+def touch_listings(db: Session, listing_ids: List[str]) -> int:
+    """Bump `last_seen_at` for listings seen without re-fetching them."""
+    if not listing_ids:
+        return 0
+    res = db.execute(_touch_stmt(listing_ids))
     db.commit()
+    cache.invalidate()
+    return res.rowcount
 
-def get_listing(db: Session, listing_id: str):
-    return db.query(Listing).filter(Listing.listing_id == listing_id).first()
+def _projection(columns: List[str] = None):
+    # the entity, or plain rows of just these columns (the read endpoints' path)
+    return [getattr(Listing, c) for c in columns] if columns else [Listing]
 
-def list_listings(db: Session, skip: int = 0, limit: int = 50, filters: Dict = None):
-    q = db.query(Listing)
+@timed_query
+def get_listing(db: Session, listing_id: str, columns: List[str] = None):
+    """The listing, or with `columns` a row of only those columns; None if unknown."""
+    return db.query(*_projection(columns)).filter(Listing.listing_id == listing_id).first()
+
+# sortable columns for list_listings; each is paired with `id` as a tie-breaker
+# and backed by a composite (column, id) index
+SORT_COLUMNS = {"id": Listing.id, "price": Listing.price, "year": Listing.year, "last_seen_at": Listing.last_seen_at}
+
+def _filter_conditions(filters: Dict = None):
+    conds = []
     if filters:
-        conds = []
+        # Decimal bounds bind as numeric: a float would make asyncpg cast the
+        # column to float8 (`price >= $1::FLOAT`), which no index can serve
         if filters.get("min_price") is not None:
-            conds.append(Listing.price >= filters["min_price"])
+            conds.append(Listing.price >= Decimal(str(filters["min_price"])))
         if filters.get("max_price") is not None:
-            conds.append(Listing.price <= filters["max_price"])
+            conds.append(Listing.price <= Decimal(str(filters["max_price"])))
         if filters.get("min_year") is not None:
             conds.append(Listing.year >= filters["min_year"])
         if filters.get("max_year") is not None:
             conds.append(Listing.year <= filters["max_year"])
         if filters.get("location"):
-            conds.append(Listing.location.ilike(f"%{filters['location']}%"))
-        if conds:
-            q = q.filter(and_(*conds))
-    total = q.count()
-    items = q.offset(skip).limit(limit).all()
-    return {"total": total, "items": items}
+            query = _prefix_tsquery(filters["location"])
+            if query is not None:
+                conds.append(Listing.location_tsv.op("@@")(query))
+        if filters.get("q"):
+            query = _prefix_tsquery(filters["q"])
+            if query is not None:
+                conds.append(Listing.search_vector.op("@@")(query))
+    return conds
+
+def encode_cursor(sort: str, obj) -> str:
+    key = sort.lstrip("-")
+    value = getattr(obj, key)
+    if isinstance(value, Decimal):
+        value = str(value)
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, obj.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str):
+    """Return the `(sort_value, id)` position encoded in `cursor`.
+
+    Raises ValueError for malformed cursors or cursors issued for another sort.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, last_id = json.loads(raw)
+        key = sort.lstrip("-")
+        if value is not None:
+            if key == "price":
+                value = Decimal(value)
+            elif key == "last_seen_at":
+                value = datetime.fromisoformat(value)
+            else:
+                value = int(value)
+        last_id = int(last_id)
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+    if cursor_sort != sort:
+        raise ValueError("cursor was issued for a different sort")
+    return value, last_id
+
+def _keyset_items(q, sort: str, after, limit: int):
+    desc = sort.startswith("-")
+    key = sort.lstrip("-")
+    col, id_ = SORT_COLUMNS[key], Listing.id
+    if key == "id":
+        if after:
+            q = q.filter(id_ < after[1] if desc else id_ > after[1])
+        return q.order_by(id_.desc() if desc else id_).limit(limit).all()
 
+    # Postgres sorts NULLs last ascending and first descending. Each half is
+    # read with its own query so the non-NULL half stays a (col, id) index range scan.
+    def values(q, after):
+        q = q.filter(col.isnot(None))
+        if after:
+            pos = tuple_(col, id_)
+            q = q.filter(pos < tuple_(*after) if desc else pos > tuple_(*after))
+        return q.order_by(col.desc(), id_.desc()) if desc else q.order_by(col, id_)
+
+    def nulls(q, after):
+        q = q.filter(col.is_(None))
+        if after:
+            q = q.filter(id_ < after[1] if desc else id_ > after[1])
+        return q.order_by(id_.desc() if desc else id_)
+
+    halves = [nulls, values] if desc else [values, nulls]
+    if after is not None and (after[0] is None) == (halves[1] is nulls):
+        halves = halves[1:]
+    items = []
+    for i, half in enumerate(halves):
+        items += half(q, after if i == 0 else None).limit(limit - len(items)).all()
+        if len(items) >= limit:
+            break
+    return items
+
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) of a statement, compiled together with it so its
+    bind parameters are rendered the way each driver expects (named for
+    psycopg2, positional for asyncpg)."""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+@compiles(_Explain)
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+def estimate_count(db: Session, q) -> int:
+    """Row estimate for `q` from the query planner, without running it."""
+    plan = db.connection().execute(_Explain(q.statement)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+@timed_query
+def list_listings(db: Session, skip: int = 0, limit: int = 50, filters: Dict = None,
+                  sort: str = None, cursor: str = None, count: str = None, columns: List[str] = None):
+    """Return a page of listings ordered by `sort` (prefix with "-" for descending).
+
+    Without `cursor` the page starts at offset `skip`; with a cursor taken from a
+    previous page's `next_cursor` it continues right after that row instead,
+    which costs the same at any depth. `count` is None (no total), "exact"
+    (COUNT over the filtered rows) or "estimate" (planner row estimate).
+    With a `q` search filter the default sort is "rank" (best match first),
+    which pages by offset only. With `columns` the items are rows of those
+    columns, followed by any of `id` and the sort column the cursor needs.
+    """
+    search = _prefix_tsquery(filters.get("q")) if filters else None
+    sort = sort or ("rank" if search is not None else "id")
+    if sort == "rank":
+        if search is None:
+            raise ValueError("sort=rank requires a q search")
+        if cursor:
+            raise ValueError("cursor pagination is not supported for sort=rank")
+    elif sort.lstrip("-") not in SORT_COLUMNS:
+        raise ValueError(f"unsupported sort: {sort}")
+    if columns:
+        needed = [k for k in dict.fromkeys(("id", sort.lstrip("-"))) if k in SORT_COLUMNS and k not in columns]
+        columns = list(columns) + needed
+    q = db.query(*_projection(columns))
+    conds = _filter_conditions(filters)
+    if conds:
+        q = q.filter(and_(*conds))
+    total = None
+    if count == "exact":
+        total = q.count()
+    elif count == "estimate":
+        total = estimate_count(db, q)
+    # read one row past the page to learn whether another page exists
+    if cursor:
+        items = _keyset_items(q, sort, decode_cursor(cursor, sort), limit + 1)
+    elif sort == "rank":
+        rank = func.ts_rank(Listing.search_vector, search)
+        items = q.order_by(rank.desc(), Listing.id).offset(skip).limit(limit + 1).all()
+    else:
+        key, desc = sort.lstrip("-"), sort.startswith("-")
+        col = SORT_COLUMNS[key]
+        order = [col.desc(), Listing.id.desc()] if desc else [col, Listing.id]
+        items = q.order_by(*order[:1] if key == "id" else order).offset(skip).limit(limit + 1).all()
+    next_cursor = None
+    if sort != "rank" and 0 < limit < len(items):
+        next_cursor = encode_cursor(sort, items[limit - 1])
+    return {"total": total, "items": items[:limit], "next_cursor": next_cursor}
+
+# columns `stream_listings` can project; the tsvector search documents are internal
+EXPORT_COLUMNS = [c.name for c in Listing.__table__.columns if c.computed is None]
+
+def stream_listings(db: Session, filters: Dict = None, columns: List[str] = None, batch_size: int = 1000):
+    """Yield rows of `columns` for every listing matching `filters`, in id order.
+
+    Plain column tuples are read through a server-side cursor `batch_size`
+    rows at a time, so memory does not grow with the size of the result.
+    """
+    table = Listing.__table__
+    cols = [table.c[name] for name in (columns or EXPORT_COLUMNS)]
+    stmt = select(*cols).where(*_filter_conditions(filters)).order_by(table.c.id)
+    yield from db.execute(stmt, execution_options={"yield_per": batch_size})
+
+@timed_query
+def get_price_history(db: Session, listing_id: str, limit: int = 100):
+    """Price/mileage observations of a listing, newest first; None for an unknown listing."""
+    if get_listing(db, listing_id) is None:
+        return None
+    stmt = (select(ListingPriceHistory).where(ListingPriceHistory.listing_id == listing_id)
+            .order_by(ListingPriceHistory.observed_at.desc(), ListingPriceHistory.id.desc()).limit(limit))
+    return db.execute(stmt).scalars().all()
+
+@timed_query
 def update_listing(db: Session, listing_id: str, updates: Dict[str, Any]):
     obj = db.query(Listing).filter(Listing.listing_id == listing_id).first()
     if not obj:
         return None
     for k, v in updates.items():
         setattr(obj, k, v)
+    if "location" in updates:
+        obj.location_norm = normalize_location(obj.location)
     db.commit()
+    stats.refresh_quietly(db)
+    cache.invalidate()
     db.refresh(obj)
     return obj
 
+@timed_query
 def delete_listing(db: Session, listing_id: str):
     obj = db.query(Listing).filter(Listing.listing_id == listing_id).first()
     if not obj:
         return False
     db.delete(obj)
     db.commit()
+    stats.refresh_quietly(db)
+    cache.invalidate()
     return True
+
+
+# Async variants for an `AsyncSession` (see `db.AsyncSessionLocal`). Single-row
+# reads are native; the rest run the sync implementations above through
+# `run_sync`, which drives them on the asyncpg connection without blocking the
+# event loop and keeps one copy of the keyset/upsert logic.
+
+@timed_query
+async def async_get_listing(db: AsyncSession, listing_id: str, columns: List[str] = None):
+    res = await db.execute(select(*_projection(columns)).where(Listing.listing_id == listing_id).limit(1))
+    return res.first() if columns else res.scalars().first()
+
+async def async_list_listings(db: AsyncSession, **kwargs):
+    return await db.run_sync(list_listings, **kwargs)
+
+async def async_upsert_listing(db: AsyncSession, data: Dict[str, Any]):
+    return await db.run_sync(upsert_listing, data)
+
+async def async_upsert_listings(db: AsyncSession, rows: List[Dict[str, Any]], batch_size: int = None):
+    return await db.run_sync(upsert_listings, rows, batch_size)
+
+async def async_update_listing(db: AsyncSession, listing_id: str, updates: Dict[str, Any]):
+    return await db.run_sync(update_listing, listing_id, updates)
+
+async def async_delete_listing(db: AsyncSession, listing_id: str):
+    return await db.run_sync(delete_listing, listing_id)
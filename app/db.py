@@ -5,9 +5,13 @@ Centralized SQLAlchemy engine creation and session dependency helper for FastAPI
 This edit only adds documentation and is behavior-neutral.
 """
 import os
+import time
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from . import metrics
 
 load_dotenv()
 
@@ -19,20 +23,67 @@ if not DATABASE_URL:
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+psycopg2://", 1)
 
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.db_checkout_seconds.observe(elapsed)
+            metrics.add_span("db.checkout", elapsed)
+
 # tuned pool settings for cloud DB
 engine = create_engine(
     DATABASE_URL,
+    poolclass=TimedQueuePool,
     pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
     max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
     pool_pre_ping=True
 )
 
+metrics.Gauge("db_pool_checked_out", "Connections currently checked out of the pool.", fn=engine.pool.checkedout)
+metrics.Gauge("db_pool_idle", "Idle connections held by the pool.", fn=engine.pool.checkedin)
+metrics.Gauge("db_pool_overflow", "Connections open beyond pool_size (negative while below it).",
+              fn=engine.pool.overflow)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# opt-in asyncpg engine for the async API routes; the scraper and tests keep
+# using the sync engine above. Requires `pip install asyncpg`.
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+
+def _async_url(url: str):
+    u = make_url(url).set(drivername="postgresql+asyncpg")
+    # asyncpg takes `ssl` where libpq takes `sslmode`
+    if "sslmode" in u.query:
+        u = u.update_query_dict({"ssl": u.query["sslmode"]}).difference_update_query(["sslmode"])
+    return u
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_engine = create_async_engine(
+        os.getenv("POSTGRES_ASYNC_URL") or _async_url(DATABASE_URL),
+        pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        pool_pre_ping=True
+    )
+    # objects stay usable after commit without an implicit (blocking) refresh
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,77 @@
+# app/export.py
+"""Streaming NDJSON/CSV export of listings for `GET /listings/export`.
+
+Rows come from `crud.stream_listings` and are encoded one batch at a time,
+so an export holds a single batch in memory however many rows it returns.
+"""
+import os
+import io
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal
+from . import crud
+from .db import SessionLocal
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+# the fields of schemas.ListingOut; raw_json and location_norm only on request
+DEFAULT_COLUMNS = [c for c in crud.EXPORT_COLUMNS if c not in ("raw_json", "location_norm")]
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def parse_columns(spec: str = None):
+    """Column list from a comma-separated `spec`; raises ValueError for unknown names."""
+    if not spec:
+        return list(DEFAULT_COLUMNS)
+    columns = list(dict.fromkeys(c.strip() for c in spec.split(",") if c.strip()))
+    unknown = [c for c in columns if c not in crud.EXPORT_COLUMNS]
+    if unknown or not columns:
+        raise ValueError(f"unknown columns: {', '.join(unknown)}; available: {', '.join(crud.EXPORT_COLUMNS)}")
+    return columns
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_chunks(rows, columns, batch_size):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, map(_plain, row))), separators=(",", ":"), ensure_ascii=False))
+        if len(lines) >= batch_size:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def _csv_chunks(rows, columns, batch_size):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    n = 0
+    for row in rows:
+        writer.writerow([json.dumps(v) if isinstance(v, (dict, list)) else _plain(v) for v in row])
+        n += 1
+        if n % batch_size == 0:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def export_listings(filters: dict = None, columns=None, fmt: str = "ndjson", batch_size: int = None):
+    """Generate the encoded export; the generator owns its database session."""
+    columns = columns or list(DEFAULT_COLUMNS)
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    encode = _csv_chunks if fmt == "csv" else _ndjson_chunks
+    db = SessionLocal()
+    try:
+        yield from encode(crud.stream_listings(db, filters, columns, batch_size), columns, batch_size)
+    finally:
+        db.close()
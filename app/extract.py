@@ -0,0 +1,166 @@
+# app/extract.py
+"""Field extraction for marketplace listing pages.
+
+`extract_listing` is a pure function of the page HTML and its URL so it can
+run in a worker process; it must not touch the browser or the database.
+"""
+import os
+import re
+from bs4 import BeautifulSoup
+
+# try to detect available parser; prefer lxml if installed
+try:
+    import lxml.html  # type: ignore
+    from lxml import etree  # type: ignore
+    _bs_parser = "lxml"
+except Exception:
+    _bs_parser = "html.parser"
+
+# extraction engine: "fast" walks an lxml tree once, "bs4" is the original
+# BeautifulSoup logic; "auto" picks "fast" whenever lxml is available
+EXTRACT_ENGINE = os.getenv("EXTRACT_ENGINE", "auto")
+if EXTRACT_ENGINE not in ("fast", "bs4") or (EXTRACT_ENGINE == "fast" and _bs_parser != "lxml"):
+    EXTRACT_ENGINE = "fast" if _bs_parser == "lxml" else "bs4"
+
+_ID_RE = re.compile(r"/item/([^/?&]+)")
+_PRICE_RE = re.compile(r"([₱\$€£]|PHP)\s*([0-9,\.]+)")
+_YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+_MILEAGE_RE = re.compile(r"(\d{1,3}(?:,\d{3})+|\d{2,6})\s*(km|kilometers|kms)", re.I)
+_NON_DIGIT_RE = re.compile(r"[^\d]")
+# strings inside these tags are not part of BeautifulSoup's get_text() output
+_STRING_CONTAINERS = {"rt", "rp", "style", "script", "template"}
+
+def _get_id(url):
+    m = _ID_RE.search(url)
+    return m.group(1) if m else url.split("/")[-1]
+
+def _build_listing(u, title, text_blob, location):
+    price_m = _PRICE_RE.search(text_blob)
+    price = float(price_m.group(2).replace(",", "")) if price_m else None
+    currency = price_m.group(1) if price_m else None
+    year_m = _YEAR_RE.search(text_blob)
+    year = int(year_m.group(0)) if year_m else None
+    mileage_m = _MILEAGE_RE.search(text_blob)
+    mileage = int(_NON_DIGIT_RE.sub("", mileage_m.group(1))) if mileage_m else None
+    listing_id = _get_id(u)
+    return {
+        "listing_id": listing_id,
+        "title": title,
+        "price": price,
+        "currency": currency,
+        "year": year,
+        "mileage": mileage,
+        "location": location,
+        "url": u,
+        # set by the caller: a reference to the archived page (see app.archive)
+        "raw_json": None
+    }
+
+def extract_listing_bs4(html: str, u: str) -> dict:
+    # use chosen parser (lxml preferred, fallback to html.parser)
+    soup = BeautifulSoup(html, _bs_parser)
+    title = soup.find("meta", property="og:title")
+    title = title["content"].strip() if title else soup.title.string.strip() if soup.title else None
+    text_blob = soup.get_text(" ", strip=True)
+    location = None
+    loc = soup.select_one("[data-testid*='location'], [class*='location']")
+    if loc: location = loc.get_text(" ", strip=True)
+    return _build_listing(u, title, text_blob, location)
+
+def _is_location(el):
+    testid = el.get("data-testid")
+    if testid is not None and "location" in testid:
+        return True
+    cls = el.get("class")
+    return cls is not None and "location" in cls
+
+def _walk_text(root, strings, found=None):
+    """One pass over `root` appending the strings get_text() would return.
+
+    When `found` is a dict, the first og:title meta, <title> and location
+    elements seen are recorded in it as well.
+    """
+    # nearest enclosing string-container tag name for each open element;
+    # only strings in the same container as `root` itself are kept
+    keep = root.tag if root.tag in _STRING_CONTAINERS else None
+    outer = keep or next((a.tag for a in root.iterancestors() if a.tag in _STRING_CONTAINERS), None)
+    ctx = [outer]
+    for event, el in etree.iterwalk(root, events=("start", "end", "comment", "pi")):
+        if event == "start":
+            tag = el.tag
+            if el is not root:
+                ctx.append(tag if tag in _STRING_CONTAINERS else ctx[-1])
+            if found is not None:
+                if tag == "meta" and "og" not in found and el.get("property") == "og:title":
+                    found["og"] = el
+                elif tag == "title" and "title" not in found:
+                    found["title"] = el
+                if "location" not in found and _is_location(el):
+                    found["location"] = el
+            text = el.text
+            if text and ctx[-1] == keep:
+                text = text.strip()
+                if text:
+                    strings.append(text)
+            continue
+        if event == "end":
+            if el is root:
+                break
+            ctx.pop()
+        # comments and processing instructions contribute only their tail
+        tail = el.tail
+        if tail and ctx[-1] == keep:
+            tail = tail.strip()
+            if tail:
+                strings.append(tail)
+    return strings
+
+def _tag_string(el):
+    # mirrors bs4's Tag.string: the only child string, looking through single-child tags
+    children = [el.text] if el.text else []
+    for c in el:
+        children.append(c)
+        if c.tail:
+            children.append(c.tail)
+    if len(children) != 1:
+        return None
+    child = children[0]
+    if isinstance(child, str):
+        return child
+    if not isinstance(child.tag, str):
+        return child.text
+    return _tag_string(child)
+
+def extract_listing_fast(html: str, u: str) -> dict:
+    try:
+        root = lxml.html.document_fromstring(html)
+    except etree.ParserError:
+        # empty documents: bs4 yields an empty soup
+        return _build_listing(u, None, "", None)
+    except ValueError:
+        # lxml refuses str input carrying an XML encoding declaration
+        return extract_listing_bs4(html, u)
+    strings, found = [], {}
+    # markup after </html> ends up in sibling trees of the document root
+    for top in [*reversed(list(root.itersiblings(preceding=True))), root, *root.itersiblings()]:
+        if isinstance(top.tag, str):
+            _walk_text(top, strings, found)
+    og, title_el, loc_el = found.get("og"), found.get("title"), found.get("location")
+    if og is not None:
+        content = og.get("content")
+        if content is None:
+            raise KeyError("content")
+        title = content.strip()
+    elif title_el is not None:
+        title = _tag_string(title_el).strip()
+    else:
+        title = None
+    location = None
+    if loc_el is not None:
+        location = " ".join(_walk_text(loc_el, []))
+    return _build_listing(u, title, " ".join(strings), location)
+
+def extract_listing(html: str, u: str) -> dict:
+    if EXTRACT_ENGINE == "fast":
+        return extract_listing_fast(html, u)
+    return extract_listing_bs4(html, u)
@@ -0,0 +1,244 @@
+# app/fetcher.py
+"""Concurrent detail-page fetching on top of the async Playwright API.
+
+A fixed pool of pages is shared by worker tasks; a per-host limiter keeps the
+number of in-flight requests and the request rate against one host polite.
+Results are yielded as soon as each page finishes so ingestion can start
+before the slowest URL is done. `RoutePolicy` keeps the browser from
+downloading resources the extractors never look at. `iter_http_pages` does
+the same job without a browser for pages that need no JavaScript.
+"""
+import os
+import asyncio
+import time
+from fnmatch import fnmatchcase
+from urllib.parse import urlsplit
+import requests
+from .utils import async_retry
+from . import metrics
+
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))
+# politeness: in-flight requests per host and minimum gap between request starts
+SCRAPE_PER_HOST = int(os.getenv("SCRAPE_PER_HOST", "2"))
+SCRAPE_HOST_DELAY = float(os.getenv("SCRAPE_HOST_DELAY", "0.5"))
+# time given to client-side rendering after navigation
+SCRAPE_SETTLE_SECONDS = float(os.getenv("SCRAPE_SETTLE_SECONDS", "1"))
+# request interception: block|audit|off. audit lets everything through but
+# reports what blocking would have saved, to calibrate the lists below
+SCRAPE_ROUTE_MODE = os.getenv("SCRAPE_ROUTE_MODE", "block")
+# Playwright resource types and URL globs to abort; allow globs win over both
+SCRAPE_BLOCK_RESOURCES = os.getenv("SCRAPE_BLOCK_RESOURCES", "image,media,font")
+SCRAPE_BLOCK_URLS = os.getenv("SCRAPE_BLOCK_URLS", "*doubleclick.net/*,*google-analytics.com/*,*googletagmanager.com/*")
+SCRAPE_ALLOW_URLS = os.getenv("SCRAPE_ALLOW_URLS", "")
+# plain HTTP fetching (`iter_http_pages`)
+SCRAPE_HTTP_TIMEOUT = float(os.getenv("SCRAPE_HTTP_TIMEOUT", "30"))
+SCRAPE_HTTP_USER_AGENT = os.getenv("SCRAPE_HTTP_USER_AGENT", "Mozilla/5.0 (compatible; car-service)")
+
+
+def _split(value):
+    return [v.strip() for v in value.split(",") if v.strip()] if isinstance(value, str) else list(value or [])
+
+
+class HostLimiter:
+    def __init__(self, per_host: int = None, min_interval: float = None, intervals: dict = None):
+        self.per_host = per_host or SCRAPE_PER_HOST
+        self.min_interval = SCRAPE_HOST_DELAY if min_interval is None else min_interval
+        # per-host overrides of min_interval
+        self.intervals = intervals or {}
+        self._sems = {}
+        self._locks = {}
+        self._last_start = {}
+
+    def _host(self, url):
+        return urlsplit(url).netloc.lower()
+
+    async def acquire(self, url):
+        host = self._host(url)
+        sem = self._sems.setdefault(host, asyncio.Semaphore(self.per_host))
+        await sem.acquire()
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            wait = self._last_start.get(host, 0) + self.intervals.get(host, self.min_interval) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_start[host] = time.monotonic()
+        return host
+
+    def release(self, host):
+        self._sems[host].release()
+
+
+class RoutePolicy:
+    """Aborts requests for blocked resource types and URL patterns on a context.
+
+    Documents are never blocked. Counts of blocked and loaded requests and the
+    bytes loaded are kept in `stats`. In audit mode nothing is aborted: the
+    blocked counters and `bytes_blockable` report what blocking would save.
+    """
+
+    def __init__(self, mode: str = None, block_resources=None, block_urls=None, allow_urls=None):
+        self.mode = mode or SCRAPE_ROUTE_MODE
+        self.block_resources = set(_split(SCRAPE_BLOCK_RESOURCES if block_resources is None else block_resources))
+        self.block_urls = _split(SCRAPE_BLOCK_URLS if block_urls is None else block_urls)
+        self.allow_urls = _split(SCRAPE_ALLOW_URLS if allow_urls is None else allow_urls)
+        self.stats = {"mode": self.mode, "requests_blocked": 0, "requests_loaded": 0,
+                      "bytes_loaded": 0, "bytes_blockable": 0, "blocked_by_type": {}}
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type == "document" or any(fnmatchcase(url, p) for p in self.allow_urls):
+            return False
+        return resource_type in self.block_resources or any(fnmatchcase(url, p) for p in self.block_urls)
+
+    async def install(self, context):
+        if self.mode == "off":
+            return
+        await context.route("**/*", self._handle)
+        context.on("requestfinished", self._finished)
+
+    async def uninstall(self, context):
+        """Detach from a context that outlives this policy (a warm browser's)."""
+        if self.mode == "off":
+            return
+        await context.unroute("**/*", self._handle)
+        context.remove_listener("requestfinished", self._finished)
+
+    async def _handle(self, route, request):
+        if self.should_block(request.resource_type, request.url):
+            # in audit mode these count the requests blocking would have saved
+            self.stats["requests_blocked"] += 1
+            by_type = self.stats["blocked_by_type"]
+            by_type[request.resource_type] = by_type.get(request.resource_type, 0) + 1
+            if self.mode == "block":
+                await route.abort("blockedbyclient")
+                return
+        await route.continue_()
+
+    async def _finished(self, request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            # the page or context went away before the sizes could be read
+            return
+        size = sizes["responseBodySize"] + sizes["responseHeadersSize"]
+        self.stats["requests_loaded"] += 1
+        self.stats["bytes_loaded"] += size
+        if self.mode == "audit" and self.should_block(request.resource_type, request.url):
+            self.stats["bytes_blockable"] += size
+
+
+async def fetch_page(page, url, limiter: HostLimiter = None):
+    """Load `url` once in `page` and return the rendered HTML."""
+    host = await limiter.acquire(url) if limiter else None
+    try:
+        await page.goto(url, timeout=60000)
+        await asyncio.sleep(SCRAPE_SETTLE_SECONDS)
+        return await page.content()
+    finally:
+        if host is not None:
+            limiter.release(host)
+
+
+@async_retry(Exception, tries=3, delay=2, backoff=2)
+async def fetch_url_content(page, url, limiter: HostLimiter = None):
+    return await fetch_page(page, url, limiter)
+
+
+async def iter_pages(context, urls, concurrency: int = None, limiter: HostLimiter = None, retry: bool = True):
+    """Fetch `urls` with up to `concurrency` pages and yield `(url, html, error)`.
+
+    `html` is None when the URL failed after retries; `error` then holds the
+    final exception (a `PWTimeout` for navigation timeouts). With
+    `retry=False` each URL is tried once and retrying is left to the caller.
+    """
+    fetch = fetch_url_content if retry else fetch_page
+    concurrency = max(1, min(concurrency or SCRAPE_CONCURRENCY, len(urls) or 1))
+    limiter = limiter or HostLimiter()
+    todo = asyncio.Queue()
+    for u in urls:
+        todo.put_nowait(u)
+    results = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def finished():
+        # the consumer counts these markers; once it has stopped reading it
+        # cancels the workers, and a marker put on a full queue would block forever
+        if not asyncio.current_task().cancelling():
+            await results.put(None)
+
+    async def worker():
+        try:
+            page = await context.new_page()
+        except Exception:
+            await finished()
+            raise
+        try:
+            while True:
+                try:
+                    u = todo.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    with metrics.span("fetch.page"):
+                        html = await fetch(page, u, limiter)
+                    await results.put((u, html, None))
+                except Exception as e:
+                    await results.put((u, None, e))
+        finally:
+            try:
+                await page.close()
+            except Exception:
+                pass
+            await finished()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        running = len(workers)
+        while running:
+            item = await results.get()
+            if item is None:
+                running -= 1
+                continue
+            yield item
+    finally:
+        for w in workers:
+            w.cancel()
+        errors = await asyncio.gather(*workers, return_exceptions=True)
+    failed = [e for e in errors if isinstance(e, Exception)]
+    if failed and not todo.empty():
+        raise failed[0]
+
+
+def http_get(url):
+    """GET `url` once and return the body as text; raises on HTTP errors."""
+    resp = requests.get(url, timeout=SCRAPE_HTTP_TIMEOUT, headers={"User-Agent": SCRAPE_HTTP_USER_AGENT})
+    resp.raise_for_status()
+    return resp.text
+
+
+async def iter_http_pages(urls, concurrency: int = None, limiter: HostLimiter = None):
+    """`iter_pages` without a browser, for pages rendered server-side.
+
+    Each URL gets one plain GET on a worker thread, under the same per-host
+    limits; nothing is retried.
+    """
+    limiter = limiter or HostLimiter()
+    sem = asyncio.Semaphore(max(1, concurrency or SCRAPE_CONCURRENCY))
+
+    async def get(u):
+        async with sem:
+            host = await limiter.acquire(u)
+            try:
+                with metrics.span("fetch.page"):
+                    return u, await asyncio.to_thread(http_get, u), None
+            except Exception as e:
+                return u, None, e
+            finally:
+                limiter.release(host)
+
+    tasks = [asyncio.create_task(get(u)) for u in urls]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield await done
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,364 @@
+# app/frontier.py
+"""Durable scrape queue shared by any number of scraper workers.
+
+`scrape_frontier` holds scrape targets (index pages to harvest) and the
+item pages found on them. Workers `claim` batches with SELECT ... FOR
+UPDATE SKIP LOCKED, so concurrent claims never hand out the same URL, and
+hold what they claimed under a lease. Failed URLs go back to pending with
+an exponential backoff recorded in `not_before`, rather than a sleep in the
+worker, until FRONTIER_MAX_ATTEMPTS tries have been used; a lease that
+expires (its worker died) counts as a failed try. Claims for one domain are
+spaced by its `scrape_domains.min_interval` across all workers.
+
+    python -m app.cli enqueue https://www.facebook.com/marketplace/manila/cars
+    python -m app.cli frontier-worker --fetch browser
+"""
+import os
+import time
+import random
+import socket
+import asyncio
+from urllib.parse import urlsplit
+from sqlalchemy import select, update, func, bindparam, text, and_, or_, case, Text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from .models import FrontierEntry, ScrapeDomain
+from .db import SessionLocal
+from .fetcher import HostLimiter, iter_http_pages, http_get
+from .harvest import item_links, harvest_item_urls
+from .archive import extract_and_archive
+from .services import normalize_listing
+from .utils import logger, backoff_delay
+from . import crud
+
+# comma-separated index pages queued by `enqueue_targets`; defaults to TARGET_URL
+SCRAPE_TARGETS = os.getenv("SCRAPE_TARGETS") or os.getenv("TARGET_URL") or ""
+FRONTIER_BATCH_SIZE = int(os.getenv("FRONTIER_BATCH_SIZE", "20"))
+FRONTIER_LEASE_SECONDS = float(os.getenv("FRONTIER_LEASE_SECONDS", "300"))
+FRONTIER_MAX_ATTEMPTS = int(os.getenv("FRONTIER_MAX_ATTEMPTS", "5"))
+# backoff before retry n: FRONTIER_RETRY_DELAY * FRONTIER_RETRY_BACKOFF ** (n - 1), capped
+FRONTIER_RETRY_DELAY = float(os.getenv("FRONTIER_RETRY_DELAY", "30"))
+FRONTIER_RETRY_BACKOFF = float(os.getenv("FRONTIER_RETRY_BACKOFF", "4"))
+FRONTIER_MAX_RETRY_DELAY = float(os.getenv("FRONTIER_MAX_RETRY_DELAY", "3600"))
+# seconds between requests to a domain, across all workers, for domains seen the first time
+FRONTIER_DOMAIN_INTERVAL = float(os.getenv("FRONTIER_DOMAIN_INTERVAL", "0.5"))
+# a finished item is queued again when rediscovered after this long
+FRONTIER_REVISIT_MINUTES = float(os.getenv("FRONTIER_REVISIT_MINUTES", "360"))
+# item links taken from one target page, the same setting as the single-process scraper
+SCRAPE_MAX_ITEMS = int(os.getenv("SCRAPE_MAX_ITEMS", "200"))
+FRONTIER_POLL_SECONDS = float(os.getenv("FRONTIER_POLL_SECONDS", "2"))
+# fetch with Playwright (browser) or plain GETs (http) for sites rendered server-side
+FRONTIER_FETCH = os.getenv("FRONTIER_FETCH", "browser")
+
+
+def domain_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def canonical_item_url(url: str) -> str:
+    # tracking parameters (?ref=feed) would otherwise queue the same item twice
+    return urlsplit(url)._replace(query="", fragment="").geturl()
+
+
+def _seconds(value):
+    return func.make_interval(0, 0, 0, 0, 0, 0, value)
+
+
+def enqueue(db: Session, urls, kind: str = "item", revisit_after: float = None) -> int:
+    """Queue `urls`; returns how many were added or put back to pending.
+
+    A URL already pending or leased is left alone; a finished one is queued
+    again once `revisit_after` seconds have passed since it finished.
+    """
+    if kind == "item":
+        urls = [canonical_item_url(u) for u in urls]
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return 0
+    revisit = FRONTIER_REVISIT_MINUTES * 60 if revisit_after is None else revisit_after
+    domains = {domain_of(u) for u in urls}
+    db.execute(pg_insert(ScrapeDomain).values([{"domain": d, "min_interval": FRONTIER_DOMAIN_INTERVAL} for d in domains])
+               .on_conflict_do_nothing(index_elements=["domain"]))
+    stmt = pg_insert(FrontierEntry).values([{"url": u, "kind": kind, "domain": domain_of(u)} for u in urls])
+    t = FrontierEntry.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["url"],
+        set_={"status": "pending", "attempts": 0, "not_before": func.now(), "last_error": None, "finished_at": None},
+        where=t.c.status.in_(["done", "failed"]) & (t.c.finished_at <= func.now() - _seconds(revisit)),
+    ).returning(t.c.id)
+    queued = len(db.execute(stmt).all())
+    db.commit()
+    return queued
+
+
+def default_targets():
+    """The index pages listed in SCRAPE_TARGETS."""
+    return [t.strip() for t in SCRAPE_TARGETS.split(",") if t.strip()]
+
+
+def enqueue_targets(db: Session, targets=None) -> int:
+    """Queue the index pages in `targets` (default SCRAPE_TARGETS) for harvesting right away."""
+    if targets is None:
+        targets = default_targets()
+    return enqueue(db, targets, kind="target", revisit_after=0)
+
+
+def set_domain_interval(db: Session, domain: str, seconds: float):
+    stmt = pg_insert(ScrapeDomain).values(domain=domain, min_interval=seconds)
+    db.execute(stmt.on_conflict_do_update(index_elements=["domain"], set_={"min_interval": seconds}))
+    db.commit()
+
+
+def _retry(db: Session, entries, owner: str = None):
+    """Put `(id, attempts, error)` entries back to pending after their backoff, or fail them for good."""
+    params = []
+    for entry_id, attempts, error in entries:
+        gave_up = attempts >= FRONTIER_MAX_ATTEMPTS
+        wait = 0 if gave_up else backoff_delay(attempts, FRONTIER_RETRY_DELAY, FRONTIER_RETRY_BACKOFF,
+                                               FRONTIER_MAX_RETRY_DELAY)
+        params.append({"b_id": entry_id, "b_status": "failed" if gave_up else "pending", "b_wait": wait,
+                       "b_error": str(error)[:1000]})
+    if not params:
+        return
+    t = FrontierEntry.__table__
+    status = bindparam("b_status", type_=Text)
+    stmt = (update(t)
+            .where(t.c.id == bindparam("b_id"), t.c.status == "leased")
+            .values(status=status, not_before=func.now() + _seconds(bindparam("b_wait")),
+                    last_error=bindparam("b_error"), lease_owner=None, lease_expires_at=None,
+                    # a URL that used up its attempts is finished, so it can be revisited later
+                    finished_at=case((status == "failed", func.now()))))
+    if owner is not None:
+        stmt = stmt.where(t.c.lease_owner == owner)
+    db.execute(stmt, params)
+
+
+def reap_expired(db: Session) -> int:
+    """Retry URLs whose lease ran out, as when their worker died mid-batch."""
+    e = FrontierEntry
+    rows = db.execute(select(e.id, e.attempts).where(e.status == "leased", e.lease_expires_at < func.now())
+                      .with_for_update(skip_locked=True)).all()
+    _retry(db, [(entry_id, attempts, "lease expired") for entry_id, attempts in rows])
+    return len(rows)
+
+
+def claim(db: Session, owner: str, limit: int = None, lease_seconds: float = None, domains=None):
+    """Lease up to `limit` ready URLs to `owner`, targets before items, from `domains` if given.
+
+    Returns dicts with `id`, `url`, `kind`, `attempts` and the domain's
+    `min_interval`, which the caller must keep between its requests. A domain
+    is claimed by one worker at a time and then blocked for
+    `min_interval` per URL handed out, so its request rate holds across workers.
+    Call it in a fresh transaction: readiness is judged against its now().
+    """
+    limit = limit or FRONTIER_BATCH_SIZE
+    lease_seconds = lease_seconds or FRONTIER_LEASE_SECONDS
+    reaped = reap_expired(db)
+    if reaped:
+        logger.info("Requeued %d frontier urls with expired leases", reaped)
+    ready = db.execute(text("""
+        SELECT d.domain, d.min_interval FROM scrape_domains d
+        WHERE d.next_allowed_at <= now() AND (CAST(:domains AS text[]) IS NULL OR d.domain = ANY(:domains)) AND EXISTS (
+            SELECT 1 FROM scrape_frontier f WHERE f.domain = d.domain AND f.status = 'pending' AND f.not_before <= now())
+        ORDER BY d.next_allowed_at
+        LIMIT :limit
+        FOR UPDATE OF d SKIP LOCKED
+    """), {"limit": limit, "domains": list(domains) if domains else None}).all()
+    claimed = []
+    for domain, interval in ready:
+        room = limit - len(claimed)
+        if room <= 0:
+            break
+        if interval > 0:
+            # the batch has to be fetched, spaced out, well within the lease
+            room = min(room, max(1, int(lease_seconds / 2 / interval)))
+        rows = db.execute(text("""
+            UPDATE scrape_frontier SET status = 'leased', attempts = attempts + 1, lease_owner = :owner,
+                   lease_expires_at = now() + make_interval(secs => :lease)
+            WHERE id IN (
+                SELECT id FROM scrape_frontier
+                WHERE domain = :domain AND status = 'pending' AND not_before <= now()
+                ORDER BY kind = 'item', not_before, id
+                LIMIT :room
+                FOR UPDATE SKIP LOCKED)
+            RETURNING id, url, kind, attempts
+        """), {"owner": owner, "lease": lease_seconds, "domain": domain, "room": room}).all()
+        if rows:
+            db.execute(text("UPDATE scrape_domains SET next_allowed_at = now() + make_interval(secs => :busy) "
+                            "WHERE domain = :domain"), {"busy": interval * len(rows), "domain": domain})
+        claimed.extend({"id": r.id, "url": r.url, "kind": r.kind, "attempts": r.attempts,
+                        "min_interval": interval} for r in rows)
+    db.commit()
+    return claimed
+
+
+def complete(db: Session, owner: str, ids):
+    if ids:
+        e = FrontierEntry
+        db.execute(update(e).where(e.id.in_(list(ids)), e.status == "leased", e.lease_owner == owner)
+                   .values(status="done", finished_at=func.now(), lease_owner=None, lease_expires_at=None,
+                           last_error=None))
+
+
+def fail(db: Session, owner: str, failures):
+    """Record failed `(entry, error)` pairs of `owner`'s lease; they are retried with backoff."""
+    _retry(db, [(entry["id"], entry["attempts"], error) for entry, error in failures], owner)
+
+
+def counts(db: Session):
+    """Number of URLs by status, plus how many pending ones are ready now."""
+    e = FrontierEntry
+    out = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+    out.update(db.execute(select(e.status, func.count()).group_by(e.status)).all())
+    out["ready"] = db.execute(select(func.count()).where(e.status == "pending", e.not_before <= func.now())).scalar()
+    return out
+
+
+def ready(db: Session, domains=None) -> bool:
+    """Whether a claim could get something right now, were no other worker claiming."""
+    return db.execute(text("""
+        SELECT 1 FROM scrape_domains d JOIN scrape_frontier f ON f.domain = d.domain
+        WHERE d.next_allowed_at <= now() AND f.status = 'pending' AND f.not_before <= now()
+          AND (CAST(:domains AS text[]) IS NULL OR d.domain = ANY(:domains))
+        LIMIT 1
+    """), {"domains": list(domains) if domains else None}).first() is not None
+
+
+def has_work(db: Session, domains=None) -> bool:
+    """Whether any URL is leased or ready to claim; ones waiting out a backoff do not count."""
+    e = FrontierEntry
+    stmt = select(e.id).where(or_(e.status == "leased", and_(e.status == "pending", e.not_before <= func.now())))
+    if domains:
+        stmt = stmt.where(e.domain.in_(list(domains)))
+    return db.execute(stmt.limit(1)).first() is not None
+
+
+def new_worker_stats():
+    return {"batches": 0, "targets": 0, "discovered": 0, "fetched": 0, "failed": 0, "ingested": 0}
+
+
+class FrontierWorker:
+    """Claims batches from the frontier, fetches and parses them and writes the listings.
+
+    Targets are harvested for item links, which go back into the frontier;
+    items are extracted and upserted. Nothing is retried in process: a
+    failure is recorded in the queue and the URL comes back after its backoff.
+    """
+
+    def __init__(self, fetch: str = None, batch_size: int = None, concurrency: int = None, owner: str = None,
+                 max_items: int = None, domains=None):
+        self.fetch = fetch or FRONTIER_FETCH
+        if self.fetch not in ("browser", "http"):
+            raise ValueError(f"unknown fetch mode {self.fetch!r}")
+        self.batch_size = batch_size or FRONTIER_BATCH_SIZE
+        self.concurrency = concurrency
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.max_items = max_items or SCRAPE_MAX_ITEMS
+        self.domains = domains
+        self.stats = new_worker_stats()
+        self.context = None
+
+    async def _harvest(self, url):
+        if self.context is None:
+            html = await asyncio.to_thread(http_get, url)
+            return item_links(html, url, self.max_items)
+        page = await self.context.new_page()
+        try:
+            await page.goto(url, timeout=60000)
+            await page.wait_for_load_state("domcontentloaded")
+            return await harvest_item_urls(page, self.max_items)
+        finally:
+            await page.close()
+
+    def _pages(self, entries):
+        urls = [e["url"] for e in entries]
+        limiter = HostLimiter(per_host=self.concurrency or None, min_interval=0,
+                              intervals={domain_of(e["url"]): e["min_interval"] for e in entries})
+        if self.context is None:
+            return iter_http_pages(urls, concurrency=self.concurrency, limiter=limiter)
+        from .fetcher import iter_pages
+        return iter_pages(self.context, urls, concurrency=self.concurrency, limiter=limiter, retry=False)
+
+    async def process(self, db: Session, batch):
+        done, failures, payloads = [], [], []
+        for entry in (e for e in batch if e["kind"] == "target"):
+            try:
+                links = await self._harvest(entry["url"])
+            except Exception as e:
+                failures.append((entry, f"{type(e).__name__}: {e}"))
+                continue
+            self.stats["targets"] += 1
+            self.stats["discovered"] += await asyncio.to_thread(enqueue, db, links)
+            done.append(entry["id"])
+        items = {e["url"]: e for e in batch if e["kind"] == "item"}
+        if items:
+            async for u, html, err in self._pages(list(items.values())):
+                if err is None:
+                    try:
+                        payloads.append(normalize_listing(await asyncio.to_thread(extract_and_archive, html, u)))
+                    except Exception as e:
+                        err = e
+                if err is not None:
+                    failures.append((items[u], f"{type(err).__name__}: {err}"))
+                    continue
+                done.append(items[u]["id"])
+        await asyncio.to_thread(self._finish, db, payloads, done, failures)
+        self.stats["batches"] += 1
+        self.stats["fetched"] += len(payloads)
+        self.stats["failed"] += len(failures)
+        logger.info("Frontier batch by %s: %d done, %d failed", self.owner, len(done), len(failures))
+
+    def _finish(self, db: Session, payloads, done, failures):
+        try:
+            if payloads:
+                # written before the urls are marked done: a crash in between only means a refetch
+                self.stats["ingested"] += crud.upsert_listings(db, payloads)
+            complete(db, self.owner, done)
+            fail(db, self.owner, failures)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    async def _loop(self, exit_when_idle: bool, max_batches: int = None):
+        db = SessionLocal()
+        try:
+            while max_batches is None or self.stats["batches"] < max_batches:
+                # a fresh transaction each round: the queue is compared against its now()
+                db.rollback()
+                batch = await asyncio.to_thread(claim, db, self.owner, self.batch_size, None, self.domains)
+                if batch:
+                    await self.process(db, batch)
+                elif await asyncio.to_thread(ready, db, self.domains):
+                    # another worker held the domain while claiming; its claim is over in moments
+                    await asyncio.sleep(random.uniform(0.01, 0.1))
+                elif exit_when_idle and not await asyncio.to_thread(has_work, db, self.domains):
+                    break
+                else:
+                    await asyncio.sleep(FRONTIER_POLL_SECONDS)
+        finally:
+            db.close()
+
+    async def run(self, exit_when_idle: bool = False, max_batches: int = None):
+        """Work until stopped, or until the frontier is empty with `exit_when_idle`; returns counts."""
+        started = time.monotonic()
+        if self.fetch == "http":
+            await self._loop(exit_when_idle, max_batches)
+        else:
+            from playwright.async_api import async_playwright
+            from .browser import HEADLESS, load_cookies
+            from .fetcher import RoutePolicy
+            async with async_playwright() as p:
+                browser = await p.chromium.launch(headless=HEADLESS)
+                self.context = await browser.new_context()
+                await load_cookies(self.context)
+                policy = RoutePolicy()
+                await policy.install(self.context)
+                try:
+                    await self._loop(exit_when_idle, max_batches)
+                finally:
+                    await self.context.close()
+                    await browser.close()
+                    self.context = None
+        self.stats["seconds"] = round(time.monotonic() - started, 3)
+        return self.stats
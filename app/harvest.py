@@ -0,0 +1,100 @@
+# app/harvest.py
+"""Collect listing links from an infinite-scroll page.
+
+A MutationObserver installed in the page records item links as they are
+added to the DOM. Each scroll round is a single `evaluate` call that scrolls
+to the bottom, waits in the page until new links have arrived and the DOM
+has been quiet for a moment (or until a timeout), and returns only the links
+not returned before. Harvesting stops at the first round that brings nothing new.
+`item_links` finds the same links in static HTML fetched without a browser.
+"""
+import os
+import re
+from urllib.parse import urljoin
+from .utils import logger
+from . import metrics
+
+ITEM_SELECTOR = "a[href*='/marketplace/item/'], a[href*='/item/']"
+# ITEM_SELECTOR for `item_links`; '/item/' also covers '/marketplace/item/'
+_ITEM_HREF_RE = re.compile(r"""<a\b[^>]*?\bhref\s*=\s*["']([^"']*/item/[^"']*)["']""", re.I)
+# longest wait for a scroll round to produce new items before giving up
+SCRAPE_SCROLL_TIMEOUT = float(os.getenv("SCRAPE_SCROLL_TIMEOUT", "8"))
+# a round ends once new items arrived and the DOM was quiet this long
+SCRAPE_SCROLL_QUIET = float(os.getenv("SCRAPE_SCROLL_QUIET", "0.3"))
+
+_INSTALL_JS = """
+(selector) => {
+  if (window.__harvest) return;
+  const h = window.__harvest = {seen: new Set(), queue: [], lastChange: performance.now()};
+  const take = (a) => {
+    const href = a.href;
+    if (href && !h.seen.has(href)) { h.seen.add(href); h.queue.push(href); }
+  };
+  const scan = (node) => {
+    if (node.nodeType !== 1) return;
+    if (node.matches(selector)) take(node);
+    node.querySelectorAll(selector).forEach(take);
+  };
+  scan(document.documentElement);
+  new MutationObserver((records) => {
+    h.lastChange = performance.now();
+    for (const r of records) {
+      if (r.type === 'attributes') scan(r.target);
+      else r.addedNodes.forEach(scan);
+    }
+  }).observe(document.documentElement, {childList: true, subtree: true, attributes: true, attributeFilter: ['href']});
+}
+"""
+
+_ROUND_JS = """
+async ({timeout, quiet}) => {
+  const h = window.__harvest;
+  if (!h) return null;
+  if (!h.queue.length) window.scrollTo(0, document.documentElement.scrollHeight);
+  const start = performance.now();
+  await new Promise((resolve) => {
+    const tick = () => {
+      const now = performance.now();
+      if (now - start >= timeout || (h.queue.length && now - h.lastChange >= quiet)) return resolve();
+      setTimeout(tick, 50);
+    };
+    tick();
+  });
+  return h.queue.splice(0);
+}
+"""
+
+
+async def harvest_item_urls(page, max_items: int, max_rounds: int = 50, timeout: float = None, quiet: float = None):
+    """Return up to `max_items` distinct item URLs from the loaded `page`, in page order."""
+    timeout = SCRAPE_SCROLL_TIMEOUT if timeout is None else timeout
+    quiet = SCRAPE_SCROLL_QUIET if quiet is None else quiet
+    urls, seen = [], set()
+    rounds = 0
+    await page.evaluate(_INSTALL_JS, ITEM_SELECTOR)
+    while len(urls) < max_items and rounds < max_rounds:
+        rounds += 1
+        with metrics.span("scroll.round"):
+            batch = await page.evaluate(_ROUND_JS, {"timeout": timeout * 1000, "quiet": quiet * 1000})
+        if batch is None:
+            # the page navigated and lost the observer; start over on the new document
+            await page.evaluate(_INSTALL_JS, ITEM_SELECTOR)
+            continue
+        new = [u for u in batch if u not in seen]
+        if not new:
+            break
+        seen.update(new)
+        urls.extend(new)
+    logger.info("Harvested %d item urls in %d scroll rounds", min(len(urls), max_items), rounds)
+    return urls[:max_items]
+
+
+def item_links(html: str, base_url: str, max_items: int = None):
+    """Distinct absolute item URLs linked from `html`, in page order."""
+    urls, seen = [], set()
+    for m in _ITEM_HREF_RE.finditer(html):
+        u = urljoin(base_url, m.group(1).replace("&amp;", "&"))
+        if u not in seen:
+            seen.add(u)
+            urls.append(u)
+    return urls[:max_items] if max_items else urls
@@ -0,0 +1,252 @@
+# app/jobs.py
+"""Background scrape jobs.
+
+At most one scrape runs at a time across every process sharing the
+database: the process that starts one holds a Postgres advisory lock for
+as long as it runs. Triggers that arrive meanwhile, from the API or the
+scheduler and in any worker, are coalesced into it and get its job id.
+Jobs are recorded in `scrape_jobs` (progress included, refreshed while
+running), so any worker can report them; a bounded history is kept.
+The scraper (Playwright, BeautifulSoup) is imported on the first run, not
+with this module, so API workers that never scrape do not load it.
+"""
+import os
+import time
+import uuid
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import select, update, delete, text
+from .db import engine
+from .models import ScrapeJobRecord
+from .utils import logger
+
+SCRAPE_JOB_HISTORY = int(os.getenv("SCRAPE_JOB_HISTORY", "20"))
+SCRAPE_JOB_LOCK_KEY = int(os.getenv("SCRAPE_JOB_LOCK_KEY", str(0x53435241504A)))  # "SCRAPJ"
+# how often a running job writes its progress for the other processes to read
+SCRAPE_JOB_PROGRESS_SECONDS = float(os.getenv("SCRAPE_JOB_PROGRESS_SECONDS", "2"))
+
+_jobs = ScrapeJobRecord.__table__
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _scrape(stats: dict):
+    from .scrape import scrape_marketplace
+    return scrape_marketplace(stats=stats)
+
+
+def _new_stats():
+    from .scrape import new_stats
+    return new_stats()
+
+
+class ScrapeJob:
+    def __init__(self, trigger: str, stats: dict):
+        self.id = uuid.uuid4().hex
+        self.trigger = trigger
+        self.status = "running"
+        self.stats = stats
+        self.error = None
+        self.coalesced = 0
+        self.created_at = _now()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    @classmethod
+    def from_row(cls, row):
+        """A job as recorded in `scrape_jobs`, possibly run by another process."""
+        job = cls(row.trigger, row.progress or {})
+        job.id, job.status, job.error, job.coalesced = row.id, row.status, row.error, row.coalesced
+        job.created_at, job.finished_at = row.created_at, row.finished_at
+        if job.finished_at is not None:
+            job.done.set()
+        return job
+
+    def _progress(self):
+        # copy the nested dicts too: the scrape thread keeps updating them
+        progress = dict(self.stats)
+        if "timings" in progress:
+            progress["timings"] = dict(progress["timings"])
+        network = self.stats.get("network")
+        if network:
+            progress["network"] = dict(network, blocked_by_type=dict(network["blocked_by_type"]))
+        trace = self.stats.get("trace")
+        if trace:
+            progress["trace"] = {name: dict(entry) for name, entry in list(trace.items())}
+        return progress
+
+    def to_dict(self):
+        end = self.finished_at or _now()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "trigger": self.trigger,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "elapsed_seconds": round((end - self.created_at).total_seconds(), 3),
+            "coalesced_triggers": self.coalesced,
+            "progress": self._progress(),
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Single-flight runner for `runner(stats=...)` on a background thread.
+
+    `key` is the advisory lock the run holds; managers with the same key
+    share one running job and one history, in any process.
+    """
+
+    def __init__(self, runner=None, history: int = None, key: int = None, bind=None):
+        self.runner = runner or _scrape
+        self.history = history or SCRAPE_JOB_HISTORY
+        self.key = key or SCRAPE_JOB_LOCK_KEY
+        self.bind = bind or engine
+        self.current = None  # the job running in this process
+        self._lock = threading.Lock()
+
+    def _try_lock(self):
+        """The connection now holding the run lock, or None if another process holds it."""
+        conn = self.bind.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            if conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar():
+                return conn
+        except Exception:
+            conn.invalidate()
+            raise
+        conn.close()
+        return None
+
+    def _unlock(self, conn):
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+            conn.close()
+        except Exception:
+            # a dropped session has released the lock already
+            conn.invalidate()
+
+    def _abandon_running(self, conn):
+        # only called with the run lock held: whatever still says running, nobody runs
+        conn.execute(update(_jobs).where(_jobs.c.lock_key == self.key, _jobs.c.status == "running")
+                     .values(status="failed", error="abandoned: the process running it exited",
+                             finished_at=_now()))
+
+    def _coalesce(self, conn, job_id=None):
+        """Count a trigger against the running job (`job_id`, or any); returns its row."""
+        cond = _jobs.c.id == job_id if job_id else _jobs.c.status == "running"
+        stmt = (update(_jobs).where(_jobs.c.lock_key == self.key, cond)
+                .values(coalesced=_jobs.c.coalesced + 1).returning(*_jobs.c))
+        return conn.execute(stmt).first()
+
+    def _save(self, job: ScrapeJob, conn=None):
+        values = {"status": job.status, "error": job.error, "finished_at": job.finished_at,
+                  "progress": job._progress()}
+        stmt = update(_jobs).where(_jobs.c.id == job.id).values(**values)
+        if conn is not None:
+            conn.execute(stmt)
+            return
+        with self.bind.begin() as conn:
+            conn.execute(stmt)
+
+    def submit(self, trigger: str = "api"):
+        """Start a scrape, or join the running one; returns `(job, started)`."""
+        with self._lock:
+            if self.current is not None:
+                with self.bind.begin() as conn:
+                    self._coalesce(conn, self.current.id)
+                self.current.coalesced += 1
+                logger.info("Scrape %s already running; %s trigger coalesced", self.current.id, trigger)
+                return self.current, False
+            # another process holds the lock: join its job. Its row can be missing for a
+            # moment right after it took the lock or right before it lets go, so retry.
+            for _ in range(100):
+                lock_conn = self._try_lock()
+                if lock_conn is not None:
+                    break
+                with self.bind.begin() as conn:
+                    row = self._coalesce(conn)
+                if row is not None:
+                    logger.info("Scrape %s running in another process; %s trigger coalesced", row.id, trigger)
+                    return ScrapeJob.from_row(row), False
+                time.sleep(0.05)
+            else:
+                raise RuntimeError("scrape lock is held but no job is recorded as running")
+            job = ScrapeJob(trigger, _new_stats())
+            try:
+                self._abandon_running(lock_conn)
+                lock_conn.execute(_jobs.insert().values(
+                    id=job.id, lock_key=self.key, trigger=trigger, status=job.status, coalesced=0,
+                    progress=job._progress(), created_at=job.created_at))
+                newest = (select(_jobs.c.id).where(_jobs.c.lock_key == self.key)
+                          .order_by(_jobs.c.created_at.desc()).offset(self.history))
+                lock_conn.execute(delete(_jobs).where(_jobs.c.id.in_(newest.scalar_subquery())))
+            except Exception:
+                self._unlock(lock_conn)
+                raise
+            self.current = job
+        threading.Thread(target=self._run, args=(job, lock_conn), name=f"scrape-{job.id[:8]}", daemon=True).start()
+        logger.info("Scrape %s started by %s", job.id, trigger)
+        return job, True
+
+    def _report(self, job: ScrapeJob, stop: threading.Event):
+        while not stop.wait(SCRAPE_JOB_PROGRESS_SECONDS):
+            try:
+                self._save(job)
+            except Exception as e:
+                logger.warning("Could not record progress of scrape %s: %s", job.id, e)
+
+    def _run(self, job: ScrapeJob, lock_conn):
+        stop = threading.Event()
+        reporter = threading.Thread(target=self._report, args=(job, stop), daemon=True)
+        reporter.start()
+        try:
+            self.runner(stats=job.stats)
+            job.status = "succeeded"
+        except Exception as e:
+            logger.exception("Scrape %s failed: %s", job.id, e)
+            job.status = "failed"
+            job.error = str(e) or type(e).__name__
+        finally:
+            job.finished_at = _now()
+            stop.set()
+            reporter.join()
+            try:
+                # recorded before the lock is released, so the next run never sees it running
+                self._save(job, lock_conn)
+            except Exception as e:
+                logger.warning("Could not record the end of scrape %s: %s", job.id, e)
+            self._unlock(lock_conn)
+            with self._lock:
+                self.current = None
+            job.done.set()
+
+    def _job(self, row):
+        job = ScrapeJob.from_row(row)
+        current = self.current
+        if current is not None and current.id == job.id:
+            # ours: the live counters are fresher than the last progress written
+            job.stats = current.stats
+        elif job.status == "running" and self.current is None:
+            conn = self._try_lock()
+            if conn is not None:
+                # its process died without recording the end
+                self._abandon_running(conn)
+                self._unlock(conn)
+                return self.get(job.id)
+        return job
+
+    def get(self, job_id: str):
+        with self.bind.connect() as conn:
+            row = conn.execute(select(_jobs).where(_jobs.c.lock_key == self.key, _jobs.c.id == job_id)).first()
+        return self._job(row) if row else None
+
+    def recent(self):
+        with self.bind.connect() as conn:
+            rows = conn.execute(select(_jobs).where(_jobs.c.lock_key == self.key)
+                                .order_by(_jobs.c.created_at.desc()).limit(self.history)).all()
+        return [self._job(row) for row in rows]
+
+
+scrape_jobs = JobManager()
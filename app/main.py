@@ -1,30 +1,76 @@
-from fastapi import FastAPI
-from app.db import Base, engine
+import time
+from fastapi import FastAPI, Request, Response
+from app.db import engine, DB_ASYNC, SessionLocal
+from app import metrics, stats
+from app.scheduler import scheduler, SCHEDULER_ENABLED
 import app.models  # noqa: F401 ensure models are imported so tables are known
+from app.models import ensure_schema
 
 # create FastAPI instance
 app = FastAPI()
 
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # label by route template, not raw path, to keep the series count bounded
+    route = request.scope.get("route")
+    metrics.http_request_seconds.observe(time.perf_counter() - started, method=request.method,
+                                         route=getattr(route, "path", "<unmatched>"),
+                                         status=response.status_code)
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/metrics/trace")
+def get_trace():
+    return {"enabled": metrics.tracer.enabled}
+
+
+@app.post("/metrics/trace")
+def set_trace(enabled: bool):
+    """Switch per-run tracing of scrape jobs on or off; applies from the next run."""
+    metrics.tracer.enabled = enabled
+    return {"enabled": metrics.tracer.enabled}
+
 # try to include API routes if available
 try:
+    if DB_ASYNC:
+        # async read handlers shadow the sync ones for the same paths
+        from app.api.async_routes import router as async_api_router
+        app.include_router(async_api_router)
     from app.api.routes import router as api_router
     app.include_router(api_router)
 except Exception:
     # routes not available or import failed; keep app running
     pass
 
-# import scheduler to start background tasks if the module starts them on import
-try:
-    import app.scheduler  # noqa: F401
-except Exception:
-    pass
-
 
 @app.on_event("startup")
 def on_startup_create_tables():
-    # Ensure database tables are created on startup
+    # Ensure database tables (and columns/indexes added since) exist on startup
     try:
-        Base.metadata.create_all(bind=engine)
+        ensure_schema(engine)
+        # catch up on groups marked dirty while the app was down (all of them on first run)
+        with SessionLocal() as db:
+            stats.refresh(db)
     except Exception:
         # Do not crash the app if migrations are preferred; keep running
-        pass
\ No newline at end of file
+        pass
+
+
+@app.on_event("startup")
+def start_scheduler():
+    # every worker joins the election; only the leader schedules scrapes
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+
+
+@app.on_event("shutdown")
+def stop_scheduler():
+    scheduler.stop()
@@ -0,0 +1,242 @@
+# app/metrics.py
+"""In-process metrics in the Prometheus text format, plus a run tracer.
+
+Counters, gauges and histograms live in `REGISTRY` and are rendered by
+`render()` for `GET /metrics`. The tracer is off unless METRICS_TRACE=1 or
+it is switched on at runtime (`POST /metrics/trace`); while on, `span()`
+blocks add their durations to the breakdown of the trace started with
+`start_trace()`, e.g. `stats["trace"]` of a scrape run.
+"""
+import os
+import time
+import bisect
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+# latency buckets in seconds for requests and queries
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# per-run scraper stage durations
+STAGE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+REGISTRY = []
+
+
+def _fmt(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, doc: str, labels=()):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}_total{_labels(self.label_names, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """A value that is set, or read from `fn` at render time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labels=(), fn=None):
+        super().__init__(name, doc, labels)
+        self.fn = fn
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.fn is not None:
+            try:
+                return [f"{self.name} {_fmt(self.fn())}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, k)} {_fmt(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # per-bucket (not cumulative) counts, then sum and count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels):
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(e[0]), e[1], e[2]) for k, e in self._values.items()]
+        out = []
+        for key, counts, total, n in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                out.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', _fmt(bound))])} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, key)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_labels(self.label_names, key)} {n}")
+        return out
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.header())
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+http_request_seconds = Histogram("http_request_duration_seconds",
+                                 "Time until the response starts, by route template.",
+                                 ("method", "route", "status"))
+db_checkout_seconds = Histogram("db_pool_checkout_seconds", "Time spent waiting for a pooled connection.")
+db_query_seconds = Histogram("db_query_duration_seconds", "Duration of crud functions.", ("function",))
+scrape_stage_seconds = Histogram("scrape_stage_duration_seconds", "Per-run duration of each scraper stage.",
+                                 ("stage",), buckets=STAGE_BUCKETS)
+scrape_runs = Counter("scrape_runs", "Finished scrape runs.", ("status",))
+scrape_timeouts = Counter("scrape_timeouts", "Detail pages that timed out after all retries.")
+retries = Counter("retries", "Calls retried by the retry decorators.", ("function", "error"))
+
+
+# --- tracing -----------------------------------------------------------------
+
+METRICS_TRACE = os.getenv("METRICS_TRACE", "0") == "1"
+_trace = contextvars.ContextVar("trace", default=None)
+_span_lock = threading.Lock()
+
+
+class Tracer:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+
+
+tracer = Tracer(METRICS_TRACE)
+
+
+def start_trace():
+    """Begin collecting spans in this context (and tasks/threads started from
+    it); returns the breakdown dict, or None when tracing is off."""
+    if not tracer.enabled:
+        _trace.set(None)
+        return None
+    breakdown = {}
+    _trace.set(breakdown)
+    return breakdown
+
+
+def add_span(name: str, seconds: float):
+    breakdown = _trace.get()
+    if breakdown is None:
+        return
+    # spans may finish on worker threads at the same time
+    with _span_lock:
+        entry = breakdown.get(name)
+        if entry is None:
+            entry = breakdown[name] = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        entry["count"] += 1
+        entry["total_seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+
+@contextmanager
+def span(name: str):
+    if _trace.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, time.perf_counter() - started)
+
+
+def timed_query(f):
+    """Record calls of a crud function in `db_query_seconds` and the current trace."""
+    name = f.__name__
+    if asyncio.iscoroutinefunction(f):
+        @wraps(f)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await f(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                db_query_seconds.observe(elapsed, function=name)
+                add_span("db." + name, elapsed)
+        return wrapper
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            db_query_seconds.observe(elapsed, function=name)
+            add_span("db." + name, elapsed)
+    return wrapper
@@ -1,11 +1,14 @@
 # app/models.py
 """SQLAlchemy ORM models for persisted entities.
 
-Currently defines the `Listing` model and related indexes. This documentation
-does not change runtime logic.
+Currently defines the `Listing` model, its price history, the statistics
+rollup, the scrape frontier and related indexes. This documentation does not change runtime logic.
 """
-from sqlalchemy import Column, Integer, Text, Numeric, TIMESTAMP, func, Index
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import (Column, Integer, BigInteger, Text, Numeric, Float, TIMESTAMP, ForeignKey, func, Index,
+                        inspect, Computed, literal_column, select, bindparam)
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import deferred
+from sqlalchemy.schema import CreateColumn
 from .db import Base
 
 class Listing(Base):
@@ -18,11 +21,239 @@ class Listing(Base):
     year = Column(Integer)
     mileage = Column(Integer)
     location = Column(Text)
+    # lower-cased, accent-free, punctuation-free location, set by crud on write
+    location_norm = Column(Text)
     url = Column(Text)
-    raw_json = Column(JSONB)
+    # deferred like the tsvectors below: no API response returns them, so
+    # loading a Listing leaves them out until they are accessed
+    raw_json = deferred(Column(JSONB))
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
     last_seen_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    # full-text documents maintained by Postgres: the location filter matches
+    # location_tsv, the q= search ranks title (weight A) over location (weight B)
+    location_tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('simple', coalesce(location_norm, ''))", persisted=True)))
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(location_norm, '')), 'B')", persisted=True)))
 
-Index("idx_listings_price", Listing.price)
-Index("idx_listings_year", Listing.year)
+class ListingPriceHistory(Base):
+    """Append-only log of price/mileage observations, written by a trigger on `listings`."""
+    __tablename__ = "listing_price_history"
+    id = Column(BigInteger, primary_key=True)
+    listing_id = Column(Text, ForeignKey("listings.listing_id", ondelete="CASCADE"), nullable=False)
+    price = Column(Numeric)
+    mileage = Column(Integer)
+    observed_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+Index("idx_price_history_listing", ListingPriceHistory.listing_id, ListingPriceHistory.observed_at)
+
+class ListingStat(Base):
+    """Rollup behind `GET /listings/stats`, maintained by `stats.refresh`.
+
+    One row per (year, location, currency, price bucket); unknown keys are
+    stored as 0, '' and bucket -1 (no price) so they can be part of the key.
+    """
+    __tablename__ = "listing_stats"
+    year = Column(Integer, primary_key=True)
+    location_norm = Column(Text, primary_key=True)
+    currency = Column(Text, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    listings = Column(BigInteger, nullable=False)
+    price_min = Column(Numeric)
+    price_max = Column(Numeric)
+    price_sum = Column(Numeric)
+    location_tsv = Column(TSVECTOR, Computed("to_tsvector('simple', location_norm)", persisted=True))
+
+Index("idx_listing_stats_location_tsv", ListingStat.location_tsv, postgresql_using="gin")
+
+class ListingStatMark(Base):
+    """(year, location, currency) groups whose rollup rows are out of date; filled by a trigger.
+
+    Marks are kept apart per writing transaction (`xid`): a refresh removes only
+    the marks it could see, so one left by a write still in flight survives it.
+    """
+    __tablename__ = "listing_stats_marks"
+    year = Column(Integer, primary_key=True)
+    location_norm = Column(Text, primary_key=True)
+    currency = Column(Text, primary_key=True)
+    xid = Column(BigInteger, primary_key=True)
+
+class FrontierEntry(Base):
+    """A URL in the shared scrape queue; claimed and completed through `frontier`."""
+    __tablename__ = "scrape_frontier"
+    id = Column(BigInteger, primary_key=True)
+    url = Column(Text, nullable=False, unique=True)
+    kind = Column(Text, nullable=False)  # target (an index page to harvest) or item
+    domain = Column(Text, nullable=False)
+    status = Column(Text, nullable=False, server_default="pending")  # pending, leased, done or failed
+    attempts = Column(Integer, nullable=False, server_default="0")
+    not_before = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    lease_owner = Column(Text)
+    lease_expires_at = Column(TIMESTAMP(timezone=True))
+    last_error = Column(Text)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    finished_at = Column(TIMESTAMP(timezone=True))
+
+Index("idx_frontier_ready", FrontierEntry.domain, FrontierEntry.not_before,
+      postgresql_where=FrontierEntry.status == "pending")
+Index("idx_frontier_leases", FrontierEntry.lease_expires_at, postgresql_where=FrontierEntry.status == "leased")
+
+class ScrapeDomain(Base):
+    """Per-domain request budget shared by every scraper worker."""
+    __tablename__ = "scrape_domains"
+    domain = Column(Text, primary_key=True)
+    min_interval = Column(Float, nullable=False)  # seconds between requests to the domain
+    next_allowed_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+class ScrapeJobRecord(Base):
+    """A scrape run started through `jobs.JobManager`, readable from every process."""
+    __tablename__ = "scrape_jobs"
+    id = Column(Text, primary_key=True)
+    lock_key = Column(BigInteger, nullable=False)  # the single-flight group (advisory lock) it ran under
+    trigger = Column(Text, nullable=False)
+    status = Column(Text, nullable=False)  # running, succeeded, failed
+    coalesced = Column(Integer, nullable=False, server_default="0")
+    progress = Column(JSONB)
+    error = Column(Text)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    finished_at = Column(TIMESTAMP(timezone=True))
+
+Index("idx_scrape_jobs_recent", ScrapeJobRecord.lock_key, ScrapeJobRecord.created_at)
+
+# (sort_key, id) pairs back keyset pagination in crud.list_listings and
+# also serve plain range filters on the leading column
+Index("idx_listings_price_id", Listing.price, Listing.id)
+Index("idx_listings_year_id", Listing.year, Listing.id)
+Index("idx_listings_last_seen_id", Listing.last_seen_at, Listing.id)
+Index("idx_listings_location_tsv", Listing.location_tsv, postgresql_using="gin")
+Index("idx_listings_search", Listing.search_vector, postgresql_using="gin")
+# finds the listings of one rollup group when stats.refresh recomputes it
+Index("idx_listings_stats_group", func.coalesce(Listing.year, literal_column("0")),
+      func.coalesce(Listing.location_norm, literal_column("''")), func.coalesce(Listing.currency, literal_column("''")))
+
+# single-column indexes superseded by the composite ones above
+RETIRED_INDEXES = ["idx_listings_price", "idx_listings_year"]
+# the per-group marks table and its trigger, replaced by listing_stats_marks
+RETIRED_TRIGGERS = [("listings_stats_dirty", "listings")]
+RETIRED_TABLES = ["listing_stats_dirty"]
+
+# a history row for every insert with a price or mileage and every update that
+# changes either; updates that leave both alone (including no-op upserts) add nothing
+PRICE_HISTORY_FUNCTION = """
+CREATE OR REPLACE FUNCTION record_listing_price() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.price IS NULL AND NEW.mileage IS NULL THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'INSERT' OR NEW.price IS DISTINCT FROM OLD.price OR NEW.mileage IS DISTINCT FROM OLD.mileage THEN
+        INSERT INTO listing_price_history (listing_id, price, mileage) VALUES (NEW.listing_id, NEW.price, NEW.mileage);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+PRICE_HISTORY_TRIGGER = """
+CREATE TRIGGER listings_price_history AFTER INSERT OR UPDATE OF price, mileage ON listings
+FOR EACH ROW EXECUTE FUNCTION record_listing_price()
+"""
+
+# marks the rollup groups a change to listings affects, before and after it
+STATS_MARK_FUNCTION = """
+CREATE OR REPLACE FUNCTION mark_listing_stats_dirty() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        INSERT INTO listing_stats_marks
+        VALUES (coalesce(OLD.year, 0), coalesce(OLD.location_norm, ''), coalesce(OLD.currency, ''), txid_current())
+        ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO listing_stats_marks
+        VALUES (coalesce(NEW.year, 0), coalesce(NEW.location_norm, ''), coalesce(NEW.currency, ''), txid_current())
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+STATS_MARK_TRIGGER = """
+CREATE TRIGGER listings_stats_marks AFTER INSERT OR DELETE OR UPDATE OF price, year, location_norm, currency
+ON listings FOR EACH ROW EXECUTE FUNCTION mark_listing_stats_dirty()
+"""
+
+# (trigger name, function DDL, trigger DDL, statement run once when the trigger is first created)
+TRIGGERS = [
+    # start the history of listings that predate the trigger from their current values
+    ("listings_price_history", PRICE_HISTORY_FUNCTION, PRICE_HISTORY_TRIGGER,
+     "INSERT INTO listing_price_history (listing_id, price, mileage, observed_at) "
+     "SELECT listing_id, price, mileage, coalesce(updated_at, now()) FROM listings "
+     "WHERE price IS NOT NULL OR mileage IS NOT NULL"),
+    # the next stats.refresh builds the rollup for every existing group
+    ("listings_stats_marks", STATS_MARK_FUNCTION, STATS_MARK_TRIGGER,
+     "INSERT INTO listing_stats_marks SELECT DISTINCT coalesce(year, 0), coalesce(location_norm, ''), "
+     "coalesce(currency, ''), txid_current() FROM listings ON CONFLICT DO NOTHING"),
+]
+
+LOCATION_BACKFILL_BATCH = 1000
+
+def _backfill_location_norm(conn):
+    # listings written before the column existed; crud sets it on every write since.
+    # The generated tsvector columns follow each UPDATE.
+    from .crud import normalize_location
+    t = Listing.__table__
+    stmt = t.update().where(t.c.id == bindparam("b_id")).values(location_norm=bindparam("b_norm"))
+    last = 0
+    while True:
+        rows = conn.execute(select(t.c.id, t.c.location).where(t.c.id > last, t.c.location.isnot(None))
+                            .order_by(t.c.id).limit(LOCATION_BACKFILL_BATCH)).all()
+        if not rows:
+            return
+        conn.execute(stmt, [{"b_id": r.id, "b_norm": normalize_location(r.location)} for r in rows])
+        last = rows[-1].id
+
+# (table, column) -> fills the column for existing rows when ensure_schema adds it
+BACKFILLS = {("listings", "location_norm"): _backfill_location_norm}
+
+def _ensure_triggers(conn):
+    for name, function, trigger, seed in TRIGGERS:
+        conn.exec_driver_sql(function)
+        found = conn.exec_driver_sql("SELECT 1 FROM pg_trigger WHERE tgname = %(name)s "
+                                     "AND tgrelid = 'listings'::regclass", {"name": name}).first()
+        if found:
+            continue
+        conn.exec_driver_sql(trigger)
+        conn.exec_driver_sql(seed)
+
+def ensure_schema(bind):
+    """Create missing tables, columns and indexes.
+
+    `create_all` skips tables that already exist, so columns and indexes added
+    to existing models are created here as well, along with the `TRIGGERS`.
+    Added columns listed in `BACKFILLS` are filled for the existing rows.
+    Nothing is altered or dropped except the retired indexes, triggers and
+    tables listed above.
+    """
+    Base.metadata.create_all(bind=bind)
+    existing = inspect(bind)
+    added = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            have = {c["name"] for c in existing.get_columns(table.name)}
+            for col in table.columns:
+                if col.name not in have:
+                    # generated columns are computed for every existing row here
+                    ddl = CreateColumn(col).compile(dialect=conn.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                    added.append((table.name, col.name))
+            for idx in table.indexes:
+                idx.create(conn, checkfirst=True)
+        for key in added:
+            if key in BACKFILLS:
+                BACKFILLS[key](conn)
+        for name in RETIRED_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        for name, table in RETIRED_TRIGGERS:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        for name in RETIRED_TABLES:
+            conn.exec_driver_sql(f"DROP TABLE IF EXISTS {name}")
+        _ensure_triggers(conn)
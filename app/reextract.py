@@ -0,0 +1,65 @@
+# app/reextract.py
+"""Replay extraction over the HTML archive and write the results back.
+
+The database side of re-extraction. Pages are parsed in worker processes by
+`archive._reextract`, so the workers import only the archive and the extractors.
+"""
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+from sqlalchemy import select, update, bindparam, func
+from sqlalchemy.orm import Session
+from .models import Listing
+from . import archive, crud, cache
+from . import stats as listing_stats
+from .utils import logger
+
+
+def reextract_listings(db: Session, workers: int = None, batch_size: int = 500, root: str = None,
+                       listing_ids: List[str] = None):
+    """Re-run extraction over the archived page of every listing that has one
+    (or of just `listing_ids`).
+
+    Pages are parsed `batch_size` at a time in `workers` processes (0 parses
+    in this process) and each batch is written back with one executemany
+    UPDATE. Returns counts of updated listings and missing archive files.
+    """
+    root = root or archive.HTML_ARCHIVE_DIR
+    workers = min(4, os.cpu_count() or 1) if workers is None else workers
+    stats = {"updated": 0, "missing": 0}
+    digest_col = Listing.raw_json["html_sha256"].astext
+    stmt = select(Listing.listing_id, Listing.url, digest_col).where(digest_col.isnot(None)).order_by(Listing.id)
+    if listing_ids is not None:
+        stmt = stmt.where(Listing.listing_id.in_(listing_ids))
+    table = Listing.__table__
+    columns = archive.REEXTRACT_FIELDS + ["location_norm"]
+    upd = (update(table).where(table.c.listing_id == bindparam("b_listing_id"))
+           .values(**{k: bindparam(k) for k in columns}, updated_at=func.now()))
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) if workers > 0 else None
+    # the read streams on its own connection so batch commits do not end it
+    reader = db.get_bind().connect()
+    try:
+        rows = reader.execution_options(yield_per=batch_size).execute(stmt)
+        for batch in rows.partitions(batch_size):
+            items = [(lid, url, digest, root) for lid, url, digest in batch]
+            results = pool.map(archive._reextract, items, chunksize=16) if pool else map(archive._reextract, items)
+            params = []
+            for listing_id, fields in results:
+                if fields is None:
+                    stats["missing"] += 1
+                    continue
+                fields["location_norm"] = crud.normalize_location(fields["location"])
+                params.append(dict(fields, b_listing_id=listing_id))
+            if params:
+                db.execute(upd, params)
+                db.commit()
+                stats["updated"] += len(params)
+            logger.info("Re-extracted %d listings (%d missing pages)", stats["updated"], stats["missing"])
+    finally:
+        reader.close()
+        if pool is not None:
+            pool.shutdown()
+    listing_stats.refresh_quietly(db)
+    cache.invalidate()
+    return stats
@@ -1,9 +1,128 @@
 # app/scheduler.py
-from apscheduler.schedulers.background import BackgroundScheduler
-from .scrape import scrape_marketplace
+"""Hourly scrape, scheduled by exactly one process across workers and nodes.
+
+Each process runs a `LeaderElector` that tries to take a Postgres advisory
+lock every `SCHEDULER_ELECTION_SECONDS`. The winner starts the APScheduler
+job; the others keep trying. The lock belongs to the leader's database
+session, so Postgres releases it when that process dies or loses its
+connection, and the next election round elsewhere takes over.
+"""
+import os
+import threading
+from sqlalchemy import text
+from .db import engine
 from .utils import logger
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(scrape_marketplace, 'interval', hours=1)
-scheduler.start()
-logger.info("Scheduler started")
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+SCRAPE_INTERVAL_HOURS = float(os.getenv("SCRAPE_INTERVAL_HOURS", "1"))
+SCHEDULER_ELECTION_SECONDS = float(os.getenv("SCHEDULER_ELECTION_SECONDS", "30"))
+SCHEDULER_LOCK_KEY = int(os.getenv("SCHEDULER_LOCK_KEY", str(0x5343484544)))  # "SCHED"
+
+
+class LeaderElector:
+    """Holds the session-level advisory lock `key` on one dedicated connection."""
+
+    def __init__(self, key: int, on_elected, on_deposed, bind=None):
+        self.key = key
+        self.on_elected = on_elected
+        self.on_deposed = on_deposed
+        self.bind = bind or engine
+        self._conn = None
+
+    @property
+    def is_leader(self):
+        return self._conn is not None
+
+    def elect(self) -> bool:
+        """Run one election round; returns whether this process leads afterwards."""
+        if self._conn is not None:
+            try:
+                self._conn.execute(text("SELECT 1"))
+                return True
+            except Exception as e:
+                logger.warning("Scheduler leader lost its database session: %s", e)
+                self._conn.invalidate()
+                self._conn = None
+                self.on_deposed()
+        try:
+            conn = self.bind.connect().execution_options(isolation_level="AUTOCOMMIT")
+        except Exception as e:
+            logger.warning("Scheduler election skipped, database unavailable: %s", e)
+            return False
+        try:
+            won = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar()
+        except Exception:
+            conn.invalidate()
+            raise
+        if not won:
+            conn.close()
+            return False
+        self._conn = conn
+        self.on_elected()
+        return True
+
+    def resign(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        try:
+            # unlock explicitly: the pooled connection outlives this session's use of it
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+            conn.close()
+        except Exception:
+            conn.invalidate()
+        self.on_deposed()
+
+
+class LeaderScheduler:
+    """Runs elections on a background thread and the scrape job while elected."""
+
+    def __init__(self, key: int = None, interval: float = None, bind=None):
+        self.interval = interval or SCHEDULER_ELECTION_SECONDS
+        self.elector = LeaderElector(key or SCHEDULER_LOCK_KEY, self._start_jobs, self._stop_jobs, bind)
+        self.scheduler = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _start_jobs(self):
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from .jobs import scrape_jobs
+        self.scheduler = BackgroundScheduler()
+        # goes through the job manager so it never overlaps a scrape started from the API
+        self.scheduler.add_job(scrape_jobs.submit, 'interval', hours=SCRAPE_INTERVAL_HOURS,
+                               kwargs={"trigger": "scheduler"})
+        self.scheduler.start()
+        logger.info("Elected scheduler leader (pid %d); scrape every %sh", os.getpid(), SCRAPE_INTERVAL_HOURS)
+
+    def _stop_jobs(self):
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
+            logger.info("Scheduler leadership given up (pid %d)", os.getpid())
+
+    def _run(self):
+        while True:
+            try:
+                self.elector.elect()
+            except Exception as e:
+                logger.warning("Scheduler election failed: %s", e)
+            if self._stop.wait(self.interval):
+                break
+        self.elector.resign()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="scheduler-election", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+
+scheduler = LeaderScheduler()
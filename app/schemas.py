@@ -10,23 +10,23 @@ from datetime import datetime
 
 class ListingBase(BaseModel):
     listing_id: str = Field(..., max_length=255)
-    title: Optional[str]
-    price: Optional[float]
-    currency: Optional[str]
-    year: Optional[int]
-    mileage: Optional[int]
-    location: Optional[str]
-    url: Optional[str]
+    title: Optional[str] = None
+    price: Optional[float] = None
+    currency: Optional[str] = None
+    year: Optional[int] = None
+    mileage: Optional[int] = None
+    location: Optional[str] = None
+    url: Optional[str] = None
 
 class ListingCreate(ListingBase):
-    raw_json: Optional[dict]
+    raw_json: Optional[dict] = None
 
 class ListingUpdate(BaseModel):
-    title: Optional[str]
-    price: Optional[float]
-    year: Optional[int]
-    mileage: Optional[int]
-    location: Optional[str]
+    title: Optional[str] = None
+    price: Optional[float] = None
+    year: Optional[int] = None
+    mileage: Optional[int] = None
+    location: Optional[str] = None
 
 class ListingOut(ListingBase):
     id: int
@@ -36,6 +36,13 @@ class ListingOut(ListingBase):
     class Config:
         orm_mode = True
 
+class PriceHistoryOut(BaseModel):
+    price: Optional[float]
+    mileage: Optional[int]
+    observed_at: datetime
+    class Config:
+        orm_mode = True
+
 class ListingFilter(BaseModel):
     min_price: Optional[float]
     max_price: Optional[float]
@@ -1,122 +1,258 @@
 # app/scrape.py
-import os, json, re
+import os
+import time
+import asyncio
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
-from .utils import logger, retry
+from playwright.async_api import async_playwright, TimeoutError as PWTimeout
+from .utils import logger
 from .db import SessionLocal
-from .services import ingest_listing
-from urllib.parse import urljoin
-from time import sleep
-from bs4 import BeautifulSoup
-
-# try to detect available parser; prefer lxml if installed
-try:
-    import lxml  # type: ignore
-    _bs_parser = "lxml"
-except Exception:
-    _bs_parser = "html.parser"
+from .services import IngestBuffer
+from .fetcher import iter_pages, RoutePolicy
+from .browser import HEADLESS, SCRAPE_WARM_BROWSER, browser_manager, load_cookies
+from .harvest import harvest_item_urls
+from .extract import _get_id
+from .archive import extract_and_archive
+from . import crud, metrics
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 
 load_dotenv()
 TARGET_URL = os.getenv("TARGET_URL")
-HEADLESS = os.getenv("HEADLESS", "1") == "1"
-COOKIES_FILE = os.getenv("PLAYWRIGHT_COOKIES_FILE")
 # allow collecting more items via env override
 SCRAPE_MAX_ITEMS = int(os.getenv("SCRAPE_MAX_ITEMS", "200"))
+# processes used for HTML parsing; 0 parses on a thread of the scraper process
+SCRAPE_PARSE_WORKERS = int(os.getenv("SCRAPE_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# capacity of the fetch -> parse and parse -> write queues
+SCRAPE_QUEUE_SIZE = int(os.getenv("SCRAPE_QUEUE_SIZE", "32"))
+# incremental mode: skip detail fetches for listings seen within the staleness window
+SCRAPE_INCREMENTAL = os.getenv("SCRAPE_INCREMENTAL", "0") == "1"
+SCRAPE_STALE_AFTER_MINUTES = float(os.getenv("SCRAPE_STALE_AFTER_MINUTES", "360"))
 
-def _get_id(url):
-    m = re.search(r"/item/([^/?&]+)", url)
-    return m.group(1) if m else url.split("/")[-1]
+async def _discover_urls(page):
+    await page.goto(TARGET_URL, timeout=60000)
+    await page.wait_for_load_state("domcontentloaded")
+    # scroll until a round brings no new items; the caps guard against endless feeds
+    return await harvest_item_urls(page, SCRAPE_MAX_ITEMS, max_rounds=50)
 
-@retry(Exception, tries=3, delay=2, backoff=2)
-def fetch_url_content(page, url):
-    page.goto(url, timeout=60000)
-    sleep(1)
-    return page.content()
+def _select_urls(db, urls, stats, incremental=False, stale_after_minutes=None):
+    """Pick the detail pages to fetch, one URL per listing id.
 
-def scrape_marketplace():
-    if not TARGET_URL:
-        raise RuntimeError("TARGET_URL not set")
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=HEADLESS)
-        context = browser.new_context()
-        if COOKIES_FILE and os.path.exists(COOKIES_FILE):
+    In incremental mode listings seen within the staleness window are not
+    fetched again; their `last_seen_at` is bumped in one UPDATE instead.
+    """
+    by_id = {}
+    for u in urls:
+        by_id.setdefault(_get_id(u), u)
+    stats["candidates"] = len(by_id)
+    window = SCRAPE_STALE_AFTER_MINUTES if stale_after_minutes is None else stale_after_minutes
+    known = crud.get_freshness(db, list(by_id), window * 60 if incremental else 0)
+    # end the read transaction; fetching can take minutes
+    db.commit()
+    stats["new"] = len(by_id) - len(known)
+    if not incremental:
+        return list(by_id.values())
+    fresh = [lid for lid, is_fresh in known.items() if is_fresh]
+    crud.touch_listings(db, fresh)
+    stats["skipped"] = len(fresh)
+    return [u for lid, u in by_id.items() if not known.get(lid)]
+
+async def _run_pipeline(context, urls, db, stats, concurrency=None, parse_workers=None):
+    """Fetch, parse and write `urls` as three overlapping stages.
+
+    The stages are connected by bounded queues, so a slow parser or a slow
+    database stalls fetching instead of piling pages up in memory. Counts
+    of fetched, failed and ingested listings are accumulated in `stats`.
+    """
+    loop = asyncio.get_running_loop()
+    parse_workers = SCRAPE_PARSE_WORKERS if parse_workers is None else parse_workers
+    parse_q = asyncio.Queue(maxsize=SCRAPE_QUEUE_SIZE)
+    write_q = asyncio.Queue(maxsize=SCRAPE_QUEUE_SIZE)
+    n_parsers = max(1, parse_workers)
+    # spawn: forking a process that runs Playwright's event loop and threads is unsafe
+    pool = ProcessPoolExecutor(parse_workers, mp_context=multiprocessing.get_context("spawn")) if parse_workers > 0 else None
+    buffer = IngestBuffer(db)
+    timings = stats["timings"]
+    timings.update(fetch=0.0, parse=0.0, write=0.0)
+
+    async def fetch_stage():
+        started = time.monotonic()
+        # pages are handed out by iter_pages as they complete, not in input order
+        async for u, html, err in iter_pages(context, urls, concurrency=concurrency):
+            if err is not None:
+                stats["failed"] += 1
+                if isinstance(err, PWTimeout):
+                    metrics.scrape_timeouts.inc()
+                    logger.warning("Timeout on %s: %s", u, err)
+                else:
+                    logger.error("Failed to scrape %s: %s", u, err, exc_info=err)
+                continue
+            stats["fetched"] += 1
+            await parse_q.put((u, html))
+        timings["fetch"] = time.monotonic() - started
+        for _ in range(n_parsers):
+            await parse_q.put(None)
+
+    async def parse_stage():
+        while True:
+            item = await parse_q.get()
+            if item is None:
+                return
+            u, html = item
+            started = time.monotonic()
             try:
-                with open(COOKIES_FILE, "r", encoding="utf-8") as fh:
-                    cookies = json.load(fh)
-                context.add_cookies(cookies)
+                if pool is not None:
+                    payload = await loop.run_in_executor(pool, extract_and_archive, html, u)
+                else:
+                    payload = await asyncio.to_thread(extract_and_archive, html, u)
             except Exception as e:
-                logger.error("Failed loading cookies: %s", e)
-        page = context.new_page()
-        page.goto(TARGET_URL, timeout=60000)
-        page.wait_for_load_state("domcontentloaded")
-        sleep(2)
-
-        # Progressive infinite scroll until no new items appear for a few rounds or cap is reached
-        urls_set = set()
-        stagnant_rounds = 0
-        max_rounds = 50
-        while stagnant_rounds < 3 and len(urls_set) < SCRAPE_MAX_ITEMS and max_rounds > 0:
+                stats["failed"] += 1
+                logger.exception("Failed to scrape %s: %s", u, e)
+                continue
+            finally:
+                elapsed = time.monotonic() - started
+                timings["parse"] += elapsed
+                metrics.add_span("parse.page", elapsed)
+            await write_q.put(payload)
+
+    async def parse_all():
+        await asyncio.gather(*(parse_stage() for _ in range(n_parsers)))
+        await write_q.put(None)
+
+    async def write_stage():
+        while True:
+            payload = await write_q.get()
+            if payload is None:
+                return
+            started = time.monotonic()
             try:
-                page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
-            except Exception:
-                pass
-            # give time for network/rendering
-            page.wait_for_load_state("networkidle", timeout=30000)
-            sleep(1.0)
-            anchors = page.query_selector_all("a[href*='/marketplace/item/'], a[href*='/item/']")
-            before = len(urls_set)
-            for a in anchors:
-                href = a.get_attribute("href")
-                if not href:
-                    continue
-                if href.startswith("/"):
-                    href = urljoin("https://www.facebook.com", href)
-                urls_set.add(href)
-                if len(urls_set) >= SCRAPE_MAX_ITEMS:
-                    break
-            stagnant_rounds = stagnant_rounds + 1 if len(urls_set) == before else 0
-            max_rounds -= 1
-
-        urls = list(urls_set)
+                await asyncio.to_thread(buffer.add, payload)
+            except Exception as e:
+                logger.exception("Failed to ingest batch ending with %s: %s", payload["listing_id"], e)
+            timings["write"] += time.monotonic() - started
+            stats["ingested"] = buffer.ingested
+
+    tasks = [asyncio.create_task(c) for c in (fetch_stage(), parse_all(), write_stage())]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        started = time.monotonic()
+        try:
+            await asyncio.to_thread(buffer.close)
+        except Exception as e:
+            logger.exception("Failed to flush ingest buffer: %s", e)
+        timings["write"] += time.monotonic() - started
+        stats["ingested"] = buffer.ingested
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+def new_stats():
+    """Counters and stage timings filled in by a scrape run.
+
+    All keys exist up front so other threads can copy the dict while a run updates it.
+    """
+    return {"discovered": 0, "candidates": 0, "skipped": 0, "fetched": 0, "new": 0, "failed": 0, "ingested": 0,
+            "timings": {"discover": None, "select": None, "fetch": None, "parse": None, "write": None, "total": None},
+            "network": None, "browser": None, "trace": None}
+
+# scrape_stage_duration_seconds stage label -> stats["timings"] key
+_STAGE_METRICS = [("scroll", "discover"), ("select", "select"), ("fetch", "fetch"), ("parse", "parse"),
+                  ("upsert", "write"), ("total", "total")]
+
+async def _scrape(context, stats, started, concurrency=None, parse_workers=None,
+                  incremental=False, stale_after_minutes=None):
+    timings = stats["timings"]
+    policy = RoutePolicy()
+    await policy.install(context)
+    stats["network"] = policy.stats
+    try:
+        page = await context.new_page()
+        urls = await _discover_urls(page)
+        await page.close()
+        stats["discovered"] = len(urls)
+        timings["discover"] = time.monotonic() - started
         logger.info("Found %d candidate urls after scrolling", len(urls))
         db = SessionLocal()
         try:
-            for u in urls:
-                try:
-                    html = fetch_url_content(page, u)
-                    # use chosen parser (lxml preferred, fallback to html.parser)
-                    soup = BeautifulSoup(html, _bs_parser)
-                    title = soup.find("meta", property="og:title")
-                    title = title["content"].strip() if title else soup.title.string.strip() if soup.title else None
-                    text_blob = soup.get_text(" ", strip=True)
-                    price_m = re.search(r"([₱\$€£]|PHP)\s*([0-9,\.]+)", text_blob)
-                    price = float(price_m.group(2).replace(",", "")) if price_m else None
-                    currency = price_m.group(1) if price_m else None
-                    year_m = re.search(r"\b(19|20)\d{2}\b", text_blob)
-                    year = int(year_m.group(0)) if year_m else None
-                    mileage_m = re.search(r"(\d{1,3}(?:,\d{3})+|\d{2,6})\s*(km|kilometers|kms)", text_blob, re.I)
-                    mileage = int(re.sub(r"[^\d]","", mileage_m.group(1))) if mileage_m else None
-                    location = None
-                    loc = soup.select_one("[data-testid*='location'], [class*='location']")
-                    if loc: location = loc.get_text(" ", strip=True)
-                    listing_id = _get_id(u)
-                    payload = {
-                        "listing_id": listing_id,
-                        "title": title,
-                        "price": price,
-                        "currency": currency,
-                        "year": year,
-                        "mileage": mileage,
-                        "location": location,
-                        "url": u,
-                        "raw_json": {"snippet": str(soup)[:4000]}
-                    }
-                    ingest_listing(db, payload)
-                except PWTimeout as e:
-                    logger.warning("Timeout on %s: %s", u, e)
-                except Exception as e:
-                    logger.exception("Failed to scrape %s: %s", u, e)
+            t0 = time.monotonic()
+            urls = await asyncio.to_thread(_select_urls, db, urls, stats, incremental, stale_after_minutes)
+            timings["select"] = time.monotonic() - t0
+            await _run_pipeline(context, urls, db, stats, concurrency=concurrency, parse_workers=parse_workers)
         finally:
             db.close()
-            context.close()
-            browser.close()
+    finally:
+        await policy.uninstall(context)
+
+async def scrape_marketplace_async(concurrency: int = None, parse_workers: int = None,
+                                   incremental: bool = None, stale_after_minutes: float = None,
+                                   stats: dict = None, browsers=None):
+    """Run one scrape and return a summary of what happened to the candidates.
+
+    Pass a dict from `new_stats()` as `stats` to watch progress while it runs.
+    While tracing is on (`metrics.tracer`) `stats["trace"]` gets a per-span
+    breakdown of the run. With a `BrowserManager` as `browsers` the run borrows its warm browser
+    and must be awaited on the manager's loop; otherwise a browser is
+    launched for this run and closed at the end.
+    """
+    if not TARGET_URL:
+        raise RuntimeError("TARGET_URL not set")
+    incremental = SCRAPE_INCREMENTAL if incremental is None else incremental
+    stats = new_stats() if stats is None else stats
+    timings = stats["timings"]
+    started = time.monotonic()
+    stats["trace"] = metrics.start_trace()
+    status = "failed"
+    kwargs = dict(concurrency=concurrency, parse_workers=parse_workers,
+                  incremental=incremental, stale_after_minutes=stale_after_minutes)
+    try:
+        if browsers is not None:
+            context, stats["browser"] = await browsers.acquire()
+            try:
+                await _scrape(context, stats, started, **kwargs)
+            finally:
+                await browsers.release(context)
+        else:
+            async with async_playwright() as p:
+                browser = await p.chromium.launch(headless=HEADLESS)
+                context = await browser.new_context()
+                await load_cookies(context)
+                stats["browser"] = {"warm": False, "startup_seconds": round(time.monotonic() - started, 3),
+                                    "startup_saved_seconds": 0.0}
+                try:
+                    await _scrape(context, stats, started, **kwargs)
+                finally:
+                    await context.close()
+                    await browser.close()
+        status = "succeeded"
+    finally:
+        timings["total"] = time.monotonic() - started
+        metrics.scrape_runs.inc(status=status)
+        for stage, key in _STAGE_METRICS:
+            if timings[key] is not None:
+                metrics.scrape_stage_seconds.observe(timings[key], stage=stage)
+    network = stats["network"]
+    if network and network["mode"] != "off":
+        logger.info("Network (%s): %d requests blocked, %d loaded, %d bytes loaded, %d bytes blockable",
+                    network["mode"], network["requests_blocked"], network["requests_loaded"],
+                    network["bytes_loaded"], network["bytes_blockable"])
+    browser_info = stats["browser"]
+    logger.info("Browser %s: ready in %.2fs, %.2fs saved", "warm" if browser_info["warm"] else "cold",
+                browser_info["startup_seconds"], browser_info["startup_saved_seconds"])
+    logger.info("Scrape finished: %d candidates, %d skipped, %d fetched, %d new, %d failed, %d ingested",
+                stats["candidates"], stats["skipped"], stats["fetched"], stats["new"], stats["failed"], stats["ingested"])
+    return stats
+
+def scrape_marketplace(concurrency: int = None, parse_workers: int = None,
+                       incremental: bool = None, stale_after_minutes: float = None, stats: dict = None):
+    """Synchronous entry point used by the scrape jobs and `run_and_save.py`.
+
+    With SCRAPE_WARM_BROWSER=1 (the default) runs share one browser kept
+    warm by `browser_manager` between calls.
+    """
+    kwargs = dict(concurrency=concurrency, parse_workers=parse_workers, incremental=incremental,
+                  stale_after_minutes=stale_after_minutes, stats=stats)
+    if SCRAPE_WARM_BROWSER:
+        return browser_manager.run(scrape_marketplace_async, browsers=browser_manager, **kwargs)
+    return asyncio.run(scrape_marketplace_async(**kwargs))
@@ -0,0 +1,51 @@
+# app/serialize.py
+"""JSON bodies of the listing read endpoints, encoded straight from rows.
+
+`crud` returns plain column rows in `LISTING_FIELDS` order; they are zipped
+into dicts and encoded in one call, producing the same bytes as dumping
+`schemas.ListingOut` models without building and validating one per row.
+orjson is used when installed, the standard json module otherwise.
+"""
+import json
+from datetime import datetime
+from decimal import Decimal
+from . import schemas
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# response fields in schema order, which is also the JSON key order
+LISTING_FIELDS = list(schemas.ListingOut.model_fields)
+
+
+def parse_fields(spec: str = None):
+    """Field list from a comma-separated `spec`; raises ValueError for unknown names."""
+    if not spec:
+        return list(LISTING_FIELDS)
+    fields = list(dict.fromkeys(f.strip() for f in spec.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in LISTING_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}; available: {', '.join(LISTING_FIELDS)}")
+    return fields
+
+
+def _default(value):
+    # the types ListingOut coerces: Numeric price to float, UTC timestamps as "...Z"
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z")
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def listing_dicts(rows, fields):
+    """Rows whose leading columns are `fields`, as dicts of just those fields."""
+    return [dict(zip(fields, row)) for row in rows]
@@ -1,10 +1,20 @@
-# app/services.py
 from . import crud, schemas
 from sqlalchemy.orm import Session
 from .utils import logger
-from typing import Dict
+from typing import Dict, List
+from pydantic import ValidationError
+import os
+import json
+import time
 
-def ingest_listing(db: Session, payload: Dict):
+# buffered ingestion: flush after this many listings or this many seconds
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "100"))
+INGEST_FLUSH_SECONDS = float(os.getenv("INGEST_FLUSH_SECONDS", "10"))
+# bulk NDJSON loads: rows per upsert batch and per-line errors kept in the report
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "2000"))
+BULK_MAX_ERRORS = int(os.getenv("BULK_MAX_ERRORS", "100"))
+
+def normalize_listing(payload: Dict) -> Dict:
     # Basic normalization/validation
     if "listing_id" not in payload:
         raise ValueError("listing_id missing")
@@ -14,6 +24,139 @@ def ingest_listing(db: Session, payload: Dict):
             payload["price"] = float(payload["price"])
         except:
             payload["price"] = None
+    return payload
+
+def ingest_listing(db: Session, payload: Dict):
+    normalize_listing(payload)
     crud.upsert_listing(db, payload)
     logger.info("Ingested listing %s", payload["listing_id"])
     return payload["listing_id"]
+
+
+class IngestBuffer:
+    """Collects scraped listings and writes them with `crud.upsert_listings`.
+
+    The buffer is flushed when it holds `max_size` listings, when the oldest
+    buffered listing is older than `max_age` seconds, or on `close()`.
+    Use it as a context manager so the tail of a run is never lost.
+    """
+
+    def __init__(self, db: Session, max_size: int = None, max_age: float = None):
+        self.db = db
+        self.max_size = max_size or INGEST_BATCH_SIZE
+        self.max_age = INGEST_FLUSH_SECONDS if max_age is None else max_age
+        self.pending: List[Dict] = []
+        self.first_added = None
+        self.ingested = 0
+
+    def add(self, payload: Dict):
+        self.pending.append(normalize_listing(payload))
+        if self.first_added is None:
+            self.first_added = time.monotonic()
+        if len(self.pending) >= self.max_size or time.monotonic() - self.first_added >= self.max_age:
+            self.flush()
+        return payload["listing_id"]
+
+    def flush(self):
+        if not self.pending:
+            return 0
+        rows, self.pending, self.first_added = self.pending, [], None
+        try:
+            n = crud.upsert_listings(self.db, rows)
+        except Exception:
+            self.db.rollback()
+            raise
+        self.ingested += n
+        logger.info("Ingested %d listings (%d total)", n, self.ingested)
+        return n
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _describe(e: Exception) -> str:
+    # database errors: the driver message, not the statement and its parameters
+    e = getattr(e, "orig", None) or e
+    if isinstance(e, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, err['loc'])) or 'line'}: {err['msg']}" for err in e.errors())
+    return str(e)
+
+
+class BulkLoader:
+    """Validates NDJSON lines and upserts them in batches of `batch_size`.
+
+    Feed lines with `add()`; when it returns True a batch is full and
+    `flush()` should be called (the API does so on a worker thread). A line
+    that fails JSON parsing, `schemas.ListingCreate` validation or its
+    database write is reported in `report` and the load carries on. Only
+    the first `max_errors` errors are kept, so memory stays bounded for
+    arbitrarily long inputs.
+    """
+
+    def __init__(self, db: Session, batch_size: int = None, max_errors: int = None):
+        self.db = db
+        self.batch_size = batch_size or BULK_BATCH_SIZE
+        self.max_errors = BULK_MAX_ERRORS if max_errors is None else max_errors
+        self.lineno = 0
+        self.batch = []
+        self.report = {"lines": 0, "ingested": 0, "failed": 0, "errors": []}
+
+    def _error(self, lineno, e, listing_id=None):
+        self.report["failed"] += 1
+        if len(self.report["errors"]) < self.max_errors:
+            self.report["errors"].append({"line": lineno, "listing_id": listing_id, "error": _describe(e)})
+
+    def add(self, raw) -> bool:
+        self.lineno += 1
+        raw = raw.strip()
+        if not raw:
+            return False
+        self.report["lines"] += 1
+        try:
+            # json.loads takes UTF-8 bytes as well as str
+            obj = json.loads(raw)
+            if not isinstance(obj, dict):
+                raise ValueError("expected a JSON object")
+            payload = normalize_listing(schemas.ListingCreate.model_validate(obj).model_dump())
+        except ValueError as e:
+            # covers bad UTF-8, bad JSON and pydantic validation errors
+            self._error(self.lineno, e)
+            return False
+        self.batch.append((self.lineno, payload))
+        return len(self.batch) >= self.batch_size
+
+    def flush(self):
+        batch, self.batch = self.batch, []
+        if not batch:
+            return 0
+        try:
+            crud.upsert_listings(self.db, [p for _, p in batch])
+            self.report["ingested"] += len(batch)
+        except Exception as e:
+            # one bad row fails the whole statement: retry row by row to isolate it
+            self.db.rollback()
+            logger.warning("Bulk batch ending at line %d failed (%s); retrying rows one by one", batch[-1][0], e)
+            for lineno, payload in batch:
+                try:
+                    crud.upsert_listing(self.db, payload)
+                    self.report["ingested"] += 1
+                except Exception as row_error:
+                    self.db.rollback()
+                    self._error(lineno, row_error, payload["listing_id"])
+        logger.info("Bulk load: %d lines read, %d ingested, %d failed",
+                    self.report["lines"], self.report["ingested"], self.report["failed"])
+        return len(batch)
+
+    def load(self, lines):
+        """Ingest an iterable of lines and return the report."""
+        for raw in lines:
+            if self.add(raw):
+                self.flush()
+        self.flush()
+        return self.report
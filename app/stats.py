@@ -0,0 +1,192 @@
+# app/stats.py
+"""Market statistics for `GET /listings/stats`, served from a rollup table.
+
+`listing_stats` holds counts and price aggregates per (year, location,
+currency, price bucket). A trigger on `listings` records which groups a
+write touched; `refresh` recomputes just those groups and runs after every
+crud write, so the rollup stays current without rescanning the table.
+Price buckets are 5% wide on a log scale: the median is interpolated within
+its bucket, and price filters are exact only where a bucket lies entirely
+inside or outside the range (`exact` in the response says which).
+Text search (`q`) cannot be rolled up and is aggregated from `listings` directly.
+"""
+import math
+from sqlalchemy import text, select, func, and_, true, literal_column
+from sqlalchemy.orm import Session
+from .models import Listing, ListingStat
+from . import crud
+from .utils import logger
+
+PRICE_BUCKET_RATIO = 1.05
+GROUP_COLUMNS = {"year": "year", "location": "location_norm", "currency": "currency"}
+# refreshes are serialized so two writers never rebuild the same group at once
+_REFRESH_LOCK = 0x5354415453  # "STATS"
+_LN_RATIO = math.log(PRICE_BUCKET_RATIO)
+
+_BUCKET_SQL = f"CASE WHEN price IS NULL THEN -1 WHEN price < 1 THEN 0 ELSE floor(ln(price) / {_LN_RATIO!r})::int END"
+
+_REBUILD = text(f"""
+INSERT INTO listing_stats (year, location_norm, currency, bucket, listings, price_min, price_max, price_sum)
+SELECT g.year, g.location_norm, g.currency, {_BUCKET_SQL.replace("price", "l.price")}, count(*), min(l.price), max(l.price), sum(l.price)
+FROM unnest(CAST(:years AS int[]), CAST(:locations AS text[]), CAST(:currencies AS text[])) AS g(year, location_norm, currency)
+JOIN listings l ON coalesce(l.year, 0) = g.year AND coalesce(l.location_norm, '') = g.location_norm
+               AND coalesce(l.currency, '') = g.currency
+GROUP BY 1, 2, 3, 4
+""")
+
+
+def refresh(db: Session) -> int:
+    """Recompute the rollup rows of every group marked dirty; returns the number of groups."""
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _REFRESH_LOCK})
+    # the DELETE sees only committed marks; a write still in flight keeps its mark
+    # for its own refresh, even when it is in a group rebuilt here
+    groups = db.execute(text("""
+        WITH done AS (DELETE FROM listing_stats_marks RETURNING year, location_norm, currency)
+        SELECT DISTINCT year, location_norm, currency FROM done
+    """)).all()
+    if groups:
+        years, locations, currencies = (list(col) for col in zip(*groups))
+        params = {"years": years, "locations": locations, "currencies": currencies}
+        db.execute(text("""
+            DELETE FROM listing_stats s
+            USING unnest(CAST(:years AS int[]), CAST(:locations AS text[]), CAST(:currencies AS text[]))
+                AS g(year, location_norm, currency)
+            WHERE s.year = g.year AND s.location_norm = g.location_norm AND s.currency = g.currency
+        """), params)
+        db.execute(_REBUILD, params)
+    db.commit()
+    return len(groups)
+
+
+def refresh_quietly(db: Session):
+    """`refresh` for callers that already committed their own write: a failure
+    leaves the groups marked for the next refresh instead of failing the caller."""
+    try:
+        refresh(db)
+    except Exception as e:
+        db.rollback()
+        logger.warning("Listing stats refresh failed, will retry on the next write: %s", e)
+
+
+def _bucket_bounds(bucket: int):
+    if bucket <= 0:
+        return 0.0, PRICE_BUCKET_RATIO
+    return PRICE_BUCKET_RATIO ** bucket, PRICE_BUCKET_RATIO ** (bucket + 1)
+
+
+def _rollup_conditions(filters: dict):
+    """WHERE clauses over `listing_stats` for the `crud.list_listings` filters other than q."""
+    t = ListingStat
+    conds = []
+    if filters.get("min_year") is not None:
+        conds.append(and_(t.year >= filters["min_year"], t.year != 0))
+    if filters.get("max_year") is not None:
+        conds.append(and_(t.year <= filters["max_year"], t.year != 0))
+    if filters.get("location"):
+        query = crud._prefix_tsquery(filters["location"])
+        if query is not None:
+            conds.append(t.location_tsv.op("@@")(query))
+    lo, hi = filters.get("min_price"), filters.get("max_price")
+    if lo is not None or hi is not None:
+        conds.append(t.bucket >= 0)
+        if lo is not None:
+            conds.append(t.price_max >= lo)
+        if hi is not None:
+            conds.append(t.price_min <= hi)
+    return conds
+
+
+def _summarize(buckets, count: int):
+    """Count, price range, mean and interpolated median from `(bucket, n, min, max, sum)` rows."""
+    priced = [(b, n, float(mn), float(mx), float(sm)) for b, n, mn, mx, sm in sorted(buckets) if b >= 0 and n]
+    n_priced = sum(n for _, n, _, _, _ in priced)
+    out = {"count": count, "priced": n_priced, "min_price": None, "max_price": None,
+           "avg_price": None, "median_price": None}
+    if not n_priced:
+        return out
+    out["min_price"] = min(mn for _, _, mn, _, _ in priced)
+    out["max_price"] = max(mx for _, _, _, mx, _ in priced)
+    out["avg_price"] = round(sum(sm for *_, sm in priced) / n_priced, 2)
+    half, seen = n_priced / 2, 0
+    for _, n, mn, mx, _ in priced:
+        if seen + n >= half:
+            # geometric interpolation inside the bucket, within its actual min/max
+            frac = (half - seen) / n
+            out["median_price"] = round(mn * (mx / mn) ** frac if mn > 0 else mn + (mx - mn) * frac, 2)
+            break
+        seen += n
+    return out
+
+
+def _histogram(buckets, bins: int):
+    """Merge the 5% buckets into at most `bins` ranges of equal log width."""
+    priced = sorted((b, n) for b, n, *_ in buckets if b >= 0 and n)
+    if not priced:
+        return []
+    first, last = priced[0][0], priced[-1][0]
+    width = max(1, math.ceil((last - first + 1) / bins))
+    merged = {}
+    for b, n in priced:
+        merged[(b - first) // width] = merged.get((b - first) // width, 0) + n
+    return [{"min_price": round(_bucket_bounds(first + k * width)[0], 2),
+             "max_price": round(_bucket_bounds(first + k * width + width - 1)[1], 2), "count": n}
+            for k, n in sorted(merged.items())]
+
+
+def _live_rows(db: Session, filters: dict, group_col):
+    """Aggregate rows shaped like the rollup query's, straight from `listings` (used for q=)."""
+    bucket = literal_column(_BUCKET_SQL.replace("price", "listings.price"))
+    key = (func.coalesce(getattr(Listing, group_col), literal_column("0" if group_col == "year" else "''"))
+           if group_col else literal_column("NULL"))
+    stmt = (select(key, bucket, func.count(), func.min(Listing.price), func.max(Listing.price), func.sum(Listing.price))
+            .where(*crud._filter_conditions(filters)).group_by(*([key] if group_col else []), bucket))
+    return [(g, b, n, mn, mx, sm, True) for g, b, n, mn, mx, sm in db.execute(stmt)]
+
+
+def _rollup_rows(db: Session, filters: dict, group_col):
+    t = ListingStat
+    key = getattr(t, group_col) if group_col else literal_column("NULL")
+    # a bucket straddling a price bound is counted whole, which makes the result approximate
+    lo, hi = filters.get("min_price"), filters.get("max_price")
+    inside = [c for c in ((t.price_min >= lo) if lo is not None else None,
+                          (t.price_max <= hi) if hi is not None else None) if c is not None]
+    exact_col = func.bool_and(and_(*inside)) if inside else true()
+    stmt = (select(key, t.bucket, func.sum(t.listings), func.min(t.price_min), func.max(t.price_max),
+                   func.sum(t.price_sum), exact_col)
+            .where(*_rollup_conditions(filters)).group_by(*([key] if group_col else []), t.bucket))
+    return db.execute(stmt).all()
+
+
+def market_stats(db: Session, filters: dict = None, group_by: str = None, bins: int = 20):
+    """Summary, price histogram and optional per-`group_by` breakdown for listings matching `filters`."""
+    filters = {k: v for k, v in (filters or {}).items() if v not in (None, "")}
+    group_col = GROUP_COLUMNS[group_by] if group_by else None
+    live = bool(filters.get("q"))
+    rows = _live_rows(db, filters, group_col) if live else _rollup_rows(db, filters, group_col)
+    groups = {}
+    for g, b, n, mn, mx, sm, _ in rows:
+        groups.setdefault(g, []).append((b, int(n), mn, mx, sm))
+    everything = {}
+    for items in groups.values():
+        for b, n, mn, mx, sm in items:
+            acc = everything.get(b)
+            if acc is None:
+                everything[b] = [b, n, mn, mx, sm]
+            else:
+                acc[1] += n
+                acc[2] = mn if acc[2] is None or (mn is not None and mn < acc[2]) else acc[2]
+                acc[3] = mx if acc[3] is None or (mx is not None and mx > acc[3]) else acc[3]
+                acc[4] = (acc[4] or 0) + (sm or 0)
+    total = sum(acc[1] for acc in everything.values())
+    result = _summarize([tuple(a) for a in everything.values()], total)
+    result.update(histogram=_histogram(list(everything.values()), bins),
+                  source="live" if live else "rollup", exact=all(r[-1] for r in rows))
+    if group_col:
+        breakdown = []
+        for g, items in groups.items():
+            entry = _summarize(items, sum(n for _, n, *_ in items))
+            entry["key"] = None if g in (0, "") else g
+            breakdown.append(entry)
+        breakdown.sort(key=lambda e: (e["key"] is None, e["key"]))
+        result["groups"] = breakdown
+    return result
@@ -4,10 +4,12 @@
 Module-level documentation added for clarity without impacting behavior.
 """
 import os
+import asyncio
 import logging
 import time
 from functools import wraps
 from dotenv import load_dotenv
+from . import metrics
 
 load_dotenv()
 
@@ -21,19 +23,47 @@ def get_logger(name=__name__):
 
 logger = get_logger("car-service")
 
+def backoff_delay(attempt, delay=1, backoff=2, max_delay=None):
+    """Seconds to wait before retry number `attempt` (1 for the first retry)."""
+    wait = delay * backoff ** (attempt - 1)
+    return min(wait, max_delay) if max_delay is not None else wait
+
+def _retrying(f, e, attempt, delay, backoff, logger):
+    # shared by both decorators: log and count the failure, return the wait before the next try
+    wait = backoff_delay(attempt, delay, backoff)
+    logger.warning("Retryable error: %s, retrying in %s sec", e, wait)
+    metrics.retries.inc(function=f.__name__, error=type(e).__name__)
+    return wait
+
 def retry(exceptions, tries=3, delay=1, backoff=2, logger=logger):
+    """Retry a blocking function up to `tries` times, sleeping `backoff_delay` between tries."""
     def deco_retry(f):
+        if asyncio.iscoroutinefunction(f):
+            # time.sleep would stall the event loop
+            raise TypeError(f"{f.__name__} is a coroutine function; use async_retry")
+
         @wraps(f)
         def f_retry(*args, **kwargs):
-            mtries, mdelay = tries, delay
-            while mtries > 1:
+            for attempt in range(1, tries):
                 try:
                     return f(*args, **kwargs)
                 except exceptions as e:
-                    logger.warning("Retryable error: %s, retrying in %s sec", e, mdelay)
-                    time.sleep(mdelay)
-                    mtries -= 1
-                    mdelay *= backoff
+                    time.sleep(_retrying(f, e, attempt, delay, backoff, logger))
             return f(*args, **kwargs)
         return f_retry
     return deco_retry
+
+
+def async_retry(exceptions, tries=3, delay=1, backoff=2, logger=logger):
+    """Coroutine counterpart of `retry`; waits with `asyncio.sleep` between tries."""
+    def deco_retry(f):
+        @wraps(f)
+        async def f_retry(*args, **kwargs):
+            for attempt in range(1, tries):
+                try:
+                    return await f(*args, **kwargs)
+                except exceptions as e:
+                    await asyncio.sleep(_retrying(f, e, attempt, delay, backoff, logger))
+            return await f(*args, **kwargs)
+        return f_retry
+    return deco_retry
@@ -0,0 +1,88 @@
+# bench/frontier_scaling.py
+"""Throughput of several scraper workers sharing the Postgres frontier.
+
+Serves `--pages` synthetic listing pages, each delayed by `--latency`
+seconds of simulated network time, queues the index page and runs N
+`python -m app.cli frontier-worker --fetch http --exit-when-idle` processes
+at once, for each N in `--workers`. Every round starts from an empty queue
+and without the fixture's listings. Pages/s should grow close to linearly
+with N until the CPU or the database is saturated.
+
+    python bench/frontier_scaling.py --workers 1,2,4,8 --pages 400
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synth  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+from app import frontier  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+from app.models import FrontierEntry, ScrapeDomain, ensure_schema  # noqa: E402
+
+
+def reset(domain):
+    with SessionLocal() as db:
+        db.execute(delete(FrontierEntry).where(FrontierEntry.domain == domain))
+        db.execute(delete(ScrapeDomain).where(ScrapeDomain.domain == domain))
+        db.commit()
+    synth.delete_rows(engine, synth.PAGE_PREFIX)
+
+
+def run_round(server, n_workers, args):
+    domain = frontier.domain_of(server.base_url)
+    reset(domain)
+    with SessionLocal() as db:
+        frontier.enqueue_targets(db, [server.base_url + "/marketplace"])
+        # politeness is for real sites; here the fixture's latency is the limit
+        frontier.set_domain_interval(db, domain, 0)
+    env = dict(os.environ, SCRAPE_MAX_ITEMS=str(args.pages), FRONTIER_POLL_SECONDS="0.2",
+               HTML_ARCHIVE_DIR=tempfile.mkdtemp(prefix="bench-archive-"))
+    cmd = [sys.executable, "-m", "app.cli", "frontier-worker", "--fetch", "http", "--exit-when-idle",
+           "--domain", domain, "--batch-size", str(args.batch_size), "--concurrency", str(args.concurrency)]
+    t0 = time.perf_counter()
+    procs = [subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+             for _ in range(n_workers)]
+    results = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+    wall = time.perf_counter() - t0
+    # from the first worker's start to the last one's finish, without interpreter startup
+    elapsed = max(r["seconds"] for r in results)
+    fetched = sum(r["fetched"] for r in results)
+    return {"workers": n_workers, "seconds": round(elapsed, 2), "wall_seconds": round(wall, 2), "fetched": fetched,
+            "failed": sum(r["failed"] for r in results), "pages_per_sec": round(fetched / elapsed, 1),
+            "per_worker": [r["fetched"] for r in results]}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--workers", default="1,2,4")
+    ap.add_argument("--pages", type=int, default=200)
+    ap.add_argument("--latency", type=float, default=1.0, help="seconds the fixture waits before each response")
+    ap.add_argument("--noise", type=int, default=40, help="layout/script blocks per synthetic page")
+    ap.add_argument("--batch-size", type=int, default=10)
+    ap.add_argument("--concurrency", type=int, default=2, help="pages in flight per worker")
+    args = ap.parse_args()
+    ensure_schema(engine)
+    rounds = []
+    with synth.FixtureServer(args.pages, noise=args.noise, delay=args.latency) as server:
+        try:
+            for n in (int(w) for w in args.workers.split(",")):
+                r = run_round(server, n, args)
+                rounds.append(r)
+                base = rounds[0]["pages_per_sec"] * r["workers"] / rounds[0]["workers"]
+                print(f"{n} workers: {r['fetched']} pages in {r['seconds']}s = {r['pages_per_sec']} pages/s "
+                      f"({r['pages_per_sec'] / base:.0%} of linear), per worker {r['per_worker']}")
+        finally:
+            reset(frontier.domain_of(server.base_url))
+    return rounds
+
+
+if __name__ == "__main__":
+    main()
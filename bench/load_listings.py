@@ -0,0 +1,119 @@
+# bench/load_listings.py
+"""Load-test the read endpoints with the sync stack and with DB_ASYNC=1.
+
+Starts uvicorn once per mode against POSTGRES_URL (use a local Postgres),
+drives it with concurrent clients for a fixed time and prints throughput
+and latency percentiles. The response cache is disabled so every request
+reaches the database.
+
+    python bench/load_listings.py --seed 20000 --concurrency 64 --duration 20
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(n):
+    from app import crud
+    from app.db import SessionLocal, engine
+    from app.models import ensure_schema
+    ensure_schema(engine)
+    rng = random.Random(7)
+    rows = [{
+        "listing_id": f"bench-{i}",
+        "title": f"Bench car {i}",
+        "price": rng.randrange(100_000, 3_000_000),
+        "year": rng.randrange(2000, 2025),
+        "mileage": rng.randrange(0, 200_000),
+        "location": rng.choice(["Manila", "Cebu", "Davao", "Quezon City"]),
+        "url": f"http://bench/item/{i}",
+    } for i in range(n)]
+    with SessionLocal() as db:
+        crud.upsert_listings(db, rows)
+
+
+def request_mix(rng, seeded):
+    r = rng.random()
+    if r < 0.5:
+        return "/listings", {"limit": 20, "min_price": rng.randrange(100_000, 2_000_000), "sort": "price"}
+    if r < 0.8:
+        return "/listings", {"limit": 50, "location": rng.choice(["Manila", "Cebu"]), "sort": "-year"}
+    return f"/listings/bench-{rng.randrange(max(seeded, 1))}", None
+
+
+async def drive(base, concurrency, duration, seeded, mix=None):
+    mix = mix or request_mix
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def client_loop(i, client):
+        nonlocal errors
+        rng = random.Random(i)
+        while time.monotonic() < deadline:
+            path, params = mix(rng, seeded)
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(path, params=params)
+                if r.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(client_loop(i, client) for i in range(concurrency)))
+    return latencies, errors
+
+
+def pct(sorted_vals, p):
+    return sorted_vals[min(len(sorted_vals) - 1, int(len(sorted_vals) * p))] * 1000
+
+
+def run_mode(mode, args):
+    env = dict(os.environ, DB_ASYNC="1" if mode == "async" else "0", CACHE_TTL_SECONDS="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        for _ in range(100):
+            try:
+                if httpx.get(base + "/health").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        latencies, errors = asyncio.run(drive(base, args.concurrency, args.duration, args.seed))
+    finally:
+        proc.terminate()
+        proc.wait()
+    latencies.sort()
+    print(f"{mode:>5}: {len(latencies) / args.duration:8.1f} req/s  p50 {pct(latencies, .5):7.1f} ms  "
+          f"p95 {pct(latencies, .95):7.1f} ms  p99 {pct(latencies, .99):7.1f} ms  errors {errors}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--seed", type=int, default=0, help="upsert this many synthetic listings first")
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--duration", type=float, default=15)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--modes", default="sync,async")
+    args = ap.parse_args()
+    if args.seed:
+        seed(args.seed)
+    for mode in args.modes.split(","):
+        run_mode(mode, args)
+
+
+if __name__ == "__main__":
+    main()
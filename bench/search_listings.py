@@ -0,0 +1,95 @@
+# bench/search_listings.py
+"""Benchmark location filtering and q= search on a large synthetic table.
+
+Fills the `listings` table of POSTGRES_URL (use a scratch database) with
+synthetic rows, then compares the old unanchored ILIKE location filter
+against the tsvector-backed filter and ranked search in `crud.list_listings`.
+
+    python bench/search_listings.py --rows 1000000
+    python bench/search_listings.py --cleanup
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synth  # noqa: E402
+from app import crud  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+from app.models import Listing  # noqa: E402
+
+PREFIX = "synth-"
+
+
+def fill(rows):
+    seconds = synth.fill_table(engine, rows, PREFIX)
+    print(f"filled {rows} rows in {seconds:.1f}s")
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000
+
+
+def run(repeat):
+    with SessionLocal() as db:
+        print(f"{db.query(Listing).count()} rows in listings")
+
+        def ilike(loc, count):
+            def go():
+                q = db.query(Listing).filter(Listing.location.ilike(f"%{loc}%"))
+                q.order_by(Listing.id).limit(21).all()
+                if count:
+                    q.count()
+            return go
+
+        def listing(filters, count, sort=None):
+            return lambda: crud.list_listings(db, limit=20, filters=filters, sort=sort, count=count)
+
+        cases = [
+            ("location=baguio, first page", ilike("baguio", None), listing({"location": "baguio"}, None)),
+            ("location=baguio, count=exact", ilike("baguio", "exact"), listing({"location": "baguio"}, "exact")),
+            ("location=santos, count=exact", ilike("santos", "exact"), listing({"location": "santos"}, "exact")),
+        ]
+        print(f"{'case':40} {'ILIKE ms':>10} {'tsvector ms':>12}")
+        for name, old, new in cases:
+            print(f"{name:40} {timed(old, repeat):10.1f} {timed(new, repeat):12.1f}")
+
+        searches = [
+            ("q=montero baguio (rank)", {"q": "montero baguio"}, None),
+            ("q=ertiga 2018 (rank)", {"q": "ertiga 2018"}, None),
+            ("q=ertiga 2018, sort=-price", {"q": "ertiga 2018"}, "-price"),
+            ("q=vios, location=cebu (rank)", {"q": "vios", "location": "cebu"}, None),
+        ]
+        print(f"{'search':40} {'ms':>10}")
+        for name, filters, sort in searches:
+            print(f"{name:40} {timed(listing(filters, None, sort), repeat):10.1f}")
+
+
+def cleanup():
+    print(f"deleted {synth.delete_rows(engine, PREFIX)} synthetic rows")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=1_000_000, help="synthetic rows to ensure before timing")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--skip-fill", action="store_true")
+    ap.add_argument("--cleanup", action="store_true", help="delete the synthetic rows and exit")
+    args = ap.parse_args()
+    if args.cleanup:
+        return cleanup()
+    if not args.skip_fill:
+        fill(args.rows)
+    run(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
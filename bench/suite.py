@@ -0,0 +1,368 @@
+# bench/suite.py
+"""Benchmark suite for extraction, ingestion, listing queries, the API and a scrape.
+
+Runs against POSTGRES_URL (use a local scratch database) and a local
+fixture HTTP server; all inputs come from `synth` with fixed seeds, so two
+runs on the same machine measure the same work. Results are written as JSON
+(one record per case, with the git commit and environment) and can be
+compared with an earlier file:
+
+    python bench/suite.py
+    python bench/suite.py --parts extract,query --compare bench/results/<earlier>.json
+    python bench/suite.py --cleanup
+
+Parts:
+  extract  pages/s of `extract_listing` for each available engine
+  upsert   rows/s of `upsert_listing` (row at a time) and `upsert_listings` (batched),
+           for inserts and for updates of existing rows
+  query    `list_listings` latency over filter combinations at pages 1, 10 and 100,
+           by offset and by cursor, on a `--rows` synthetic table
+  api      end-to-end HTTP latency of the read endpoints under `--concurrency` levels
+  page     throughput of `GET /listings?limit=500`: building the body from ORM entities
+           through pydantic against projected rows through `serialize`, in process
+           and over HTTP
+  scrape   a full `scrape_marketplace_async` run against the fixture server
+           (skipped when Chromium cannot be launched)
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import List
+
+import httpx
+from pydantic import TypeAdapter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synth  # noqa: E402
+from load_listings import drive, pct  # noqa: E402
+from app import crud, schemas, serialize  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+
+ALL_PARTS = ["extract", "upsert", "query", "api", "page", "scrape"]
+PAGE_LIMIT = 500
+TABLE_PREFIX = "synth-"
+UPSERT_PREFIX = "synthrow-"
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+
+
+def latency_metrics(seconds):
+    seconds = sorted(seconds)
+    return {"p50_ms": round(pct(seconds, .5), 3), "p95_ms": round(pct(seconds, .95), 3),
+            "mean_ms": round(statistics.fmean(seconds) * 1000, 3), "samples": len(seconds)}
+
+
+def bench_extract(args):
+    from app import extract
+    pages = [(synth.listing_page(i, args.noise), synth.item_url("http://bench.invalid", i)) for i in range(args.pages)]
+    engines = {"bs4": extract.extract_listing_bs4}
+    if extract._bs_parser == "lxml":
+        engines["fast"] = extract.extract_listing_fast
+    avg_kb = sum(len(h) for h, _ in pages) / len(pages) / 1024
+    out = []
+    for name, fn in engines.items():
+        fn(*pages[0])  # warm up imports and caches
+        t0 = time.perf_counter()
+        parsed = [fn(h, u) for h, u in pages]
+        elapsed = time.perf_counter() - t0
+        complete = sum(1 for p in parsed if p["price"] and p["year"] and p["location"])
+        out.append({"bench": "extract", "case": name,
+                    "params": {"pages": len(pages), "avg_page_kb": round(avg_kb, 1)},
+                    "metrics": {"pages_per_sec": round(len(pages) / elapsed, 1),
+                                "complete_ratio": round(complete / len(pages), 3)}})
+    return out
+
+
+def _upsert_rows(n, salt=0):
+    rng = random.Random(salt)
+    return [{"listing_id": f"{UPSERT_PREFIX}{i}", "title": f"{synth.MAKES[i % len(synth.MAKES)]} {2005 + i % 19}",
+             "price": rng.randrange(100_000, 3_000_000), "currency": "PHP", "year": 2005 + i % 19,
+             "mileage": rng.randrange(200_000), "location": rng.choice(synth.LOCATIONS),
+             "url": f"https://example.invalid/item/{UPSERT_PREFIX}{i}"} for i in range(n)]
+
+
+def bench_upsert(args):
+    out = []
+    with SessionLocal() as db:
+        for case, n, batched in (("upsert_listing", args.upsert_rows // 4, False),
+                                 ("upsert_listings", args.upsert_rows, True)):
+            synth.delete_rows(engine, UPSERT_PREFIX)
+            for phase, salt in (("insert", 0), ("update", 1)):
+                rows = _upsert_rows(n, salt)
+                t0 = time.perf_counter()
+                if batched:
+                    crud.upsert_listings(db, rows)
+                else:
+                    for row in rows:
+                        crud.upsert_listing(db, row)
+                elapsed = time.perf_counter() - t0
+                out.append({"bench": "upsert", "case": f"{case} {phase}", "params": {"rows": n},
+                            "metrics": {"rows_per_sec": round(n / elapsed, 1)}})
+    synth.delete_rows(engine, UPSERT_PREFIX)
+    return out
+
+
+QUERY_CASES = [
+    ("all", {}, "id"),
+    ("price range, sort=price", {"min_price": 500_000, "max_price": 1_500_000}, "price"),
+    ("year range, sort=-year", {"min_year": 2015, "max_year": 2020}, "-year"),
+    ("location", {"location": "cebu"}, "id"),
+    ("location + price, sort=-price", {"location": "metro manila", "max_price": 1_000_000}, "-price"),
+    ("q ranked", {"q": "montero baguio"}, None),
+    ("q, sort=-last_seen_at", {"q": "vios"}, "-last_seen_at"),
+]
+QUERY_PAGES = (1, 10, 100)
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def bench_query(args):
+    out = []
+    limit = 20
+    with SessionLocal() as db:
+        for name, filters, sort in QUERY_CASES:
+            for page in QUERY_PAGES:
+                skip = (page - 1) * limit
+                run = lambda: crud.list_listings(db, skip=skip, limit=limit, filters=filters, sort=sort)  # noqa: E731
+                run()
+                out.append({"bench": "query", "case": f"{name} page={page} offset",
+                            "params": {"filters": filters, "sort": sort, "limit": limit, "skip": skip},
+                            "metrics": latency_metrics(_time(run, args.repeat))})
+                if sort is None or page == 1:
+                    continue
+                # walk to the page once, then time fetching it by cursor
+                cursor = None
+                for _ in range(page - 1):
+                    cursor = crud.list_listings(db, limit=limit, filters=filters, sort=sort, cursor=cursor)["next_cursor"]
+                if cursor is None:
+                    continue
+                run = lambda: crud.list_listings(db, limit=limit, filters=filters, sort=sort, cursor=cursor)  # noqa: E731
+                out.append({"bench": "query", "case": f"{name} page={page} cursor",
+                            "params": {"filters": filters, "sort": sort, "limit": limit},
+                            "metrics": latency_metrics(_time(run, args.repeat))})
+        db.rollback()
+    return out
+
+
+def api_mix(rng, rows):
+    r = rng.random()
+    if r < 0.4:
+        return "/listings", {"limit": 20, "min_price": rng.randrange(100_000, 2_000_000), "sort": "price"}
+    if r < 0.6:
+        return "/listings", {"limit": 20, "location": rng.choice(["cebu", "makati", "baguio"]), "sort": "-year"}
+    if r < 0.7:
+        return "/listings", {"limit": 20, "q": rng.choice(["vios", "ranger 2018", "civic"])}
+    return f"/listings/{TABLE_PREFIX}{1 + rng.randrange(rows)}", None
+
+
+@contextmanager
+def api_server(port, db_async=False):
+    env = dict(os.environ, DB_ASYNC="1" if db_async else "0", CACHE_TTL_SECONDS="0")
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                             "--log-level", "warning"], env=env, cwd=ROOT)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(200):
+            try:
+                if httpx.get(base + "/health").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        else:
+            raise RuntimeError("API server did not start")
+        yield base
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def bench_api(args):
+    out = []
+    for mode in args.api_modes.split(","):
+        with api_server(args.port, db_async=mode == "async") as base:
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                latencies, errors = asyncio.run(drive(base, concurrency, args.duration, args.rows, mix=api_mix))
+                metrics = latency_metrics(latencies)
+                metrics.update(p99_ms=round(pct(sorted(latencies), .99), 3),
+                               req_per_sec=round(len(latencies) / args.duration, 1), errors=errors)
+                out.append({"bench": "api", "case": f"{mode} c={concurrency}",
+                            "params": {"concurrency": concurrency, "duration": args.duration},
+                            "metrics": metrics})
+    return out
+
+
+# the first pages only: deep offsets would measure the OFFSET scan, not the page
+PAGE_SKIPS = [i * PAGE_LIMIT for i in range(10)]
+
+
+def page_mix(rng, rows):
+    return "/listings", {"limit": PAGE_LIMIT, "skip": rng.choice(PAGE_SKIPS)}
+
+
+def bench_page(args):
+    adapter = TypeAdapter(List[schemas.ListingOut])
+    rng = random.Random(0)
+    skips = [rng.choice(PAGE_SKIPS) for _ in range(args.repeat)]
+
+    def entities(db, skip):
+        items = crud.list_listings(db, skip=skip, limit=PAGE_LIMIT)["items"]
+        return adapter.dump_json(adapter.validate_python(items, from_attributes=True))
+
+    def projected(db, skip):
+        items = crud.list_listings(db, skip=skip, limit=PAGE_LIMIT, columns=serialize.LISTING_FIELDS)["items"]
+        return serialize.dumps(serialize.listing_dicts(items, serialize.LISTING_FIELDS))
+
+    out = []
+    with SessionLocal() as db:
+        for name, build in (("entities+pydantic", entities), ("columns+encoder", projected)):
+            build(db, 0)
+            samples = []
+            for skip in skips:
+                t0 = time.perf_counter()
+                build(db, skip)
+                samples.append(time.perf_counter() - t0)
+                db.expunge_all()
+            metrics = latency_metrics(samples)
+            metrics["pages_per_sec"] = round(len(samples) / sum(samples), 1)
+            out.append({"bench": "page", "case": f"limit={PAGE_LIMIT} {name}",
+                        "params": {"limit": PAGE_LIMIT}, "metrics": metrics})
+        db.rollback()
+    with api_server(args.port) as base:
+        concurrency = max(int(c) for c in args.concurrency.split(","))
+        latencies, errors = asyncio.run(drive(base, concurrency, args.duration, args.rows, mix=page_mix))
+        metrics = latency_metrics(latencies)
+        metrics.update(req_per_sec=round(len(latencies) / args.duration, 1), errors=errors)
+        out.append({"bench": "page", "case": f"limit={PAGE_LIMIT} http c={concurrency}",
+                    "params": {"limit": PAGE_LIMIT, "concurrency": concurrency, "duration": args.duration},
+                    "metrics": metrics})
+    return out
+
+
+def bench_scrape(args):
+    # archive into a scratch directory; parse workers are spawned and read it from the environment
+    os.environ["HTML_ARCHIVE_DIR"] = tempfile.mkdtemp(prefix="bench-archive-")
+    from app import scrape, fetcher, harvest, archive
+    archive.HTML_ARCHIVE_DIR = os.environ["HTML_ARCHIVE_DIR"]
+    # measure the pipeline, not the politeness delays meant for a real site
+    fetcher.SCRAPE_HOST_DELAY = 0
+    fetcher.SCRAPE_SETTLE_SECONDS = 0
+    fetcher.SCRAPE_PER_HOST = args.scrape_concurrency
+    harvest.SCRAPE_SCROLL_TIMEOUT = 1
+    scrape.SCRAPE_MAX_ITEMS = args.scrape_pages
+    synth.delete_rows(engine, synth.PAGE_PREFIX)
+    with synth.FixtureServer(args.scrape_pages, args.noise) as site:
+        scrape.TARGET_URL = site.base_url + "/marketplace"
+        try:
+            stats = asyncio.run(scrape.scrape_marketplace_async(concurrency=args.scrape_concurrency))
+        except Exception as e:
+            if "Executable doesn't exist" in str(e) or "playwright install" in str(e):
+                return [{"bench": "scrape", "case": "cold browser", "skipped": "Chromium is not installed"}]
+            raise
+    synth.delete_rows(engine, synth.PAGE_PREFIX)
+    timings = stats["timings"]
+    metrics = {"pages_per_sec": round(stats["fetched"] / timings["total"], 2), "failed": stats["failed"],
+               "ingested": stats["ingested"]}
+    metrics.update({f"{k}_s": round(v, 3) for k, v in timings.items() if v is not None})
+    return [{"bench": "scrape", "case": "cold browser",
+             "params": {"pages": args.scrape_pages, "concurrency": args.scrape_concurrency},
+             "metrics": metrics}]
+
+
+def environment(args):
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except Exception:
+            return None
+    with engine.connect() as conn:
+        pg = conn.exec_driver_sql("SHOW server_version").scalar()
+        rows = conn.exec_driver_sql("SELECT count(*) FROM listings").scalar()
+    return {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "postgres": pg, "listings_rows": rows, "args": vars(args)}
+
+
+def compare(results, path):
+    with open(path, encoding="utf-8") as fh:
+        old = {(r["bench"], r["case"]): r for r in json.load(fh)["results"]}
+    print(f"\n{'bench':8} {'case':45} {'metric':14} {'before':>10} {'after':>10} {'change':>8}")
+    for r in results:
+        prev = old.get((r["bench"], r["case"]))
+        if not prev or "metrics" not in r or "metrics" not in prev:
+            continue
+        for metric, value in r["metrics"].items():
+            before = prev["metrics"].get(metric)
+            if not isinstance(before, (int, float)) or metric == "samples":
+                continue
+            change = f"{(value - before) / before * 100:+.1f}%" if before else ""
+            print(f"{r['bench']:8} {r['case'][:45]:45} {metric:14} {before:10.2f} {value:10.2f} {change:>8}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--parts", default=",".join(ALL_PARTS))
+    ap.add_argument("--rows", type=int, default=200_000, help="synthetic listings for the query, api and page parts")
+    ap.add_argument("--pages", type=int, default=300, help="pages for the extract part")
+    ap.add_argument("--noise", type=int, default=120, help="layout/script blocks per synthetic page")
+    ap.add_argument("--upsert-rows", type=int, default=4000)
+    ap.add_argument("--repeat", type=int, default=20, help="timed repetitions per query case")
+    ap.add_argument("--concurrency", default="1,16,64", help="client counts for the api part")
+    ap.add_argument("--duration", type=float, default=10, help="seconds per api concurrency level")
+    ap.add_argument("--api-modes", default="sync", help="sync and/or async (DB_ASYNC=1)")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--scrape-pages", type=int, default=100)
+    ap.add_argument("--scrape-concurrency", type=int, default=8)
+    ap.add_argument("--out", help="results file (default bench/results/<timestamp>-<commit>.json)")
+    ap.add_argument("--compare", help="earlier results file to print changes against")
+    ap.add_argument("--cleanup", action="store_true", help="delete all synthetic rows and exit")
+    args = ap.parse_args()
+    if args.cleanup:
+        n = sum(synth.delete_rows(engine, p) for p in (TABLE_PREFIX, UPSERT_PREFIX, synth.PAGE_PREFIX))
+        print(f"deleted {n} synthetic rows")
+        return
+    parts = [p for p in args.parts.split(",") if p]
+    unknown = set(parts) - set(ALL_PARTS)
+    if unknown:
+        ap.error(f"unknown parts: {', '.join(sorted(unknown))}")
+    if {"query", "api", "page"} & set(parts):
+        print(f"ensuring {args.rows} synthetic rows ...", flush=True)
+        synth.fill_table(engine, args.rows, TABLE_PREFIX)
+    env = environment(args)
+    results = []
+    for part in parts:
+        print(f"running {part} ...", flush=True)
+        for r in globals()[f"bench_{part}"](args):
+            results.append(r)
+            print(f"  {r['case']:45} " + (f"skipped: {r['skipped']}" if "skipped" in r else
+                                          "  ".join(f"{k}={v}" for k, v in r["metrics"].items())), flush=True)
+    path = args.out or os.path.join(RESULTS_DIR, f"{env['timestamp'].replace(':', '')[:17]}-{env['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({"environment": env, "results": results}, fh, indent=1)
+    print(f"results written to {path}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# bench/synth.py
+"""Deterministic synthetic data for the benchmarks.
+
+`listing_page` renders a marketplace-like detail page (title, price,
+mileage and location buried in script, style and layout noise), `fill_table`
+bulk-inserts synthetic rows into `listings` with one INSERT ... SELECT, and
+`FixtureServer` serves an index plus detail pages over local HTTP.
+"""
+import os
+import sys
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+MAKES = ["Toyota Vios", "Toyota Fortuner", "Honda City", "Honda Civic", "Mitsubishi Montero",
+         "Mitsubishi Mirage", "Nissan Navara", "Ford Ranger", "Hyundai Accent", "Suzuki Ertiga",
+         "Isuzu D-Max", "Kia Picanto", "Mazda 3"]
+LOCATIONS = ["Makati, Metro Manila", "Quezon City, Metro Manila", "Las Piñas, Metro Manila",
+             "Pasig, Metro Manila", "Cebu City, Cebu", "Lapu-Lapu, Cebu", "Davao City, Davao del Sur",
+             "Baguio, Benguet", "Iloilo City, Iloilo", "Bacolod, Negros Occidental", "Antipolo, Rizal",
+             "Calamba, Laguna", "Angeles, Pampanga", "General Santos, South Cotabato"]
+_PRICE_FORMATS = ["₱{:,}", "PHP {:,}", "PHP{:,}", "₱ {:,}"]
+_MILEAGE_FORMATS = ["Driven {:,} km", "{:,} kilometers", "Mileage: {} kms"]
+
+
+def _noise(rng, n):
+    """Layout and script noise similar in shape to a real marketplace page."""
+    parts = []
+    for k in range(n):
+        r = rng.random()
+        if r < 0.4:
+            parts.append("<div class=\"x%d\">%s</div>" % (k, "".join(
+                f'<div class="c{rng.randrange(999)}"><span>{rng.choice(MAKES)} accessory {k}</span></div>'
+                for _ in range(8))))
+        elif r < 0.7:
+            parts.append("<script>window.__d%d = %s;</script>" % (k, [rng.randrange(10**6) for _ in range(40)]))
+        elif r < 0.85:
+            parts.append("<style>.s%d { margin: %dpx; color: #%06x }</style>" % (k, rng.randrange(20), rng.randrange(1 << 24)))
+        else:
+            parts.append("<ul>%s</ul>" % "".join(f"<li>Suggested listing {rng.randrange(10**5)}</li>" for _ in range(10)))
+    return "\n".join(parts)
+
+
+def listing_page(i: int, noise: int = 40) -> str:
+    """Detail page for listing `i`; the same `i` always gives the same page."""
+    rng = random.Random(i)
+    year = 2005 + i % 19
+    title = f"{year} {MAKES[i % len(MAKES)]} {rng.choice(['AT', 'MT', 'CVT'])}"
+    price = rng.choice(_PRICE_FORMATS).format(100_000 + (i * 7919) % 2_900_000)
+    mileage = rng.choice(_MILEAGE_FORMATS).format((i * 104729) % 200_000)
+    location = LOCATIONS[(i // 7) % len(LOCATIONS)]
+    return f"""<!DOCTYPE html>
+<html><head>
+<meta property="og:title" content=" {title} ">
+<title>Marketplace - {title}</title>
+{_noise(rng, noise // 4)}
+</head><body>
+<div role="banner">Marketplace</div>
+{_noise(rng, noise // 2)}
+<div role="main"><h1><span>{title}</span></h1>
+<div><span>{price}</span></div>
+<div><ul><li>{mileage}</li><li>{rng.choice(['Automatic', 'Manual'])} transmission</li></ul></div>
+<span data-testid="marketplace_pdp_location">{location}</span>
+<p>Seller's description: casa maintained, {rng.choice(['first owner', 'fresh', 'rush sale'])}.</p></div>
+{_noise(rng, noise - noise // 4 - noise // 2)}
+</body></html>"""
+
+
+# listing ids of fixture pages, so their rows can be told apart and deleted
+PAGE_PREFIX = "synthpage-"
+
+
+def item_url(base: str, i: int) -> str:
+    return f"{base}/marketplace/item/{PAGE_PREFIX}{i}/"
+
+
+def fill_table(engine, rows: int, prefix: str = "synth-"):
+    """Ensure `rows` synthetic listings with ids `<prefix>1..rows` exist; returns seconds taken."""
+    from app import crud
+    from app.models import ensure_schema
+    ensure_schema(engine)
+    norms = [crud.normalize_location(loc) for loc in LOCATIONS]
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO listings (listing_id, title, price, currency, year, mileage, location, location_norm, url)
+            SELECT :prefix || g,
+                   (:makes)[1 + g % cardinality(:makes)] || ' ' || (2005 + g % 19) || ' AT',
+                   100000 + (g * 7919) % 2900000, 'PHP', 2005 + g % 19, (g * 104729) % 200000,
+                   (:locs)[1 + (g / 7) % cardinality(:locs)], (:norms)[1 + (g / 7) % cardinality(:locs)],
+                   'https://example.invalid/item/' || g
+            FROM generate_series(1::bigint, :rows) AS g
+            ON CONFLICT (listing_id) DO NOTHING
+        """), {"prefix": prefix, "makes": MAKES, "locs": LOCATIONS, "norms": norms, "rows": rows})
+        conn.execute(text("ANALYZE listings"))
+    return time.perf_counter() - t0
+
+
+def delete_rows(engine, prefix: str) -> int:
+    with engine.begin() as conn:
+        return conn.execute(text("DELETE FROM listings WHERE listing_id LIKE :p"), {"p": prefix + "%"}).rowcount
+
+
+class FixtureServer:
+    """Serve `/marketplace` (links to `n` items) and their `item_url` detail pages,
+    each after `delay` seconds of simulated network latency."""
+
+    def __init__(self, n: int, noise: int = 40, delay: float = 0.0):
+        self.n = n
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if delay:
+                    time.sleep(delay)
+                path = self.path.split("?")[0]
+                if path.startswith("/marketplace/item/"):
+                    body = listing_page(int(path.split("/")[3][len(PAGE_PREFIX):]), noise)
+                elif path.startswith("/marketplace"):
+                    body = "<html><body>%s</body></html>" % "".join(
+                        f'<a href="{item_url("", i)}">item {i}</a>' for i in range(server.n))
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -22,20 +22,28 @@ def try_save_with_crud(items):
     """Try to save items using functions in app.crud if available."""
     try:
         import app.crud as crud
+        from app.db import SessionLocal
     except Exception:
         return False
 
-    # Look for common upsert functions
+    # Look for common upsert functions; app.crud helpers take the session first
     for name in ("upsert_listings", "upsert_many", "upsert_listing", "bulk_upsert", "save_items"):
         fn = getattr(crud, name, None)
         if fn and callable(fn):
+            session = SessionLocal()
             try:
-                fn(items)
+                if name == "upsert_listing":
+                    for it in items:
+                        fn(session, it)
+                else:
+                    fn(session, items)
                 print(f"Saved {len(items)} items using app.crud.{name}()")
                 return True
             except Exception as e:
                 print(f"app.crud.{name}() failed: {e}")
                 return False
+            finally:
+                session.close()
     return False
 
 
@@ -83,6 +91,11 @@ if __name__ == "__main__":
         print("Scraper returned None — it may have saved results to DB already.")
         raise SystemExit(0)
 
+    if isinstance(result, dict) and "listing_id" not in result:
+        # run summary: the scraper already saved listings to the DB itself
+        print("Scrape summary: " + ", ".join(f"{k}={v}" for k, v in result.items()))
+        raise SystemExit(0)
+
     if not isinstance(result, (list, tuple)):
         items = [result]
     else:
@@ -0,0 +1,151 @@
+# tests/fixture_site.py
+"""Local HTTP server serving marketplace-like fixture pages for scraper tests."""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAKES = ["Toyota Vios", "Honda City", "Mitsubishi Xpander", "Ford Ranger", "Suzuki Jimny"]
+LOCATIONS = ["Quezon City, Metro Manila", "Makati", "Cebu City", "Davao City"]
+
+
+def listing_html(i: int) -> str:
+    year = 2005 + i % 20
+    title = f"{year} {MAKES[i % len(MAKES)]}"
+    price = f"{350000 + i * 1250:,}"
+    mileage = f"{10000 + i * 731:,}"
+    return f"""<!DOCTYPE html>
+<html><head>
+<meta property="og:title" content=" {title} ">
+<title>Marketplace - {title}</title>
+<style>.price {{ color: red }}</style>
+<script>window.__listing = {{id: {i}}};</script>
+</head><body>
+<!-- listing {i} -->
+<div class="header">Marketplace</div>
+<h1>{title}</h1>
+<div class="price">PHP {price}</div>
+<ul><li>Driven {mileage} km</li><li>Automatic transmission</li></ul>
+<span data-testid="marketplace_pdp_location">{LOCATIONS[i % len(LOCATIONS)]}</span>
+<p>Seller notes: well kept &amp; casa maintained.</p>
+</body></html>"""
+
+
+# heavy assets referenced by listing pages when FixtureSite(heavy=True)
+ASSETS = {
+    "/static/car.jpg": (b"\xff\xd8" + b"\0" * 300_000, "image/jpeg"),
+    "/static/font.woff2": (b"\0" * 120_000, "font/woff2"),
+    "/static/clip.mp4": (b"\0" * 500_000, "video/mp4"),
+    "/static/tracker.js": (b"/*" + b" " * 50_000 + b"*/", "application/javascript"),
+    # needed by the page: fills in the seller badge the tests look for
+    "/static/app.js": (b"document.getElementById('badge').textContent = 'Verified seller';", "application/javascript"),
+}
+HEAVY_TAGS = """<style>@font-face { font-family: f; src: url(/static/font.woff2); } body { font-family: f }</style>
+<img src="/static/car.jpg?{i}"><video src="/static/clip.mp4?{i}" preload="auto" autoplay muted></video>
+<span id="badge"></span><script src="/static/tracker.js?{i}"></script><script src="/static/app.js"></script>
+"""
+
+
+def index_html(n: int) -> str:
+    links = "\n".join(f'<a href="/marketplace/item/{1000 + i}/?ref=feed">item {i}</a>' for i in range(n))
+    return f"<html><body><h1>Cars</h1>{links}</body></html>"
+
+
+def feed_html(n: int, page_size: int = 8, delay_ms: int = 300) -> str:
+    """Infinite-scroll index: more item links are appended after each scroll to the bottom."""
+    return f"""<html><body style="margin:0"><div id="feed"></div><script>
+let shown = 0, loading = false;
+function more() {{
+  const feed = document.getElementById('feed');
+  for (let k = 0; k < {page_size} && shown < {n}; k++, shown++) {{
+    const card = document.createElement('div');
+    card.style.height = '200px';
+    card.innerHTML = '<a href="/marketplace/item/' + (1000 + shown) + '/?ref=feed">item ' + shown + '</a>';
+    feed.appendChild(card);
+  }}
+  loading = false;
+}}
+more();
+window.addEventListener('scroll', () => {{
+  if (loading || shown >= {n}) return;
+  if (window.innerHeight + window.scrollY >= document.body.scrollHeight - 10) {{
+    loading = true;
+    setTimeout(more, {delay_ms});
+  }}
+}});
+</script></body></html>"""
+
+
+class FixtureSite:
+    """Serve `n` listing pages; records the peak number of concurrent requests."""
+
+    def __init__(self, n: int = 20, delay: float = 0.0, heavy: bool = False):
+        self.n = n
+        self.delay = delay
+        self.heavy = heavy
+        self.bytes_served = {}
+        self.in_flight = 0
+        self.peak = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with site._lock:
+                    site.in_flight += 1
+                    site.hits += 1
+                    site.peak = max(site.peak, site.in_flight)
+                try:
+                    if site.delay:
+                        time.sleep(site.delay)
+                    body, status, ctype = site.route(self.path)
+                    data = body.encode("utf-8") if isinstance(body, str) else body
+                    self.send_response(status)
+                    self.send_header("Content-Type", ctype)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    path = self.path.split("?")[0]
+                    with site._lock:
+                        site.bytes_served[path] = site.bytes_served.get(path, 0) + len(data)
+                finally:
+                    with site._lock:
+                        site.in_flight -= 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def route(self, path):
+        html = "text/html; charset=utf-8"
+        if path.startswith("/marketplace/item/"):
+            i = int(path.split("/")[3]) - 1000
+            page = listing_html(i)
+            if self.heavy:
+                page = page.replace("</body>", HEAVY_TAGS.replace("{i}", str(i)) + "</body>")
+            return page, 200, html
+        if path.startswith("/marketplace/feed"):
+            return feed_html(self.n), 200, html
+        if path.startswith("/marketplace"):
+            return index_html(self.n), 200, html
+        asset = ASSETS.get(path.split("?")[0])
+        if asset:
+            return asset[0], 200, asset[1]
+        return "not found", 404, html
+
+    def asset_bytes(self):
+        return sum(n for p, n in self.bytes_served.items() if p.startswith("/static/"))
+
+    def item_urls(self):
+        return [f"{self.base_url}/marketplace/item/{1000 + i}/" for i in range(self.n)]
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,55 @@
+# tests/test_archive.py
+import os
+import sys
+import uuid
+import subprocess
+import pytest
+from fixture_site import listing_html
+from app import archive, crud, models, reextract
+from app.db import engine, SessionLocal
+
+URL = "https://www.facebook.com/marketplace/item/{}/"
+
+def test_store_is_content_addressed(tmp_path):
+    html = listing_html(1)
+    digest = archive.store(html, str(tmp_path))
+    assert archive.store(html, str(tmp_path)) == digest
+    files = [f for _, _, fs in os.walk(tmp_path) for f in fs]
+    assert files == [digest + ".html.gz"]
+    assert archive.load(digest, str(tmp_path)) == html
+
+def test_reextract_updates_parsed_fields(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "HTML_ARCHIVE_DIR", str(tmp_path))
+    models.ensure_schema(engine)
+    db = SessionLocal()
+    try:
+        # unique ids, and re-extraction scoped to them, keep other rows in the database out of the counts
+        tag = uuid.uuid4().hex[:8]
+        payloads = [archive.extract_and_archive(listing_html(i), URL.format(f"arch{tag}{i}")) for i in range(3)]
+        ids = [p["listing_id"] for p in payloads]
+        assert set(payloads[0]["raw_json"]) == {"html_sha256"}
+        # simulate an older extractor that got the fields wrong
+        for p in payloads:
+            p.update(title="stale", price=None, location=None)
+        crud.upsert_listings(db, payloads)
+        os.remove(archive._path(payloads[2]["raw_json"]["html_sha256"]))
+        stats = reextract.reextract_listings(db, workers=0, batch_size=2, listing_ids=ids)
+        assert stats == {"missing": 1, "updated": 2}
+        fixed = crud.get_listing(db, ids[1])
+        db.refresh(fixed)
+        expected = archive.extract_listing(listing_html(1), URL.format(f"arch{tag}1"))
+        assert (fixed.title, float(fixed.price), fixed.location) == (expected["title"], expected["price"], expected["location"])
+        assert fixed.location_norm == crud.normalize_location(expected["location"])
+        assert crud.get_listing(db, ids[2]).title == "stale"
+        for listing_id in ids:
+            crud.delete_listing(db, listing_id)
+    finally:
+        db.close()
+
+def test_archive_import_leaves_database_unloaded():
+    # parse workers import app.archive; they need neither SQLAlchemy nor POSTGRES_URL
+    code = "import sys, app.archive; print(sorted(m for m in ('sqlalchemy', 'app.db') if m in sys.modules))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {k: v for k, v in os.environ.items() if k != "POSTGRES_URL"}
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,128 @@
+# tests/test_browser.py
+import json
+from app import browser
+from app.browser import BrowserManager
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+
+    async def close(self):
+        if self in self.context.pages:
+            self.context.pages.remove(self)
+
+
+class FakeContext:
+    def __init__(self, storage_state=None):
+        self.storage_state_in = storage_state
+        self.pages = []
+        self.closed = False
+
+    async def new_page(self):
+        page = FakePage(self)
+        self.pages.append(page)
+        return page
+
+    async def add_cookies(self, cookies):
+        pass
+
+    async def storage_state(self, path):
+        with open(path, "w") as fh:
+            json.dump({"cookies": [], "origins": []}, fh)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, storage_state=None):
+        ctx = FakeContext(storage_state)
+        self.contexts.append(ctx)
+        return ctx
+
+    async def close(self):
+        self.connected = False
+
+
+class FakePlaywright:
+    launched = []
+
+    def start(self):
+        return self._start()
+
+    async def _start(self):
+        return self
+
+    @property
+    def chromium(self):
+        return self
+
+    async def launch(self, headless=True):
+        b = FakeBrowser()
+        FakePlaywright.launched.append(b)
+        return b
+
+    async def stop(self):
+        pass
+
+
+def _manager(monkeypatch, tmp_path, **kwargs):
+    FakePlaywright.launched = []
+    monkeypatch.setattr(browser, "async_playwright", FakePlaywright)
+    monkeypatch.setattr(browser, "browser_rss_mb", lambda: None)
+    return BrowserManager(storage_state=str(tmp_path / "state.json"), **kwargs)
+
+
+async def _one_run(manager):
+    context, info = await manager.acquire()
+    await context.new_page()  # left open by the run
+    await manager.release(context)
+    return context, info
+
+
+def test_browser_is_reused_and_state_saved(monkeypatch, tmp_path):
+    manager = _manager(monkeypatch, tmp_path, max_runs=5)
+    try:
+        first, cold = manager.run(_one_run, manager)
+        second, warm = manager.run(_one_run, manager)
+    finally:
+        manager.shutdown()
+    assert not cold["warm"] and warm["warm"]
+    assert second is first and first.pages == []
+    assert len(FakePlaywright.launched) == 1 and warm["run_on_browser"] == 2
+    assert warm["startup_saved_seconds"] >= 0
+    assert (tmp_path / "state.json").exists()
+
+
+def test_recycles_after_max_runs_and_disconnect(monkeypatch, tmp_path):
+    manager = _manager(monkeypatch, tmp_path, max_runs=2)
+    try:
+        infos = [manager.run(_one_run, manager)[1] for _ in range(3)]
+        FakePlaywright.launched[-1].connected = False
+        context, crashed = manager.run(_one_run, manager)
+    finally:
+        manager.shutdown()
+    assert [i["recycled"] for i in infos] == [None, None, "max_runs"]
+    assert crashed["recycled"] == "disconnected" and not crashed["warm"]
+    assert len(FakePlaywright.launched) == 3
+    # contexts after the first are created from the saved session
+    assert context.storage_state_in == str(tmp_path / "state.json")
+
+
+def test_memory_limit_without_psutil_is_reported(monkeypatch, tmp_path, caplog):
+    monkeypatch.setattr(browser, "psutil", None)
+    manager = _manager(monkeypatch, tmp_path, max_rss_mb=500)
+    try:
+        manager.run(_one_run, manager)
+        manager.run(_one_run, manager)
+    finally:
+        manager.shutdown()
+    assert sum("psutil is not installed" in r.getMessage() for r in caplog.records) == 1
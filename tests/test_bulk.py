@@ -0,0 +1,39 @@
+# tests/test_bulk.py
+import json
+import pytest
+from app import crud, models
+from app.db import engine, SessionLocal
+from app.services import BulkLoader
+
+@pytest.fixture(scope="module")
+def db():
+    models.ensure_schema(engine)
+    session = SessionLocal()
+    yield session
+    session.close()
+
+def test_bulk_loader_reports_bad_lines_and_keeps_going(db):
+    lines = [
+        json.dumps({"listing_id": "bulkload1", "title": "Car 1", "price": "1500"}),
+        "",
+        "{not json",
+        json.dumps({"title": "no id"}),
+        json.dumps(["not", "an", "object"]),
+        json.dumps({"listing_id": "bulkload2", "title": "bad\u0000title"}).encode(),
+        json.dumps({"listing_id": "bulkload3", "year": 2019, "extra": "ignored"}).encode(),
+        b"\xff\xfe",
+    ]
+    report = BulkLoader(db, batch_size=2).load(lines)
+    assert report["lines"] == 7
+    assert report["ingested"] == 2
+    assert report["failed"] == 5
+    assert [e["line"] for e in report["errors"]] == [3, 4, 5, 6, 8]
+    assert "listing_id" in report["errors"][1]["error"]
+    assert report["errors"][3]["listing_id"] == "bulkload2"
+    assert float(crud.get_listing(db, "bulkload1").price) == 1500
+    assert crud.get_listing(db, "bulkload3").year == 2019
+    assert crud.get_listing(db, "bulkload2") is None
+
+def test_bulk_loader_caps_kept_errors(db):
+    report = BulkLoader(db, max_errors=2).load(["x"] * 5)
+    assert report["failed"] == 5 and len(report["errors"]) == 2
@@ -0,0 +1,33 @@
+# tests/test_cache.py
+import time
+from app.cache import ResponseCache, etag_matches
+
+def test_hit_miss_and_ttl():
+    c = ResponseCache(max_entries=4, ttl=0.05)
+    assert c.get("k") is None
+    etag = c.put("k", b"[]", {"X-Next-Cursor": "abc"}, c.generation)
+    assert c.get("k") == (etag, b"[]", {"X-Next-Cursor": "abc"})
+    time.sleep(0.06)
+    assert c.get("k") is None
+    assert c.stats()["hits"] == 1 and c.stats()["misses"] == 2
+
+def test_lru_eviction_and_invalidation():
+    c = ResponseCache(max_entries=2, ttl=60)
+    for k in ("a", "b"):
+        c.put(k, k.encode(), {}, c.generation)
+    c.get("a")
+    c.put("c", b"c", {}, c.generation)
+    assert c.get("b") is None and c.get("a") is not None
+    # a response built before a write must not be stored
+    stale_gen = c.generation
+    c.invalidate()
+    c.put("d", b"d", {}, stale_gen)
+    assert c.get("a") is None and c.get("d") is None
+    assert c.stats()["evictions"] == 1
+
+def test_etag_matching():
+    assert etag_matches('"x"', '"x"')
+    assert etag_matches('W/"x", "y"', '"x"')
+    assert etag_matches("*", '"x"')
+    assert not etag_matches(None, '"x"')
+    assert not etag_matches('"y"', '"x"')
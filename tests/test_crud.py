@@ -1,4 +1,6 @@
 # tests/test_crud.py
+import uuid
+import asyncio
 import pytest
 from app import crud, models
 from app.db import Base, engine, SessionLocal
@@ -8,7 +10,7 @@ def db():
     # use a test DB or the same DB with a test schema
     conn = engine.connect()
     trans = conn.begin()
-    Base.metadata.create_all(bind=engine)
+    models.ensure_schema(engine)
     session = SessionLocal()
     yield session
     session.close()
@@ -21,3 +23,118 @@ def test_upsert_and_get(db):
     obj = crud.get_listing(db, "test123")
     assert obj is not None
     assert obj.title == "Test Car"
+
+def test_upsert_listings_batches_and_dedupes(db):
+    rows = [{"listing_id": f"bulk{i}", "title": f"Car {i}", "price": 100 + i, "url": "http://x"} for i in range(5)]
+    rows.append({"listing_id": "bulk0", "title": "Car 0 updated", "price": 99, "url": "http://x"})
+    assert crud.upsert_listings(db, rows, batch_size=2) == 5
+    first = crud.get_listing(db, "bulk0")
+    assert first.title == "Car 0 updated"
+    assert float(first.price) == 99
+    seen = first.last_seen_at
+    crud.upsert_listings(db, [{"listing_id": "bulk0", "title": "Car 0 again"}])
+    db.refresh(first)
+    assert first.title == "Car 0 again"
+    assert first.price is None
+    assert first.last_seen_at >= seen
+
+def test_freshness_and_touch(db):
+    crud.upsert_listings(db, [{"listing_id": "fresh1"}, {"listing_id": "fresh2"}])
+    assert crud.get_freshness(db, ["fresh1", "fresh2", "missing"], 3600) == {"fresh1": True, "fresh2": True}
+    assert crud.get_freshness(db, ["fresh1"], 0) == {"fresh1": False}
+    assert crud.touch_listings(db, ["fresh1", "missing"]) == 1
+
+def test_unchanged_upsert_only_touches_and_history_on_change(db):
+    lid = f"hist-{uuid.uuid4().hex[:8]}"
+    row = {"listing_id": lid, "title": "Hist car", "price": 500, "mileage": 1000, "url": "http://x"}
+    crud.upsert_listings(db, [row])
+    obj = crud.get_listing(db, lid)
+    updated, seen = obj.updated_at, obj.last_seen_at
+    crud.upsert_listings(db, [dict(row, price=500.0, raw_json={"html_sha256": "abc"})])
+    db.refresh(obj)
+    assert obj.updated_at == updated and obj.last_seen_at > seen and obj.raw_json is None
+    crud.upsert_listing(db, dict(row, title="Hist car v2"))
+    db.refresh(obj)
+    assert obj.title == "Hist car v2" and obj.updated_at > updated
+    crud.upsert_listing(db, dict(row, title="Hist car v2", price=450))
+    assert [(float(h.price), h.mileage) for h in crud.get_price_history(db, lid)] == [(450, 1000), (500, 1000)]
+    assert crud.get_price_history(db, "hist-missing") is None
+
+@pytest.mark.parametrize("sort", ["id", "-id", "price", "-price", "year", "-year"])
+def test_keyset_pagination_matches_offset(db, sort):
+    rows = [{"listing_id": f"keyset{i}", "location": "keyset-suite", "url": "http://x",
+             "price": None if i % 4 == 0 else 1000 + (i % 5) * 10, "year": None if i % 3 == 0 else 2000 + i % 2}
+            for i in range(23)]
+    crud.upsert_listings(db, rows)
+    filters = {"location": "keyset-suite"}
+    everything = crud.list_listings(db, limit=100, filters=filters, sort=sort, count="exact")
+    assert everything["total"] == 23 and everything["next_cursor"] is None
+    expected = [o.listing_id for o in everything["items"]]
+
+    seen, cursor = [], None
+    while True:
+        page = crud.list_listings(db, limit=4, filters=filters, sort=sort, cursor=cursor)
+        seen += [o.listing_id for o in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == expected
+
+    offset_page = crud.list_listings(db, skip=8, limit=4, filters=filters, sort=sort)
+    assert [o.listing_id for o in offset_page["items"]] == expected[8:12]
+    assert crud.list_listings(db, limit=1, filters=filters, count="estimate")["total"] >= 1
+
+
+def test_async_estimate_with_filters():
+    # DB_ASYNC=1 reaches estimate_count through run_sync on asyncpg, which binds $1, $2, ... by position
+    pytest.importorskip("asyncpg")
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.db import DATABASE_URL, _async_url
+
+    async def run():
+        async_engine = create_async_engine(_async_url(DATABASE_URL))
+        try:
+            async with async_sessionmaker(async_engine)() as session:
+                filters = {"min_price": 1, "max_year": 3000, "q": "car"}
+                res = await crud.async_list_listings(session, limit=1, filters=filters, count="estimate")
+                return res["total"]
+        finally:
+            await async_engine.dispose()
+
+    assert asyncio.run(run()) >= 0
+
+
+def test_cursor_rejects_other_sort(db):
+    page = crud.list_listings(db, limit=1, sort="price")
+    with pytest.raises(ValueError):
+        crud.list_listings(db, limit=1, sort="year", cursor=page["next_cursor"])
+
+
+def test_normalize_location():
+    assert crud.normalize_location("  Las Piñas,  Metro-Manila ") == "las pinas metro manila"
+    assert crud.normalize_location("!!") is None
+    assert crud.normalize_location(None) is None
+
+
+def test_location_filter_and_ranked_search(db):
+    # made-up words keep other rows in the database out of the results
+    crud.upsert_listings(db, [
+        {"listing_id": "search1", "title": "Toyota Qorvex 1.3 XLE", "location": "Las Piñas, Metro Zantor"},
+        {"listing_id": "search2", "title": "Honda Blimfa", "location": "Qorvex Street, Zantor Uplands"},
+        {"listing_id": "search3", "title": "Mitsubishi Blimfa", "location": "Vexmoor"},
+    ])
+    assert crud.list_listings(db, limit=10, filters={"location": "zantor", "q": "vexmoor"})["items"] == []
+    by_loc = crud.list_listings(db, limit=10, filters={"location": "las pinas metro zan"})
+    assert [o.listing_id for o in by_loc["items"]] == ["search1"]
+    assert by_loc["items"][0].location_norm == "las pinas metro zantor"
+    # title matches (weight A) rank above location matches (weight B)
+    ranked = crud.list_listings(db, limit=10, filters={"q": "qorvex"})
+    assert [o.listing_id for o in ranked["items"]] == ["search1", "search2"]
+    assert ranked["next_cursor"] is None
+    by_id = crud.list_listings(db, limit=10, filters={"q": "blimfa"}, sort="-id")
+    assert [o.listing_id for o in by_id["items"]] == ["search3", "search2"]
+    with pytest.raises(ValueError):
+        crud.list_listings(db, limit=1, sort="rank")
+    crud.update_listing(db, "search3", {"location": "Glenwick"})
+    found = crud.list_listings(db, limit=10, filters={"location": "glenwick", "q": "blimfa"})
+    assert [o.listing_id for o in found["items"]] == ["search3"]
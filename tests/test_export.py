@@ -0,0 +1,38 @@
+# tests/test_export.py
+import csv
+import io
+import json
+import pytest
+from app import crud, export, models
+from app.db import engine, SessionLocal
+
+@pytest.fixture(scope="module")
+def rows():
+    models.ensure_schema(engine)
+    db = SessionLocal()
+    crud.upsert_listings(db, [
+        {"listing_id": f"export{i}", "title": f"Export, car \"{i}\"", "price": 1000 + i,
+         "location": "Brindlemoor", "raw_json": {"snippet": "<p>x</p>"}} for i in range(5)
+    ])
+    yield db
+    db.close()
+
+def test_parse_columns():
+    assert "raw_json" not in export.parse_columns(None)
+    assert export.parse_columns("price, listing_id,price") == ["price", "listing_id"]
+    with pytest.raises(ValueError):
+        export.parse_columns("listing_id,search_vector")
+
+def test_ndjson_export_in_batches(rows):
+    chunks = list(export.export_listings({"location": "brindlemoor"}, None, "ndjson", batch_size=2))
+    assert len(chunks) == 3
+    items = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert [i["listing_id"] for i in items] == [f"export{i}" for i in range(5)]
+    assert items[0]["price"] == 1000.0 and "raw_json" not in items[0]
+
+def test_csv_export_selected_columns(rows):
+    body = b"".join(export.export_listings({"location": "brindlemoor", "min_price": 1003}, ["listing_id", "title", "raw_json"], "csv"))
+    parsed = list(csv.reader(io.StringIO(body.decode())))
+    assert parsed[0] == ["listing_id", "title", "raw_json"]
+    assert parsed[1] == ["export3", 'Export, car "3"', '{"snippet": "<p>x</p>"}']
+    assert len(parsed) == 3
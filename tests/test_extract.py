@@ -0,0 +1,49 @@
+# tests/test_extract.py
+import pytest
+from fixture_site import listing_html
+from app.extract import extract_listing
+
+
+def test_extract_listing_fields():
+    url = "https://www.facebook.com/marketplace/item/1003/?ref=feed"
+    out = extract_listing(listing_html(3), url)
+    assert out["listing_id"] == "1003"
+    assert out["title"] == "2008 Ford Ranger"
+    assert out["price"] == 353750.0
+    assert out["currency"] == "PHP"
+    assert out["year"] == 2008
+    assert out["mileage"] == 12193
+    assert out["location"] == "Davao City"
+    assert out["url"] == url
+
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "<p>no head at all 2019 PHP 1,000</p>",
+    "<html><head><title>Only title 2012</title></head><body>₱ 450,000 and 120,000 kms</body></html>",
+    "<html><head><title>a<!--c-->b</title></head><body>x<!--c-->y<p>z</p>t<?pi q?>u</body></html>",
+    "<title><!--only comment--></title><body>€ 12.500,00</body>",
+    "<meta property='og:title' content='  Padded 2020  '><meta property='og:title' content='second'>",
+    "<meta name='og:title' content='wrong attr'><title>\n  Fallback 1999 \n</title>",
+    "<body><script class='location'>var x = '2001';</script><div class='car-location'>Pasig</div></body>",
+    "<body><div data-testid='marketplace_pdp_location'>Taguig <b>City</b><!-- hidden --><style>.x{}</style></div>"
+    "<span class='location'>second</span></body>",
+    "<body><template><p class='location'>Templ 1998</p></template><ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby>"
+    "<noscript>$ 9,999</noscript></body>",
+    "<body><div class='  location  '>  Cebu\n\n City </div><p>1,234 km &amp; &nbsp; 5 kilometers</p></body>",
+    "<body><table><tr><td>unclosed <b>bold <i>italic</td></tr></table>£3<br>2023<hr>99 KM</body>",
+    "<!DOCTYPE html><html><head><title>t</title></head><body><svg><title>svg title</title></svg>$12</body></html>",
+    "<html></html>$ 45 after the root <td>2019",
+]
+
+
+def test_fast_engine_matches_bs4_on_corpus():
+    pytest.importorskip("lxml")
+    from app import extract
+    url = "https://www.facebook.com/marketplace/item/42/"
+    corpus = EDGE_CASES + [listing_html(i) for i in range(40)]
+    for html in corpus:
+        fast = extract.extract_listing_fast(html, url)
+        slow = extract.extract_listing_bs4(html, url)
+        assert fast == slow, html
@@ -0,0 +1,133 @@
+# tests/test_frontier.py
+import json
+import uuid
+import asyncio
+import threading
+import pytest
+from sqlalchemy import delete, select
+from fixture_site import FixtureSite
+from app import cli, frontier, crud, models
+from app.db import SessionLocal, engine
+from app.models import FrontierEntry, ScrapeDomain
+
+@pytest.fixture
+def db():
+    models.ensure_schema(engine)
+    session = SessionLocal()
+    domains = []
+    yield session, domains
+    session.rollback()
+    session.execute(delete(FrontierEntry).where(FrontierEntry.domain.in_(domains)))
+    session.execute(delete(ScrapeDomain).where(ScrapeDomain.domain.in_(domains)))
+    session.commit()
+    session.close()
+
+def _entries(db, domain):
+    rows = db.execute(select(FrontierEntry).where(FrontierEntry.domain == domain).order_by(FrontierEntry.url))
+    return rows.scalars().all()
+
+def test_concurrent_claims_leases_and_backoff(db, monkeypatch):
+    db, domains = db
+    domain = f"frontier-{uuid.uuid4().hex[:8]}.invalid"
+    domains.append(domain)
+    urls = [f"http://{domain}/marketplace/item/{i}/?ref=feed" for i in range(8)]
+    assert frontier.enqueue(db, urls + urls[:2]) == 8
+    frontier.set_domain_interval(db, domain, 0)
+
+    claimed = []
+
+    def claim(n):
+        # a claim that finds the domain locked by another one comes back empty and tries again
+        with SessionLocal() as s:
+            while True:
+                batch = frontier.claim(s, f"w{n}", limit=3, domains=[domain])
+                if batch:
+                    claimed.append(batch)
+                elif not frontier.ready(s, [domain]):
+                    return
+
+    threads = [threading.Thread(target=claim, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ids = [e["id"] for batch in claimed for e in batch]
+    assert len(ids) == len(set(ids)) == 8
+    assert all("?" not in e["url"] for batch in claimed for e in batch)
+
+    # failures come back after their backoff, and fail for good once out of attempts
+    monkeypatch.setattr(frontier, "FRONTIER_MAX_ATTEMPTS", 2)
+    batch = next(b for b in claimed if b)
+    with SessionLocal() as s:
+        entry = s.get(FrontierEntry, batch[0]["id"])
+        frontier.fail(s, entry.lease_owner, [(batch[0], "Boom")])
+        s.commit()
+    db.expire_all()
+    failed = db.get(FrontierEntry, batch[0]["id"])
+    assert failed.status == "pending" and failed.last_error == "Boom"
+    assert (failed.not_before - failed.created_at).total_seconds() >= frontier.FRONTIER_RETRY_DELAY - 1
+    assert frontier.claim(db, "w9", domains=[domain]) == []
+    assert frontier.has_work(db, [domain])
+
+    # a lease that runs out (dead worker) is retried like a failure
+    monkeypatch.setattr(frontier, "FRONTIER_RETRY_DELAY", 0)
+    with SessionLocal() as s:
+        s.execute(FrontierEntry.__table__.update().where(FrontierEntry.domain == domain, FrontierEntry.status == "leased")
+                  .values(lease_expires_at=FrontierEntry.created_at))
+        s.commit()
+        assert frontier.reap_expired(s) == 7
+        s.commit()
+    db.expire_all()
+    statuses = {e.status for e in _entries(db, domain)}
+    assert statuses == {"pending"}
+    assert {e.last_error for e in _entries(db, domain)} == {"Boom", "lease expired"}
+    db.commit()
+    retried = frontier.claim(db, "w9", limit=1, domains=[domain])
+    assert retried[0]["attempts"] == 2
+    frontier.fail(db, "w9", [(retried[0], "Boom again")])
+    db.commit()
+    gave_up = db.get(FrontierEntry, retried[0]["id"])
+    assert gave_up.status == "failed" and gave_up.finished_at is not None
+
+def test_domain_interval_spaces_claims(db):
+    db, domains = db
+    domain = f"frontier-{uuid.uuid4().hex[:8]}.invalid"
+    domains.append(domain)
+    frontier.enqueue(db, [f"http://{domain}/item/{i}" for i in range(4)])
+    frontier.set_domain_interval(db, domain, 30)
+    first = frontier.claim(db, "a", limit=2, lease_seconds=60, domains=[domain])
+    # one url per 2 * interval fits in the lease; the domain is then busy for interval per url
+    assert len(first) == 1 and first[0]["min_interval"] == 30
+    assert frontier.claim(db, "b", limit=2, domains=[domain]) == []
+    assert frontier.has_work(db, [domain])
+
+def test_http_worker_harvests_and_ingests(db):
+    db, domains = db
+    with FixtureSite(n=5) as site:
+        domain = frontier.domain_of(site.base_url)
+        domains.append(domain)
+        target = site.base_url + "/marketplace"
+        # a link the fixture cannot serve: its failure is recorded, not retried in process
+        frontier.enqueue(db, [site.base_url + "/marketplace/item/nope/"])
+        assert frontier.enqueue_targets(db, [target]) == 1
+        frontier.set_domain_interval(db, domain, 0)
+        worker = frontier.FrontierWorker(fetch="http", batch_size=4, concurrency=2, domains=[domain])
+        stats = asyncio.run(worker.run(exit_when_idle=True))
+    assert stats["targets"] == 1 and stats["discovered"] == 5
+    assert stats["fetched"] == stats["ingested"] == 5 and stats["failed"] == 1
+    assert crud.get_listing(db, "1003").title == "2008 Ford Ranger"
+    entries = _entries(db, domain)
+    assert sum(e.status == "done" for e in entries) == 6
+    bad = next(e for e in entries if "nope" in e.url)
+    assert bad.status == "pending" and bad.attempts == 1 and bad.last_error
+    # rediscovered items are not queued again inside the revisit window
+    assert frontier.enqueue(db, [site.base_url + "/marketplace/item/1001/"]) == 0
+    assert frontier.enqueue_targets(db, [target]) == 1
+
+def test_enqueue_cli_without_targets_sets_no_interval(db, monkeypatch, capsys):
+    db, domains = db
+    domains.append("")
+    monkeypatch.setattr(frontier, "SCRAPE_TARGETS", " , ")
+    assert cli.main(["enqueue", "--interval", "5"]) == 0
+    assert json.loads(capsys.readouterr().out)["queued"] == 0
+    assert db.get(ScrapeDomain, "") is None
@@ -0,0 +1,55 @@
+# tests/test_harvest.py
+import asyncio
+import pytest
+from fixture_site import FixtureSite
+from app.harvest import harvest_item_urls
+
+
+class FakePage:
+    """Replays scripted scroll rounds; None simulates a navigation."""
+
+    def __init__(self, rounds):
+        self.rounds = list(rounds)
+        self.installs = 0
+        self.calls = 0
+
+    async def evaluate(self, script, arg=None):
+        self.calls += 1
+        if isinstance(arg, str):
+            self.installs += 1
+            return None
+        return self.rounds.pop(0) if self.rounds else []
+
+
+def test_harvest_stops_at_first_empty_round():
+    page = FakePage([["a", "b"], ["b", "c"], None, ["d"], [], ["never"]])
+    urls = asyncio.run(harvest_item_urls(page, max_items=100))
+    assert urls == ["a", "b", "c", "d"]
+    assert page.installs == 2
+    assert page.rounds == [["never"]]
+
+
+def test_harvest_respects_caps():
+    assert asyncio.run(harvest_item_urls(FakePage([["a", "b", "c"], ["d"]]), max_items=2)) == ["a", "b"]
+    page = FakePage([[str(i)] for i in range(10)])
+    assert asyncio.run(harvest_item_urls(page, max_items=100, max_rounds=3)) == ["0", "1", "2"]
+
+
+def test_harvest_infinite_scroll_fixture():
+    async_api = pytest.importorskip("playwright.async_api")
+
+    async def run(site):
+        async with async_api.async_playwright() as p:
+            try:
+                browser = await p.chromium.launch(headless=True)
+            except Exception as e:
+                pytest.skip(f"chromium not available: {e}")
+            page = await browser.new_page()
+            await page.goto(site.base_url + "/marketplace/feed")
+            urls = await harvest_item_urls(page, max_items=100, timeout=2, quiet=0.1)
+            await browser.close()
+            return urls
+
+    with FixtureSite(n=30) as site:
+        urls = asyncio.run(run(site))
+        assert urls == [u + "?ref=feed" for u in site.item_urls()]
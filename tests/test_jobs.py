@@ -0,0 +1,86 @@
+# tests/test_jobs.py
+import random
+import threading
+import pytest
+from sqlalchemy import delete
+from app import models
+from app.db import engine
+from app.jobs import JobManager, _now
+
+@pytest.fixture
+def key():
+    # a lock key, and so a job history, of the test's own
+    models.ensure_schema(engine)
+    key = random.randrange(1 << 40)
+    yield key
+    with engine.begin() as conn:
+        conn.execute(delete(models.ScrapeJobRecord).where(models.ScrapeJobRecord.lock_key == key))
+
+def test_triggers_coalesce_into_running_job(key):
+    release = threading.Event()
+
+    def runner(stats):
+        stats["fetched"] = 3
+        release.wait(5)
+
+    jobs = JobManager(runner=runner, key=key)
+    first, started = jobs.submit("api")
+    second, started_again = jobs.submit("scheduler")
+    assert started and not started_again
+    assert second is first and first.coalesced == 1
+    assert first.to_dict()["status"] == "running"
+    release.set()
+    assert first.done.wait(5)
+    info = jobs.get(first.id).to_dict()
+    assert info["status"] == "succeeded" and info["progress"]["fetched"] == 3
+    assert jobs.submit("api")[1]
+
+def test_failures_and_bounded_history(key):
+    def runner(stats):
+        raise RuntimeError("TARGET_URL not set")
+
+    jobs = JobManager(runner=runner, history=2, key=key)
+    ids = []
+    for _ in range(3):
+        job, _ = jobs.submit()
+        job.done.wait(5)
+        ids.append(job.id)
+    assert [j.id for j in jobs.recent()] == ids[:0:-1]
+    assert jobs.get(ids[0]) is None
+    failed = jobs.get(ids[-1]).to_dict()
+    assert failed["status"] == "failed" and failed["error"] == "TARGET_URL not set"
+
+def test_one_job_across_processes(key, monkeypatch):
+    # managers with their own database sessions stand in for two API workers
+    monkeypatch.setattr("app.jobs.SCRAPE_JOB_PROGRESS_SECONDS", 0.05)
+    release, counted = threading.Event(), threading.Event()
+
+    def runner(stats):
+        stats["fetched"] = 7
+        counted.set()
+        release.wait(5)
+
+    here = JobManager(runner=runner, key=key)
+    there = JobManager(runner=lambda stats: pytest.fail("second scrape started"), key=key)
+    job, started = here.submit("api")
+    joined, started_there = there.submit("api")
+    assert started and not started_there and joined.id == job.id
+    counted.wait(5)
+    for _ in range(100):
+        seen = there.get(job.id).to_dict()
+        if seen["progress"]["fetched"] == 7:
+            break
+        threading.Event().wait(0.05)
+    assert seen["status"] == "running" and seen["progress"]["fetched"] == 7 and seen["coalesced_triggers"] == 1
+    release.set()
+    assert job.done.wait(5)
+    assert there.get(job.id).status == "succeeded"
+    assert [j.id for j in there.recent()] == [job.id]
+
+def test_job_of_a_dead_process_is_abandoned(key):
+    # recorded as running, but nobody holds the lock: its process went away
+    with engine.begin() as conn:
+        conn.execute(models.ScrapeJobRecord.__table__.insert().values(
+            id=f"dead-{key}", lock_key=key, trigger="api", status="running", created_at=_now()))
+    stale = JobManager(runner=lambda stats: None, key=key).get(f"dead-{key}")
+    assert stale.status == "failed" and stale.error.startswith("abandoned")
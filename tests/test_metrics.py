@@ -0,0 +1,78 @@
+# tests/test_metrics.py
+import asyncio
+import pytest
+from app import metrics
+from app.utils import retry, async_retry
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("test_latency_seconds", "Test.", ("route",), buckets=(0.1, 1))
+    for v in (0.05, 0.5, 0.5, 3):
+        h.observe(v, route='/a"b')
+    text = metrics.render()
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{route="/a\\"b",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{route="/a\\"b",le="1"} 3' in text
+    assert 'test_latency_seconds_bucket{route="/a\\"b",le="+Inf"} 4' in text
+    assert 'test_latency_seconds_count{route="/a\\"b"} 4' in text
+
+def test_retries_are_counted():
+    calls = []
+
+    @retry(ValueError, tries=3, delay=0)
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ValueError("again")
+        return "ok"
+
+    before = metrics.retries.value(function="flaky", error="ValueError")
+    assert flaky() == "ok"
+    assert metrics.retries.value(function="flaky", error="ValueError") == before + 2
+
+def test_async_retry_backs_off_like_retry(monkeypatch):
+    waits = []
+
+    async def sleep(seconds):
+        waits.append(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+
+    @async_retry(ValueError, tries=4, delay=1, backoff=3)
+    async def always():
+        raise ValueError("no")
+
+    with pytest.raises(ValueError):
+        asyncio.run(always())
+    assert waits == [1, 3, 9]
+    with pytest.raises(TypeError):
+        retry(ValueError)(always)
+
+def test_trace_collects_spans_across_tasks_and_threads(monkeypatch):
+    monkeypatch.setattr(metrics.tracer, "enabled", False)
+
+    async def run():
+        trace = metrics.start_trace()
+        with metrics.span("outer"):
+            pass
+        return trace
+
+    assert asyncio.run(run()) is None
+
+    monkeypatch.setattr(metrics.tracer, "enabled", True)
+
+    @metrics.timed_query
+    def query():
+        return 1
+
+    async def run():
+        trace = metrics.start_trace()
+        await asyncio.gather(*(asyncio.to_thread(query) for _ in range(4)))
+        with metrics.span("outer"):
+            await asyncio.sleep(0)
+        return trace
+
+    trace = asyncio.run(run())
+    assert trace["db.query"]["count"] == 4 and trace["outer"]["count"] == 1
+    # nothing is recorded outside a trace
+    metrics.add_span("stray", 1.0)
+    assert "stray" not in trace
@@ -0,0 +1,32 @@
+# tests/test_scheduler.py
+import os
+import sys
+import random
+import subprocess
+from sqlalchemy import text
+from app.db import engine
+from app.scheduler import LeaderElector
+
+def test_one_leader_and_takeover():
+    key = random.randrange(1 << 40)
+    events = []
+    first = LeaderElector(key, lambda: events.append("first+"), lambda: events.append("first-"))
+    second = LeaderElector(key, lambda: events.append("second+"), lambda: events.append("second-"))
+    assert first.elect() and first.elect()
+    assert not second.elect()
+    first.resign()
+    assert second.elect() and not first.elect()
+    # the leader's session dies, as when its process is killed: Postgres drops the lock
+    pid = second._conn.execute(text("SELECT pg_backend_pid()")).scalar()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_terminate_backend(:pid, 5000)"), {"pid": pid})
+    assert first.elect()
+    assert not second.elect()
+    first.resign()
+    assert events == ["first+", "first-", "second+", "first+", "second-", "first-"]
+
+def test_app_import_leaves_scraper_unloaded():
+    code = "import sys, app.main; print(sorted(m for m in ('playwright', 'bs4', 'apscheduler') if m in sys.modules))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == "[]"
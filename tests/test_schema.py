@@ -0,0 +1,44 @@
+# tests/test_schema.py
+import uuid
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app import crud, models, stats
+from app.db import engine
+
+# listings as the first release created it, before location_norm and the search columns
+OLD_LISTINGS = """
+CREATE TABLE listings (
+    id SERIAL PRIMARY KEY, listing_id TEXT NOT NULL UNIQUE, title TEXT, price NUMERIC, currency TEXT,
+    year INTEGER, mileage INTEGER, location TEXT, url TEXT, raw_json JSONB,
+    created_at TIMESTAMPTZ DEFAULT now(), updated_at TIMESTAMPTZ DEFAULT now(), last_seen_at TIMESTAMPTZ DEFAULT now())
+"""
+
+@pytest.fixture
+def old_schema():
+    # a scratch schema first on the search_path stands in for an old database
+    schema = "old_" + uuid.uuid4().hex[:8]
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    scratch = create_engine(engine.url, connect_args={"options": f"-csearch_path={schema}"})
+    yield scratch
+    scratch.dispose()
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+
+def test_upgrade_backfills_location_norm(old_schema, monkeypatch):
+    monkeypatch.setattr(models, "LOCATION_BACKFILL_BATCH", 2)
+    with old_schema.begin() as conn:
+        conn.execute(text(OLD_LISTINGS))
+        conn.execute(text("INSERT INTO listings (listing_id, title, price, location) VALUES "
+                          "('old-1', 'Toyota Vios', 500000, 'Cebu City, Cebu'), ('old-2', 'Honda Civic', 700000, NULL), "
+                          "('old-3', 'Ford Ranger', 900000, 'Lapu-Lapu, Cébu')"))
+    models.ensure_schema(old_schema)
+    with sessionmaker(bind=old_schema)() as db:
+        assert db.execute(text("SELECT location_norm FROM listings ORDER BY id")).scalars().all() == [
+            "cebu city cebu", None, "lapu lapu cebu"]
+        found = crud.list_listings(db, filters={"location": "cebu"})["items"]
+        assert [o.listing_id for o in found] == ["old-1", "old-3"]
+        assert [o.listing_id for o in crud.list_listings(db, filters={"q": "cebu"})["items"]] == ["old-1", "old-3"]
+        stats.refresh(db)
+        assert stats.market_stats(db, {"location": "cebu"})["count"] == 2
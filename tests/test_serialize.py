@@ -0,0 +1,55 @@
+# tests/test_serialize.py
+import uuid
+import pytest
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+from typing import List
+from pydantic import TypeAdapter
+from app import crud, models, schemas, serialize
+from app.db import engine, SessionLocal
+
+@pytest.fixture
+def db():
+    models.ensure_schema(engine)
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    session.close()
+
+def test_parse_fields():
+    assert serialize.parse_fields(None) == serialize.LISTING_FIELDS
+    assert serialize.parse_fields("price, title,price") == ["price", "title"]
+    with pytest.raises(ValueError):
+        serialize.parse_fields("title,raw_json")
+
+@pytest.mark.parametrize("encoder", ["orjson", "json"])
+def test_rows_encode_like_the_schema(encoder, monkeypatch):
+    if encoder == "json":
+        monkeypatch.setattr(serialize, "orjson", None)
+    elif serialize.orjson is None:
+        pytest.skip("orjson not installed")
+    seen = datetime(2024, 5, 1, 12, 30, 5, 123456, tzinfo=timezone.utc)
+    rows = [("a1", "Ñissan Juke", Decimal("450000.50"), "PHP", 2019, 30000, "Cebu", "http://x/1",
+             1, seen, seen.replace(microsecond=0), seen.astimezone(timezone(timedelta(hours=8)))),
+            ("a2", None, Decimal("1000"), None, None, None, None, None, 2, seen, None, None)]
+    items = serialize.listing_dicts(rows, serialize.LISTING_FIELDS)
+    adapter = TypeAdapter(List[schemas.ListingOut])
+    assert serialize.dumps(items) == adapter.dump_json(adapter.validate_python(items))
+
+def test_projected_pages_keep_cursors(db):
+    tag = uuid.uuid4().hex[:8]
+    crud.upsert_listings(db, [{"listing_id": f"proj-{tag}-{i}", "title": f"Car {i}", "price": 100 + i,
+                               "raw_json": {"html_sha256": "x"}} for i in range(5)])
+    filters = {"min_price": 100, "max_price": 104}
+    full = crud.list_listings(db, limit=2, filters=filters, sort="-price")
+    page = crud.list_listings(db, limit=2, filters=filters, sort="-price", columns=["title"])
+    # the cursor columns ride along after the requested ones
+    assert [tuple(r) for r in page["items"]] == [(o.title, o.id, o.price) for o in full["items"]]
+    assert page["next_cursor"] == full["next_cursor"]
+    row = crud.get_listing(db, f"proj-{tag}-3", ["listing_id", "price"])
+    assert tuple(row) == (f"proj-{tag}-3", Decimal("103"))
+    # raw_json is deferred on entities, loaded only when touched
+    obj = crud.get_listing(db, f"proj-{tag}-3")
+    assert "raw_json" not in obj.__dict__ and obj.raw_json == {"html_sha256": "x"}
+    for i in range(5):
+        crud.delete_listing(db, f"proj-{tag}-{i}")
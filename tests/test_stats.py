@@ -0,0 +1,66 @@
+# tests/test_stats.py
+import uuid
+import pytest
+from sqlalchemy import text
+from app import crud, models, stats
+from app.db import SessionLocal, engine
+
+@pytest.fixture
+def db():
+    models.ensure_schema(engine)
+    session = SessionLocal()
+    stats.refresh(session)
+    yield session
+    session.close()
+
+def test_rollup_follows_writes(db):
+    # a made-up town keeps other rows in the database out of the numbers
+    town = "Statville" + uuid.uuid4().hex[:8]
+    rows = [{"listing_id": f"{town}-{i}", "title": f"Car {i}", "price": price, "currency": cur,
+             "year": year, "location": f"{town}, Metro Zantor"}
+            for i, (price, cur, year) in enumerate([(100_000, "PHP", 2015), (200_000, "PHP", 2015),
+                                                    (400_000, "PHP", 2018), (900_000, "USD", 2018), (None, "PHP", None)])]
+    crud.upsert_listings(db, rows)
+    res = stats.market_stats(db, {"location": town}, "year")
+    assert res["source"] == "rollup" and res["exact"]
+    assert (res["count"], res["priced"], res["min_price"], res["max_price"]) == (5, 4, 100_000, 900_000)
+    assert res["avg_price"] == 400_000
+    # the median is interpolated, so it lands between the two middle prices
+    assert 200_000 <= res["median_price"] <= 400_000
+    assert sum(b["count"] for b in res["histogram"]) == 4
+    assert [(g["key"], g["count"]) for g in res["groups"]] == [(2015, 2), (2018, 2), (None, 1)]
+
+    crud.update_listing(db, f"{town}-3", {"price": 410_000, "currency": "PHP"})
+    crud.delete_listing(db, f"{town}-0")
+    res = stats.market_stats(db, {"location": town}, "currency")
+    assert [(g["key"], g["count"], g["max_price"]) for g in res["groups"]] == [("PHP", 4, 410_000)]
+
+    # a bucket wholly inside the range is exact, one straddling a bound is not
+    assert stats.market_stats(db, {"location": town, "min_price": 150_000})["exact"]
+    rough = stats.market_stats(db, {"location": town, "min_price": 405_000})
+    assert not rough["exact"] and rough["count"] == 2
+
+def test_text_search_is_aggregated_live(db):
+    word = "Qx" + uuid.uuid4().hex[:8]
+    crud.upsert_listings(db, [{"listing_id": f"{word}-{i}", "title": f"Toyota {word}", "price": 1000 * (i + 1)}
+                              for i in range(3)])
+    res = stats.market_stats(db, {"q": word, "max_price": 2500})
+    assert res["source"] == "live" and res["exact"]
+    assert (res["count"], res["min_price"], res["max_price"], res["median_price"]) == (2, 1000, 2000, 1000)
+
+def test_mark_of_a_write_in_flight_survives_a_refresh(db):
+    town = "Racetown" + uuid.uuid4().hex[:8]
+    insert = text("INSERT INTO listings (listing_id, price, location_norm) VALUES (:id, 1000, :town)")
+    with SessionLocal() as a, SessionLocal() as b:
+        a.execute(insert, {"id": f"{town}-a", "town": town.lower()})
+        a.commit()
+        # b writes to the same group and is still open while a's refresh runs
+        b.execute(insert, {"id": f"{town}-b", "town": town.lower()})
+        stats.refresh(a)
+        b.commit()
+        stats.refresh(b)
+    assert stats.market_stats(db, {"location": town})["count"] == 2
+    marks = db.execute(text("SELECT count(*) FROM listing_stats_marks WHERE location_norm = :t"), {"t": town.lower()})
+    assert marks.scalar() == 0
+    for suffix in "ab":
+        crud.delete_listing(db, f"{town}-{suffix}")